@@ -1,15 +1,67 @@
+from contextlib import asynccontextmanager
+import logging
+import time
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import devices, energy, prediction, anomalies, user_routes, analytics, zones, faults
+from fastapi.responses import PlainTextResponse
+from pymongo.errors import PyMongoError
+from routes import devices, energy, prediction, anomalies, user_routes, analytics, zones, faults, ingest, exports, realtime, sync, admin, jobs, heartbeats
 from routes.auth_routes import router as auth_router
+from app.services import anomaly_service, baseline_service, catalog_service, fault_scan_service, heartbeat_service, job_service, realtime_service, sketch_service, sync_service
+import database
+from utils.cpu_pool import cpu_pool
+from utils.json_response import FastJSONResponse
+from utils.jwt_handler import auth_cache_stats
+from utils.metrics import MetricsMiddleware, registry, snapshot_collector
+from utils.profiling import ProfilingMiddleware
+from utils.response_cache import ResponseCacheMiddleware, response_cache_stats
+from utils.server_timing import ServerTimingMiddleware
+from utils.slow_queries import slow_query_recorder
 
 
 import os
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    database.connect()
+    try:
+        await database.ensure_indexes()
+        await catalog_service.ensure_indexes()
+        await sync_service.ensure_indexes()
+        await anomaly_service.ensure_indexes()
+        await fault_scan_service.ensure_indexes()
+        await job_service.ensure_indexes()
+        await baseline_service.ensure_indexes()
+        await sketch_service.ensure_indexes()
+        await heartbeat_service.ensure_indexes()
+    except PyMongoError as exc:
+        logger.warning("Could not ensure indexes: %s", exc)
+    await slow_query_recorder.start(database.db)
+    fault_scan_service.scanner.start()
+    job_service.worker.start()
+    baseline_service.builder.start()
+    heartbeat_service.sweeper.start()
+    yield
+    await heartbeat_service.sweeper.stop()
+    await baseline_service.builder.stop()
+    await job_service.worker.stop()
+    await fault_scan_service.scanner.stop()
+    cpu_pool.shutdown()
+    await slow_query_recorder.stop()
+    await realtime_service.hub.stop()
+    await database.close()
+
+
 app = FastAPI(
     title="Volt Guard API",
     description="Smart Energy Management System using IoT and AI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Configure CORS with environment-aware settings
@@ -20,13 +72,32 @@ allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://loc
 if os.getenv("DEBUG", "False").lower() == "true":
     allowed_origins = ["*"]
 
+# Added before CORS so cached replies still get CORS headers on the way out
+app.add_middleware(ResponseCacheMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing", "X-Profile-Id"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+# Outermost, so latency includes cache hits and CORS handling
+app.add_middleware(MetricsMiddleware)
+
+registry.add_collector(snapshot_collector("voltguard_mongo_pool", "MongoDB connection pool", database.pool_stats))
+registry.add_collector(snapshot_collector("voltguard_auth_cache", "Verified-token cache", auth_cache_stats))
+registry.add_collector(snapshot_collector("voltguard_response_cache", "GET response cache", response_cache_stats))
+registry.add_collector(snapshot_collector("voltguard_realtime", "Realtime zone feed", realtime_service.hub.stats))
+registry.add_collector(snapshot_collector("voltguard_slow_queries", "Slow query recorder", slow_query_recorder.stats))
+registry.add_collector(snapshot_collector("voltguard_anomaly_detector", "Streaming anomaly detector", anomaly_service.detector.stats))
+registry.add_collector(snapshot_collector("voltguard_fault_scanner", "Incremental fault scanner", fault_scan_service.scanner.stats))
+registry.add_collector(snapshot_collector("voltguard_cpu_pool", "Analytics process pool", cpu_pool.stats))
+registry.add_collector(snapshot_collector("voltguard_job_worker", "Background report jobs", job_service.worker.stats))
+registry.add_collector(snapshot_collector("voltguard_baselines", "Hour-of-week baseline builder", baseline_service.builder.stats))
+registry.add_collector(snapshot_collector("voltguard_heartbeats", "Module heartbeat sweeper", heartbeat_service.sweeper.stats))
 
 @app.get("/")
 async def root():
@@ -43,6 +114,51 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: pings MongoDB and reports the round-trip time"""
+    started = time.perf_counter()
+    try:
+        await database.db.command("ping")
+    except PyMongoError as exc:
+        return FastJSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "mongo": {"ok": False, "error": str(exc)}},
+        )
+    latency_ms = (time.perf_counter() - started) * 1000
+    return {"status": "ready", "mongo": {"ok": True, "latency_ms": round(latency_ms, 2)}}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, MongoDB, ingestion, pool and cache metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/pool")
+async def pool_health():
+    """MongoDB driver mode, pool sizing and connection checkout/wait metrics"""
+    return database.pool_stats()
+
+
+@app.get("/health/auth-cache")
+async def auth_cache_health():
+    """Hit rate and size of the verified-token cache used by get_current_user"""
+    return auth_cache_stats()
+
+
+@app.get("/health/response-cache")
+async def response_cache_health():
+    """Hits, misses and coalesced requests of the GET response cache"""
+    return response_cache_stats()
+
+
+@app.get("/health/realtime")
+async def realtime_health():
+    """Reader mode, subscriber count and dropped events of the realtime zone feed"""
+    return realtime_service.hub.stats()
+
+
 app.include_router(auth_router)
 app.include_router(zones.router)
 app.include_router(devices.router)
@@ -52,3 +168,10 @@ app.include_router(anomalies.router)
 app.include_router(user_routes.router)
 app.include_router(analytics.router)
 app.include_router(faults.router)
+app.include_router(ingest.router)
+app.include_router(exports.router)
+app.include_router(realtime.router)
+app.include_router(sync.router)
+app.include_router(admin.router)
+app.include_router(jobs.router)
+app.include_router(heartbeats.router)
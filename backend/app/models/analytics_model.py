@@ -25,6 +25,30 @@ class SensorReading(BaseModel):
         allow_population_by_field_name = True
 
 
+class TelemetryReading(BaseModel):
+    """
+    Occupancy/environment payload as devices post it to /api/v1/telemetry.
+    Only the fields the deployed voltguard-api requires are mandatory; the
+    server stamps ``received_at``.
+    """
+    module: str = Field(..., description="Module identifier")
+    location: str = Field(..., description="Sensor location")
+    rcwl: int = Field(..., ge=0, le=1, description="RCWL motion binary flag")
+    pir: int = Field(..., ge=0, le=1, description="PIR motion binary flag")
+    rssi: Optional[int] = Field(None, description="Signal strength dBm")
+    uptime: Optional[int] = Field(None, description="Device uptime seconds")
+    heap: Optional[int] = Field(None, description="Free heap bytes")
+    ip: Optional[str] = Field(None, description="Device IP")
+    mac: Optional[str] = Field(None, description="Device MAC")
+    temperature: Optional[float] = Field(None, description="Temperature in Celsius")
+    humidity: Optional[float] = Field(None, description="Relative humidity percentage")
+    source: Optional[str] = Field(None, description="Source identifier")
+    received_at: Optional[datetime] = Field(None, description="Device clock, kept as device_time")
+
+    class Config:
+        extra = "allow"
+
+
 class RecommendationSeverity(str, Enum):
     low = "low"
     medium = "medium"
@@ -41,3 +65,24 @@ class Recommendation(BaseModel):
 class RecommendationsResponse(BaseModel):
     recommendations: List[Recommendation] = []
     count: int = 0
+
+
+class PercentileGroup(BaseModel):
+    location: Optional[str] = None
+    module: Optional[str] = None
+    count: int
+    mean: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    percentiles: dict = Field(..., description='Quantile label ("p95") -> value')
+
+
+class PercentilesResponse(BaseModel):
+    metric: str
+    start: datetime
+    end: datetime
+    relative_accuracy: float = Field(..., description="Bound on the relative error of each percentile")
+    groups: List[PercentileGroup]
+
+    class Config:
+        json_encoders = {datetime: lambda v: v.isoformat()}
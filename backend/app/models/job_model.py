@@ -0,0 +1,26 @@
+from datetime import date
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class JobRequest(BaseModel):
+    report: str = Field(..., description="Report name, see GET /jobs/reports")
+    params: dict = Field(default_factory=dict, description="Report parameters")
+
+
+class ZoneMonthlyKwhParams(BaseModel):
+    month: Optional[str] = Field(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="YYYY-MM, default last month")
+    locations: Optional[List[str]] = None
+
+
+class VacantEnergyWasteParams(BaseModel):
+    start: Optional[date] = Field(None, description="First day, default 90 days before end")
+    end: Optional[date] = Field(None, description="Last day (inclusive), default yesterday")
+    locations: Optional[List[str]] = None
+
+
+class FaultCorrelationParams(BaseModel):
+    days: int = Field(7, ge=1, le=31)
+    end: Optional[date] = Field(None, description="Last day (inclusive), default today")
+    window_minutes: int = Field(120, ge=10, le=720, description="Energy window before and after each fault")
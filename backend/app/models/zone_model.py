@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -31,3 +31,29 @@ class ZoneDetail(BaseModel):
 
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat()}
+
+
+class MetricDeviation(BaseModel):
+    value: float = Field(..., description="Latest hourly value")
+    expected: float = Field(..., description="Baseline mean for this hour of the week")
+    p10: float
+    p90: float
+    delta: float = Field(..., description="value - expected")
+    z: Optional[float] = Field(None, description="Standard deviations from the baseline mean")
+    band: str = Field(..., description="below (under p10), normal or above (over p90)")
+
+
+class ZoneBaseline(BaseModel):
+    location: str
+    module: Optional[str] = None
+    weeks: int = Field(..., description="Most recent weeks each slot covers")
+    through: Optional[datetime] = Field(None, description="Hours before this are included")
+    profile: Dict[str, Dict[str, List[Optional[float]]]] = Field(
+        default_factory=dict,
+        description="metric -> n/mean/std/p10/p50/p90, each a list of 168 hour-of-week slots (Monday 00:00 UTC first)",
+    )
+    now: Optional[dict] = Field(None, description="Latest hourly values (the hour may still be in progress)")
+    deviation: Dict[str, MetricDeviation] = Field(default_factory=dict)
+
+    class Config:
+        json_encoders = {datetime: lambda v: v.isoformat()}
@@ -0,0 +1,303 @@
+"""
+Online anomaly detection over ingested telemetry.
+
+Every stored batch of energy and occupancy readings is fed through a detector
+that keeps constant-size state per series (module or location x metric):
+
+- an EWMA mean and variance, giving a classic z-score
+- a streaming median / mean absolute deviation, giving a robust z-score that
+  a single outlier cannot drag along
+- a two-sided CUSUM on the current series, flagging sustained level shifts
+  that stay below the spike threshold
+
+A reading is a ``spike`` when both z-scores exceed their thresholds and a
+``level_shift`` when the CUSUM crosses ANOMALY_CUSUM_H. After a level shift the
+series re-learns its baseline (ANOMALY_WARMUP_SAMPLES readings) instead of
+reporting every reading at the new level. Findings become ``Anomaly``
+documents keyed by series, type and ANOMALY_DEDUP_SECONDS window, so repeats
+inside a window only bump ``occurrences``. Replays only insert windows that are
+missing and never count, so replaying history is idempotent:
+
+    python -m app.services.anomaly_service replay --start 2026-01-01 --end 2026-02-01
+
+State is per process. With several API workers each one sees a share of a
+module's readings, which still converges to the same statistics, only more
+slowly.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+import database
+from database import analytics_col, anomalies_col, energy_col
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_DETECTION_ENABLED = os.getenv("ANOMALY_DETECTION_ENABLED", "true").lower() == "true"
+ANOMALY_WARMUP_SAMPLES = int(os.getenv("ANOMALY_WARMUP_SAMPLES", "30"))
+ANOMALY_EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.05"))
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "4"))
+ANOMALY_ROBUST_Z_THRESHOLD = float(os.getenv("ANOMALY_ROBUST_Z_THRESHOLD", "6"))
+ANOMALY_CUSUM_K = float(os.getenv("ANOMALY_CUSUM_K", "0.5"))
+ANOMALY_CUSUM_H = float(os.getenv("ANOMALY_CUSUM_H", "8"))
+ANOMALY_DEDUP_SECONDS = int(os.getenv("ANOMALY_DEDUP_SECONDS", "900"))
+REPLAY_BATCH_SIZE = 5000
+
+# Source -> (metric, smallest meaningful scale, run change-point detection)
+SERIES: Dict[str, Tuple[Tuple[str, float, bool], ...]] = {
+    "energy": (("current_a", 0.05, True),),
+    "occupancy": (("temperature", 0.2, False), ("humidity", 1.0, False)),
+}
+SOURCES = {
+    "energy": energy_col,
+    "occupancy": analytics_col,
+}
+
+
+def _metric(doc: dict, metric: str) -> Optional[float]:
+    value = doc.get(metric)
+    if value is None and metric == "current_a" and doc.get("current_ma") is not None:
+        value = doc["current_ma"] / 1000
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+class SeriesState:
+    """Constant-size running statistics of one series."""
+
+    __slots__ = ("count", "mean", "var", "median", "mad", "cusum_pos", "cusum_neg", "last_alert")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.median = 0.0
+        self.mad = 0.0
+        self.cusum_pos = 0.0
+        self.cusum_neg = 0.0
+        self.last_alert: Dict[str, float] = {}
+
+    def update(self, x: float, min_scale: float, change_points: bool) -> List[tuple]:
+        """Fold in one value; returns (anomaly_type, score, expected) findings."""
+        self.count += 1
+        if self.count == 1:
+            self.mean = self.median = x
+            return []
+
+        std = max(math.sqrt(self.var), min_scale)
+        scale = max(1.4826 * self.mad, min_scale)
+        z = (x - self.mean) / std
+        robust_z = (x - self.median) / scale
+        findings = []
+
+        if self.count > ANOMALY_WARMUP_SAMPLES:
+            if change_points:
+                # Clipped so one spike cannot trip the change-point test on its own
+                step = min(max(z, -ANOMALY_Z_THRESHOLD), ANOMALY_Z_THRESHOLD)
+                self.cusum_pos = max(0.0, self.cusum_pos + step - ANOMALY_CUSUM_K)
+                self.cusum_neg = max(0.0, self.cusum_neg - step - ANOMALY_CUSUM_K)
+                if self.cusum_pos > ANOMALY_CUSUM_H or self.cusum_neg > ANOMALY_CUSUM_H:
+                    score = self.cusum_pos if self.cusum_pos > self.cusum_neg else -self.cusum_neg
+                    expected = self.mean
+                    # The old baseline says nothing about the new level: learn it again
+                    self.count, self.mean, self.median, self.var, self.mad = 1, x, x, 0.0, 0.0
+                    self.cusum_pos = self.cusum_neg = 0.0
+                    return [("level_shift", score, expected)]
+            if abs(robust_z) >= ANOMALY_ROBUST_Z_THRESHOLD and abs(z) >= ANOMALY_Z_THRESHOLD:
+                findings.append(("spike", robust_z, self.median))
+
+        # Outliers are clipped before they move the baseline
+        limit = ANOMALY_ROBUST_Z_THRESHOLD * scale
+        clipped = min(max(x, self.median - limit), self.median + limit)
+        # 1/n while warming up, so the first samples converge quickly
+        alpha = max(ANOMALY_EWMA_ALPHA, 1.0 / self.count)
+        diff = clipped - self.mean
+        self.mean += alpha * diff
+        self.var = (1 - alpha) * (self.var + alpha * diff * diff)
+        deviation = clipped - self.median
+        self.median += alpha * scale * (1 if deviation > 0 else -1 if deviation < 0 else 0)
+        self.mad += alpha * (abs(clipped - self.median) - self.mad)
+        return findings
+
+
+class AnomalyDetector:
+    def __init__(self, dedup_seconds: int = ANOMALY_DEDUP_SECONDS):
+        self.dedup_seconds = dedup_seconds
+        self._series: Dict[tuple, SeriesState] = {}
+        self.readings = 0
+        self.detected = 0
+        self.suppressed = 0
+        self.stored = 0
+        self.store_failures = 0
+
+    @staticmethod
+    def _timestamp(doc: dict) -> datetime:
+        value = doc.get("received_at") or doc.get("timestamp")
+        return value if isinstance(value, datetime) else datetime.utcnow()
+
+    def detect(self, source: str, docs: Iterable[dict]) -> List[dict]:
+        """Run readings through their series; returns new anomaly documents (CPU only, no I/O)."""
+        metrics = SERIES.get(source, ())
+        anomalies = []
+        for doc in docs:
+            self.readings += 1
+            subject = doc.get("module") or doc.get("location")
+            if not subject:
+                continue
+            for metric, min_scale, change_points in metrics:
+                value = _metric(doc, metric)
+                if value is None:
+                    continue
+                key = (source, subject, metric)
+                state = self._series.get(key)
+                if state is None:
+                    state = self._series[key] = SeriesState()
+                findings = state.update(value, min_scale, change_points)
+                if findings:
+                    at = self._timestamp(doc)
+                    for anomaly_type, score, expected in findings:
+                        anomaly = self._anomaly(state, doc, subject, metric, anomaly_type, score, expected, value, at)
+                        if anomaly is not None:
+                            anomalies.append(anomaly)
+        return anomalies
+
+    def _anomaly(self, state, doc, subject, metric, anomaly_type, score, expected, value, at) -> Optional[dict]:
+        self.detected += 1
+        epoch = at.timestamp()
+        last = state.last_alert.get(anomaly_type)
+        if last is not None and 0 <= epoch - last < self.dedup_seconds:
+            self.suppressed += 1
+            return None
+        state.last_alert[anomaly_type] = epoch
+        direction = "above" if value > expected else "below"
+        if anomaly_type == "spike":
+            severity = "High" if abs(score) >= 2 * ANOMALY_ROBUST_Z_THRESHOLD else "Medium"
+            description = f"{metric} {value:g} is {abs(score):.1f} robust deviations {direction} typical {expected:.3g}"
+        else:
+            severity = "Medium"
+            description = f"{metric} shifted {direction} its baseline of {expected:.3g} (now {value:g})"
+        window = int(epoch // self.dedup_seconds)
+        return {
+            "device_id": subject,
+            "anomaly_type": anomaly_type,
+            "severity": severity,
+            "description": description,
+            "detected_at": at,
+            "module": doc.get("module"),
+            "location": doc.get("location"),
+            "metric": metric,
+            "value": value,
+            "expected": round(expected, 4),
+            "score": round(score, 2),
+            "source": "detector",
+            "dedupe_key": f"{subject}:{metric}:{anomaly_type}:{window}",
+        }
+
+    async def store(self, anomalies: List[dict], count: bool = True):
+        """
+        Upsert by dedupe key: the first finding of a window is kept, later ones
+        are counted. With ``count=False`` (replays) existing windows are left as they are.
+        """
+        if not anomalies:
+            return
+        ops = []
+        for a in anomalies:
+            if count:
+                update = {
+                    "$setOnInsert": {k: v for k, v in a.items() if k != "detected_at"},
+                    "$min": {"detected_at": a["detected_at"]},
+                    "$max": {"last_seen": a["detected_at"]},
+                    "$inc": {"occurrences": 1},
+                }
+            else:
+                update = {"$setOnInsert": {**a, "last_seen": a["detected_at"], "occurrences": 1}}
+            ops.append(UpdateOne({"dedupe_key": a["dedupe_key"]}, update, upsert=True))
+        try:
+            await anomalies_col.bulk_write(ops, ordered=False)
+            self.stored += len(ops)
+        except PyMongoError as exc:
+            # Detection must never fail the ingest request that fed it
+            self.store_failures += len(ops)
+            logger.warning("Could not store %d anomalies: %s", len(ops), exc)
+
+    async def observe(self, source: str, docs: List[dict]):
+        """Called by the ingest path after a batch is stored."""
+        if ANOMALY_DETECTION_ENABLED:
+            await self.store(self.detect(source, docs))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": ANOMALY_DETECTION_ENABLED,
+            "series": len(self._series),
+            "readings": self.readings,
+            "detected": self.detected,
+            "suppressed": self.suppressed,
+            "stored": self.stored,
+            "store_failures": self.store_failures,
+        }
+
+
+detector = AnomalyDetector()
+
+
+async def ensure_indexes():
+    await anomalies_col.create_index(
+        [("dedupe_key", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"dedupe_key": {"$exists": True}},
+    )
+
+
+async def replay(start: datetime, end: datetime, sources: Iterable[str] = tuple(SOURCES)) -> dict:
+    """
+    Run stored readings through a fresh detector in time order. Windows that
+    already have an anomaly are left untouched, so replays can be repeated.
+    """
+    await ensure_indexes()
+    results = {}
+    for source in sources:
+        replay_detector = AnomalyDetector()
+        started = time.perf_counter()
+        cursor = (
+            SOURCES[source]
+            .find({"received_at": {"$gte": start, "$lt": end}}, {"_id": 0})
+            .sort("received_at", ASCENDING)
+            .batch_size(REPLAY_BATCH_SIZE)
+        )
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= REPLAY_BATCH_SIZE:
+                await replay_detector.store(replay_detector.detect(source, batch), count=False)
+                batch = []
+        await replay_detector.store(replay_detector.detect(source, batch), count=False)
+        results[source] = {**replay_detector.stats(), "seconds": round(time.perf_counter() - started, 2)}
+    return results
+
+
+async def _main(args):
+    try:
+        if args.command == "replay":
+            end = args.end or datetime.utcnow()
+            start = args.start or end - timedelta(days=7)
+            print(await replay(start, end, args.source or tuple(SOURCES)))
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telemetry anomaly detection")
+    parser.add_argument("command", choices=["replay"])
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Default: 7 days before --end")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Default: now")
+    parser.add_argument("--source", action="append", choices=list(SOURCES))
+    asyncio.run(_main(parser.parse_args()))
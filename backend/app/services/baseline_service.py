@@ -0,0 +1,384 @@
+"""
+Hour-of-week baseline load profiles.
+
+Each location and each module gets one document in ``baseline_profiles`` with
+168 slots (Monday 00:00 UTC is slot 0). Every slot holds the mean, standard
+deviation and p10/p50/p90 of these hourly values:
+
+- current: mean current of a module over the hour. A location sums its modules.
+- temperature: mean temperature over the hour
+- occupancy: share of the hour's readings with motion
+
+The statistics cover the last BASELINE_WEEKS values of each slot. Those values
+are kept on the same document (``samples``), so each run only aggregates the
+hours that closed since the previous run and folds them in. There is no
+rescan of history. Each profile records the hour it has been folded
+``through`` in the same update as its samples, and skips hours before it, so
+a run that is interrupted or repeated never counts an hour twice. A run also
+stores the latest partial hour as ``now``, and clears a ``now`` whose hour has
+closed. ``GET /zones/{location}/baseline`` therefore reads one document,
+without ``samples``, and compares ``now`` with its slot.
+
+Only the holder of the ``baseline`` lease runs the periodic update, however
+many API processes start the builder.
+
+Hours are folded in once they ended BASELINE_SETTLE_MINUTES ago. Readings
+that arrive later than that are not counted.
+
+    python -m app.services.baseline_service update
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import database
+from app.services import lease_service
+from database import analytics_col, baselines_col, energy_col
+
+logger = logging.getLogger(__name__)
+
+BASELINE_ENABLED = os.getenv("BASELINE_ENABLED", "true").lower() == "true"
+BASELINE_INTERVAL_SECONDS = float(os.getenv("BASELINE_INTERVAL_SECONDS", "300"))
+BASELINE_WEEKS = int(os.getenv("BASELINE_WEEKS", "8"))
+BASELINE_SETTLE_MINUTES = float(os.getenv("BASELINE_SETTLE_MINUTES", "15"))
+# Slots with fewer weeks than this report no deviation
+BASELINE_MIN_WEEKS = int(os.getenv("BASELINE_MIN_WEEKS", "3"))
+BASELINE_LEASE_SECONDS = float(os.getenv("BASELINE_LEASE_SECONDS", str(3 * BASELINE_INTERVAL_SECONDS)))
+SLOTS = 168
+METRICS = ("current", "temperature", "occupancy")
+STATE_ID = "state"
+LEASE_NAME = "baseline"
+# Only what the summary needs; samples stay on the server
+PROFILE_FIELDS = {"samples": 0}
+
+
+def slot_of(hour: datetime) -> int:
+    return hour.weekday() * 24 + hour.hour
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    position = (len(ordered) - 1) * q
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(values: List[float]) -> dict:
+    """Mean, population std and p10/p50/p90 of one slot's values."""
+    if not values:
+        return {"n": 0, "mean": None, "std": None, "p10": None, "p50": None, "p90": None}
+    ordered = sorted(values)
+    mean = sum(values) / len(values)
+    return {
+        "n": len(values),
+        "mean": round(mean, 4),
+        "std": round(math.sqrt(sum((v - mean) ** 2 for v in values) / len(values)), 4),
+        "p10": round(_percentile(ordered, 0.1), 4),
+        "p50": round(_percentile(ordered, 0.5), 4),
+        "p90": round(_percentile(ordered, 0.9), 4),
+    }
+
+
+class Profile:
+    """One location's or module's samples per metric and slot, oldest first."""
+
+    def __init__(self, key: str, doc: Optional[dict] = None):
+        doc = doc or {}
+        self.key = key
+        self.scope, _, self.name = key.partition(":")
+        self.location: Optional[str] = doc.get("location")
+        self.samples: Dict[str, List[list]] = doc.get("samples") or {}
+        self.now: Optional[dict] = doc.get("now")
+        # Hours before this are already in the samples
+        self.through: Optional[datetime] = doc.get("through")
+        self.dirty: set = set()
+
+    def folded(self, hour: datetime) -> bool:
+        return self.through is not None and hour < self.through
+
+    def add(self, metric: str, hour: datetime, value: float):
+        slots = self.samples.setdefault(metric, [[] for _ in range(SLOTS)])
+        values = slots[slot_of(hour)]
+        values.append(round(value, 4))
+        del values[:-BASELINE_WEEKS]
+        self.dirty.add(metric)
+
+    def to_update(self, through: datetime) -> dict:
+        fields = {
+            "scope": self.scope,
+            "location": self.location,
+            "module": self.name if self.scope == "module" else None,
+            "weeks": BASELINE_WEEKS,
+            "through": through,
+            "now": self.now,
+            "updated_at": datetime.utcnow(),
+        }
+        for metric in self.dirty:
+            fields[f"samples.{metric}"] = self.samples[metric]
+            stats = [summarize(values) for values in self.samples[metric]]
+            # Parallel arrays keep the document compact
+            fields[f"profile.{metric}"] = {field: [s[field] for s in stats] for field in stats[0]}
+        return fields
+
+
+async def hourly_values(start: datetime, end: datetime) -> Dict[Tuple[str, str], Dict[datetime, Dict[str, float]]]:
+    """{(location, module): {hour: {metric: value}}} for readings in [start, end)."""
+    hour = {"$dateTrunc": {"date": "$received_at", "unit": "hour"}}
+    window = {"received_at": {"$gte": start, "$lt": end}, "location": {"$nin": [None, ""]}}
+    energy = [
+        {"$match": window},
+        {"$group": {
+            "_id": {"location": "$location", "module": "$module", "hour": hour},
+            "current": {"$avg": {"$ifNull": ["$current_a", {"$divide": ["$current_ma", 1000]}]}},
+        }},
+    ]
+    occupancy = [
+        {"$match": window},
+        {"$group": {
+            "_id": {"location": "$location", "module": "$module", "hour": hour},
+            "temperature": {"$avg": "$temperature"},
+            "occupancy": {"$avg": {"$cond": [{"$or": [{"$gt": ["$pir", 0]}, {"$gt": ["$rcwl", 0]}]}, 1, 0]}},
+        }},
+    ]
+    values: Dict[Tuple[str, str], Dict[datetime, Dict[str, float]]] = {}
+    for collection, pipeline in ((energy_col, energy), (analytics_col, occupancy)):
+        async for row in await collection.aggregate(pipeline):
+            key = row["_id"]
+            if not key.get("module"):
+                continue
+            slot = values.setdefault((key["location"], key["module"]), {}).setdefault(key["hour"], {})
+            for metric in METRICS:
+                if isinstance(row.get(metric), (int, float)):
+                    slot[metric] = float(row[metric])
+    return values
+
+
+def by_profile(values) -> Dict[str, Dict[datetime, Dict[str, float]]]:
+    """Regroup module values under ``module:`` and ``location:`` keys (locations sum current, average the rest)."""
+    out: Dict[str, Dict[datetime, Dict[str, float]]] = {}
+    totals: Dict[str, Dict[datetime, Dict[str, list]]] = {}
+    for (location, module), hours in values.items():
+        out[f"module:{module}"] = hours
+        for hour, metrics in hours.items():
+            slot = totals.setdefault(location, {}).setdefault(hour, {})
+            for metric, value in metrics.items():
+                slot.setdefault(metric, []).append(value)
+    for location, hours in totals.items():
+        out[f"location:{location}"] = {
+            hour: {
+                metric: sum(parts) if metric == "current" else sum(parts) / len(parts)
+                for metric, parts in metrics.items()
+            }
+            for hour, metrics in hours.items()
+        }
+    return out
+
+
+def _location_of(values, key: str) -> Optional[str]:
+    scope, _, name = key.partition(":")
+    if scope == "location":
+        return name
+    return next((location for location, module in values if module == name), None)
+
+
+def deviation(doc: dict) -> Dict[str, dict]:
+    """How far each metric of ``doc["now"]`` is from its hour-of-week slot."""
+    now = doc.get("now") or {}
+    if not isinstance(now.get("hour"), datetime):
+        return {}
+    slot = slot_of(now["hour"])
+    out = {}
+    for metric, profile in (doc.get("profile") or {}).items():
+        value = now.get(metric)
+        if not isinstance(value, (int, float)) or profile["n"][slot] < BASELINE_MIN_WEEKS:
+            continue
+        mean, std = profile["mean"][slot], profile["std"][slot]
+        band = "normal"
+        if value > profile["p90"][slot]:
+            band = "above"
+        elif value < profile["p10"][slot]:
+            band = "below"
+        out[metric] = {
+            "value": value,
+            "expected": mean,
+            "p10": profile["p10"][slot],
+            "p90": profile["p90"][slot],
+            "delta": round(value - mean, 4),
+            "z": round((value - mean) / std, 2) if std else None,
+            "band": band,
+        }
+    return out
+
+
+class BaselineBuilder:
+    def __init__(self, interval_seconds: float = BASELINE_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.owner = lease_service.owner_id()
+        self.leader = False
+        self.runs = 0
+        self.failures = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_hours = 0
+        self.last_profiles = 0
+
+    async def update_once(self) -> dict:
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        closed_until = _floor_hour(now - timedelta(minutes=BASELINE_SETTLE_MINUTES))
+        state = await baselines_col.find_one({"_id": STATE_ID}) or {}
+        through = max(state.get("through") or datetime.min, closed_until - timedelta(weeks=BASELINE_WEEKS))
+        profiles: Dict[str, Profile] = {}
+
+        async def load(keys):
+            missing = [k for k in keys if k not in profiles]
+            if missing:
+                for doc in await baselines_col.find({"_id": {"$in": missing}}, {"profile": 0}).to_list():
+                    profiles[doc["_id"]] = Profile(doc["_id"], doc)
+                for key in missing:
+                    profiles.setdefault(key, Profile(key))
+
+        # Closed hours, one day per aggregation
+        hours = 0
+        day = through
+        while day < closed_until:
+            chunk_end = min(day + timedelta(days=1), closed_until)
+            values = await hourly_values(day, chunk_end)
+            grouped = by_profile(values)
+            await load(grouped)
+            for key, series in grouped.items():
+                profile = profiles[key]
+                profile.location = profile.location or _location_of(values, key)
+                for hour in sorted(series):
+                    if profile.folded(hour):
+                        continue
+                    for metric, value in series[hour].items():
+                        profile.add(metric, hour, value)
+            hours += int((chunk_end - day).total_seconds() // 3600)
+            day = chunk_end
+
+        # The newest hour so far, closed or not
+        values = await hourly_values(closed_until, now + timedelta(seconds=1))
+        grouped = by_profile(values)
+        await load(grouped)
+        for key, series in grouped.items():
+            latest = max(series)
+            profile = profiles[key]
+            profile.location = profile.location or _location_of(values, key)
+            profile.now = {"hour": latest, **series[latest]}
+
+        # Samples and their watermark change together, and only if no other run moved the watermark first
+        ops = [
+            UpdateOne({"_id": key, "through": profile.through}, {"$set": profile.to_update(closed_until)}, upsert=True)
+            for key, profile in profiles.items()
+            if profile.through is None or profile.through <= closed_until
+        ]
+        written = len(ops)
+        if ops:
+            try:
+                await baselines_col.bulk_write(ops, ordered=False)
+            except BulkWriteError as exc:
+                errors = exc.details.get("writeErrors", [])
+                if any(e.get("code") != 11000 for e in errors):
+                    raise
+                written -= len(errors)
+        # A module that went quiet keeps no stale "now"
+        await baselines_col.update_many(
+            {"_id": {"$ne": STATE_ID}, "now.hour": {"$lt": closed_until}}, {"$set": {"now": None}}
+        )
+        await baselines_col.update_one({"_id": STATE_ID}, {"$set": {"through": closed_until, "updated_at": now}}, upsert=True)
+
+        self.runs += 1
+        self.last_run_at = now
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.last_hours = hours
+        self.last_profiles = written
+        return {"through": closed_until, "hours": hours, "profiles": written, "duration_ms": self.last_duration_ms}
+
+    async def _loop(self):
+        while True:
+            try:
+                self.leader = await lease_service.acquire(LEASE_NAME, self.owner, BASELINE_LEASE_SECONDS)
+                if self.leader:
+                    await self.update_once()
+            except Exception:
+                self.failures += 1
+                logger.exception("Baseline update failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if BASELINE_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.leader:
+            self.leader = False
+            await lease_service.release(LEASE_NAME, self.owner)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": BASELINE_ENABLED and self._task is not None,
+            "leader": self.leader,
+            "interval_seconds": self.interval_seconds,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_duration_ms": self.last_duration_ms,
+            "last_hours": self.last_hours,
+            "last_profiles": self.last_profiles,
+        }
+
+
+builder = BaselineBuilder()
+
+
+async def get_profile(location: str, module: Optional[str] = None) -> Optional[dict]:
+    key = f"module:{module}" if module else f"location:{location}"
+    doc = await baselines_col.find_one({"_id": key}, PROFILE_FIELDS)
+    if doc is None or (module and doc.get("location") not in (None, location)):
+        return None
+    return doc
+
+
+async def ensure_indexes():
+    await baselines_col.create_index([("scope", 1), ("location", 1)])
+
+
+async def _main(args):
+    try:
+        if args.command == "update":
+            await ensure_indexes()
+            if not await lease_service.acquire(LEASE_NAME, builder.owner, BASELINE_LEASE_SECONDS):
+                print({"skipped": "another process holds the baseline lease", **(await lease_service.holder(LEASE_NAME) or {})})
+                return
+            try:
+                print(await builder.update_once())
+            finally:
+                await lease_service.release(LEASE_NAME, builder.owner)
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hour-of-week baseline profiles")
+    parser.add_argument("command", choices=["update"])
+    asyncio.run(_main(parser.parse_args()))
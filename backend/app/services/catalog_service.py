@@ -0,0 +1,209 @@
+"""
+Module / location catalog maintained at ingest time.
+
+One small document per module and per location so that filter lists and
+module validation never have to scan the raw telemetry collections.
+
+Rebuild from existing data with:
+
+    python -m app.services.catalog_service rebuild
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+import database
+from database import analytics_col, catalog_col, energy_col
+
+MODULE = "module"
+LOCATION = "location"
+
+# Telemetry source name -> raw collection it is ingested into
+SOURCES = {
+    "energy": energy_col,
+    "occupancy": analytics_col,
+}
+
+
+async def ensure_indexes():
+    await catalog_col.create_index([("kind", ASCENDING), ("name", ASCENDING)], unique=True)
+
+
+def _reading_time(doc: dict) -> datetime:
+    raw = doc.get("received_at") or doc.get("receivedAt") or doc.get("timestamp") or doc.get("created_at")
+    if isinstance(raw, datetime):
+        return raw
+    if isinstance(raw, str):
+        try:
+            return datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        except Exception:
+            pass
+    return datetime.utcnow()
+
+
+def _reading_rssi(doc: dict) -> Optional[int]:
+    rssi = doc.get("rssi", doc.get("wifi_rssi"))
+    return rssi if isinstance(rssi, int) else None
+
+
+def _entry_updates(source: str, docs: Iterable[dict]) -> List[UpdateOne]:
+    """Fold a batch of readings into one upsert per (kind, name)."""
+    entries: Dict[tuple, dict] = {}
+    for doc in docs:
+        ts = _reading_time(doc)
+        module = doc.get("module")
+        location = doc.get("location")
+        keys = []
+        if module:
+            keys.append((MODULE, module))
+        if location:
+            keys.append((LOCATION, location))
+        for key in keys:
+            entry = entries.setdefault(key, {"first": ts, "last": ts, "count": 0, "fields": {}, "related": set()})
+            entry["count"] += 1
+            entry["first"] = min(entry["first"], ts)
+            entry["last"] = max(entry["last"], ts)
+            if doc.get("sensor"):
+                entry["fields"]["sensor"] = doc["sensor"]
+            rssi = _reading_rssi(doc)
+            if rssi is not None:
+                entry["fields"]["last_rssi"] = rssi
+            related = location if key[0] == MODULE else module
+            if related:
+                entry["related"].add(related)
+
+    ops = []
+    for (kind, name), entry in entries.items():
+        update = {
+            "$min": {"first_seen": entry["first"]},
+            "$max": {"last_seen": entry["last"]},
+            "$inc": {f"reading_counts.{source}": entry["count"]},
+        }
+        if entry["fields"]:
+            update["$set"] = entry["fields"]
+        related_field = "locations" if kind == MODULE else "modules"
+        update["$addToSet"] = {related_field: {"$each": sorted(entry["related"])}}
+        ops.append(UpdateOne({"kind": kind, "name": name}, update, upsert=True))
+    return ops
+
+
+async def record_readings(source: str, docs: List[dict]):
+    """Upsert catalog entries for a batch of freshly ingested readings."""
+    ops = _entry_updates(source, docs)
+    if ops:
+        await catalog_col.bulk_write(ops, ordered=False)
+
+
+async def list_names(kind: str, source: Optional[str] = None) -> List[str]:
+    """Return the sorted names of catalogued modules or locations."""
+    query: dict = {"kind": kind}
+    if source:
+        query[f"reading_counts.{source}"] = {"$gt": 0}
+    docs = await catalog_col.find(query, {"_id": 0, "name": 1}).to_list()
+    names = [doc["name"] for doc in docs if doc.get("name")]
+    names.sort()
+    return names
+
+
+async def module_exists(module_id: str, source: str = "energy") -> bool:
+    """
+    True when the module has reported at least one reading for ``source``.
+
+    Readings stored by the Flask ``voltguard-api`` never reach the catalog, so
+    a miss falls back to one indexed probe of the raw collection.
+    """
+    if await catalog_col.find_one(
+        {"kind": MODULE, "name": module_id, f"reading_counts.{source}": {"$gt": 0}},
+        {"_id": 1},
+    ) is not None:
+        return True
+    return await SOURCES[source].find_one({"module": module_id}, {"_id": 1}) is not None
+
+
+async def locations_seen_since(since: Optional[datetime] = None) -> List[dict]:
+    """Location entries whose latest reading is newer than ``since`` (all of them when None)."""
+    query: dict = {"kind": LOCATION}
+    if since is not None:
+        query["last_seen"] = {"$gt": since}
+    return await catalog_col.find(query, {"_id": 0, "name": 1, "last_seen": 1}).to_list()
+
+
+def _rebuild_pipeline(group_field: str, related_field: str):
+    ts = {"$ifNull": ["$received_at", "$receivedAt", "$timestamp", "$created_at"]}
+    return [
+        {"$match": {group_field: {"$nin": [None, ""]}}},
+        {"$addFields": {"_ts": ts}},
+        {"$sort": {"_ts": 1}},
+        {
+            "$group": {
+                "_id": f"${group_field}",
+                "first_seen": {"$first": "$_ts"},
+                "last_seen": {"$last": "$_ts"},
+                "count": {"$sum": 1},
+                "sensor": {"$last": "$sensor"},
+                "rssi": {"$last": {"$ifNull": ["$rssi", "$wifi_rssi"]}},
+                "related": {"$addToSet": f"${related_field}"},
+            }
+        },
+    ]
+
+
+async def rebuild() -> Dict[str, int]:
+    """Recompute the catalog from the raw telemetry collections."""
+    await ensure_indexes()
+    merged: Dict[tuple, dict] = {}
+    for source, col in SOURCES.items():
+        for kind, related_kind in ((MODULE, LOCATION), (LOCATION, MODULE)):
+            rows = await col.aggregate(_rebuild_pipeline(kind, related_kind), allowDiskUse=True)
+            async for row in rows:
+                entry = merged.setdefault(
+                    (kind, row["_id"]),
+                    {"reading_counts": {}, "related": set(), "first_seen": None, "last_seen": None},
+                )
+                entry["reading_counts"][source] = row["count"]
+                entry["related"].update(r for r in row["related"] if r)
+                for field, pick in (("first_seen", min), ("last_seen", max)):
+                    value = row.get(field)
+                    if isinstance(value, datetime):
+                        entry[field] = value if entry[field] is None else pick(entry[field], value)
+                if row.get("sensor"):
+                    entry["sensor"] = row["sensor"]
+                if isinstance(row.get("rssi"), int):
+                    entry["last_rssi"] = row["rssi"]
+
+    ops = []
+    for (kind, name), entry in merged.items():
+        related = entry.pop("related")
+        entry["locations" if kind == MODULE else "modules"] = sorted(related)
+        for source in SOURCES:
+            entry["reading_counts"].setdefault(source, 0)
+        ops.append(UpdateOne({"kind": kind, "name": name}, {"$set": entry}, upsert=True))
+    if ops:
+        await catalog_col.bulk_write(ops, ordered=False)
+
+    stale = await catalog_col.delete_many(
+        {"$nor": [{"kind": kind, "name": name} for kind, name in merged]} if merged else {}
+    )
+    return {
+        "modules": sum(1 for kind, _ in merged if kind == MODULE),
+        "locations": sum(1 for kind, _ in merged if kind == LOCATION),
+        "removed": stale.deleted_count,
+    }
+
+
+async def _main(command: str):
+    try:
+        if command == "rebuild":
+            print(await rebuild())
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the telemetry module/location catalog")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+    asyncio.run(_main(args.command))
@@ -0,0 +1,521 @@
+"""
+Incremental fault scanner.
+
+Every FAULT_SCAN_INTERVAL_SECONDS a background task reads the telemetry
+inserted since the previous scan and runs these checks on it. Rows are read by
+``_id`` rather than ``received_at``, so readings a module uploads late from its
+buffer are still scanned. ``_id`` order is not commit order: ObjectIds are made
+by the client with one-second resolution, and an ``insert_many`` from another
+API process can commit after a larger ``_id`` is already visible. Rows whose
+``_id`` is younger than FAULT_SCAN_SETTLE_SECONDS are therefore left for the
+next scan, and the read position never moves past them:
+
+- overcurrent: sustained current above the wired device's ``rated_power_watts``
+- stuck sensor: the same non-zero current, or the same temperature and
+  humidity, repeated FAULT_STUCK_READINGS times in a row
+- temperature excursion: outside the hard limits, or FAULT_TEMP_SIGMA
+  standard deviations from the module's running baseline
+- dropout: a gap between readings, or silence since the last one, longer
+  than FAULT_DROPOUT_SECONDS
+
+The read position of each collection, and each module's watermark, run
+lengths and temperature baseline, are kept in ``fault_scan_state``. Each
+cycle therefore only reads new rows. Findings are upserted in one bulk write. While a fault for the same module and check is still open,
+it is updated (``occurrences``, ``last_seen``, signals) instead of duplicated;
+a unique index on the ``dedupe_key`` of open faults enforces this. The scanner
+also records scan duration and lag, which feed ``GET /faults/summary``.
+
+Every API process starts the scanner, but only the holder of the
+``fault_scan`` lease scans; the others wait and take over if it stops
+renewing the lease for FAULT_SCAN_LEASE_SECONDS.
+
+    python -m app.services.fault_scan_service scan
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+import database
+from app.services import lease_service, sync_service
+from database import analytics_col, devices_col, energy_col, faults_col, scan_state_col
+
+logger = logging.getLogger(__name__)
+
+FAULT_SCAN_ENABLED = os.getenv("FAULT_SCAN_ENABLED", "true").lower() == "true"
+FAULT_SCAN_INTERVAL_SECONDS = float(os.getenv("FAULT_SCAN_INTERVAL_SECONDS", "60"))
+FAULT_SCAN_BATCH = int(os.getenv("FAULT_SCAN_BATCH", "50000"))
+FAULT_SCAN_SETTLE_SECONDS = float(os.getenv("FAULT_SCAN_SETTLE_SECONDS", "10"))
+FAULT_SCAN_LEASE_SECONDS = float(os.getenv("FAULT_SCAN_LEASE_SECONDS", str(5 * FAULT_SCAN_INTERVAL_SECONDS)))
+# A module seen for the first time, or silent for longer, is not scanned further back than this
+FAULT_SCAN_MAX_LOOKBACK_HOURS = float(os.getenv("FAULT_SCAN_MAX_LOOKBACK_HOURS", "24"))
+FAULT_OVERCURRENT_FACTOR = float(os.getenv("FAULT_OVERCURRENT_FACTOR", "1.25"))
+FAULT_OVERCURRENT_READINGS = int(os.getenv("FAULT_OVERCURRENT_READINGS", "3"))
+FAULT_STUCK_READINGS = int(os.getenv("FAULT_STUCK_READINGS", "30"))
+FAULT_TEMP_MAX = float(os.getenv("FAULT_TEMP_MAX", "40"))
+FAULT_TEMP_MIN = float(os.getenv("FAULT_TEMP_MIN", "5"))
+FAULT_TEMP_SIGMA = float(os.getenv("FAULT_TEMP_SIGMA", "5"))
+FAULT_DROPOUT_SECONDS = float(os.getenv("FAULT_DROPOUT_SECONDS", "600"))
+BASELINE_ALPHA = 0.01
+BASELINE_MIN_READINGS = 100
+SCANNER_STATE_ID = "scanner"
+LEASE_NAME = "fault_scan"
+OPEN_STATUSES = ["active", "acknowledged"]
+VOLTAGE_DEFAULT = float(os.getenv("ENERGY_VOLTAGE_DEFAULT", "230"))
+
+SOURCES = {
+    "energy": energy_col,
+    "occupancy": analytics_col,
+}
+# Only what the checks read
+PROJECTIONS = {
+    "energy": {"module": 1, "location": 1, "current_a": 1, "current_ma": 1, "received_at": 1},
+    "occupancy": {"module": 1, "location": 1, "temperature": 1, "humidity": 1, "received_at": 1},
+}
+RECOMMENDATIONS = {
+    "overcurrent": ("Check the load and wiring against the device rating", "immediate"),
+    "stuck_sensor": ("Power-cycle the module and inspect the sensor", "soon"),
+    "temperature_excursion": ("Inspect ventilation and the appliance near the sensor", "soon"),
+    "dropout": ("Check the module's power supply and WiFi coverage", "monitor"),
+}
+
+
+def _current_a(doc: dict) -> Optional[float]:
+    if isinstance(doc.get("current_a"), (int, float)):
+        return float(doc["current_a"])
+    if isinstance(doc.get("current_ma"), (int, float)):
+        return doc["current_ma"] / 1000
+    return None
+
+
+class ModuleState:
+    """Watermark and running state of one module in one telemetry collection."""
+
+    def __init__(self, source: str, module: str, doc: Optional[dict] = None):
+        doc = doc or {}
+        self.source = source
+        self.module = module
+        self.last_id: Optional[ObjectId] = doc.get("last_id")
+        self.last_reading_at: Optional[datetime] = doc.get("last_reading_at")
+        self.location: Optional[str] = doc.get("location")
+        self.runs: Dict[str, list] = doc.get("runs", {})  # metric -> [value, run length]
+        self.baseline: Dict[str, float] = doc.get("baseline", {"count": 0, "mean": 0.0, "var": 0.0})
+        self.dropout_reported_for: Optional[datetime] = doc.get("dropout_reported_for")
+
+    @property
+    def key(self) -> str:
+        return f"{self.source}:{self.module}"
+
+    def run(self, metric: str, value) -> int:
+        last = self.runs.get(metric)
+        if last is not None and last[0] == value:
+            last[1] += 1
+        else:
+            last = self.runs[metric] = [value, 1]
+        return last[1]
+
+    def baseline_deviation(self, value: float) -> Optional[float]:
+        """Standard deviations from the running baseline (None while learning), then fold the value in."""
+        b = self.baseline
+        deviation = None
+        if b["count"] >= BASELINE_MIN_READINGS and b["var"] > 0:
+            deviation = (value - b["mean"]) / math.sqrt(b["var"])
+        b["count"] += 1
+        alpha = max(BASELINE_ALPHA, 1.0 / b["count"])
+        diff = value - b["mean"]
+        b["mean"] += alpha * diff
+        b["var"] = (1 - alpha) * (b["var"] + alpha * diff * diff)
+        return deviation
+
+    def to_doc(self) -> dict:
+        return {
+            "source": self.source,
+            "module": self.module,
+            "location": self.location,
+            "last_id": self.last_id,
+            "last_reading_at": self.last_reading_at,
+            "runs": self.runs,
+            "baseline": self.baseline,
+            "dropout_reported_for": self.dropout_reported_for,
+        }
+
+
+class Finding:
+    __slots__ = ("check", "module", "location", "issue", "severity", "confidence", "at", "signals")
+
+    def __init__(self, check, module, location, issue, severity, confidence, at, signals):
+        self.check = check
+        self.module = module
+        self.location = location
+        self.issue = issue
+        self.severity = severity
+        self.confidence = confidence
+        self.at = at
+        self.signals = signals
+
+
+def check_energy(state: ModuleState, docs: List[dict], device: Optional[dict]) -> List[Finding]:
+    findings = []
+    rated_a = None
+    if device and device.get("rated_power_watts"):
+        rated_a = device["rated_power_watts"] / VOLTAGE_DEFAULT
+    over, peak, peak_at = 0, 0.0, None
+    stuck_reported = False
+    for doc in docs:
+        amps = _current_a(doc)
+        if amps is None:
+            continue
+        if rated_a is not None and amps > rated_a * FAULT_OVERCURRENT_FACTOR:
+            over += 1
+            if amps > peak:
+                peak, peak_at = amps, doc.get("received_at")
+        if state.run("current_a", amps) >= FAULT_STUCK_READINGS and amps > 0 and not stuck_reported:
+            stuck_reported = True
+            findings.append(Finding(
+                "stuck_sensor", state.module, state.location, "Current sensor reading is stuck",
+                "Medium", 0.8, doc.get("received_at"),
+                [{"name": "current_a", "value": amps, "unit": "A", "direction": "flat"}],
+            ))
+    if over >= FAULT_OVERCURRENT_READINGS:
+        findings.append(Finding(
+            "overcurrent", state.module, state.location, "Current above the device rating",
+            "Critical" if peak > rated_a * 2 else "High", min(0.6 + over * 0.05, 0.99), peak_at,
+            [
+                {"name": "current_a", "value": round(peak, 3), "unit": "A", "direction": "up"},
+                {"name": "rated_current_a", "value": round(rated_a, 3), "unit": "A"},
+            ],
+        ))
+    return findings
+
+
+def check_occupancy(state: ModuleState, docs: List[dict]) -> List[Finding]:
+    findings = []
+    excursion = None
+    stuck_reported = False
+    for doc in docs:
+        temperature = doc.get("temperature")
+        if not isinstance(temperature, (int, float)):
+            continue
+        deviation = state.baseline_deviation(float(temperature))
+        hard = temperature > FAULT_TEMP_MAX or temperature < FAULT_TEMP_MIN
+        statistical = deviation is not None and abs(deviation) >= FAULT_TEMP_SIGMA
+        if (hard or statistical) and (excursion is None or abs(temperature - state.baseline["mean"]) > abs(excursion[0] - state.baseline["mean"])):
+            excursion = (float(temperature), deviation, hard, doc.get("received_at"))
+        same_temp = state.run("temperature", temperature)
+        same_humidity = state.run("humidity", doc.get("humidity"))
+        if min(same_temp, same_humidity) >= FAULT_STUCK_READINGS and not stuck_reported:
+            stuck_reported = True
+            findings.append(Finding(
+                "stuck_sensor", state.module, state.location, "Temperature/humidity sensor reading is stuck",
+                "Medium", 0.8, doc.get("received_at"),
+                [{"name": "temperature", "value": float(temperature), "unit": "C", "direction": "flat"}],
+            ))
+    if excursion is not None:
+        temperature, deviation, hard, at = excursion
+        signals = [{"name": "temperature", "value": temperature, "unit": "C",
+                    "direction": "up" if temperature > state.baseline["mean"] else "down"}]
+        if deviation is not None:
+            signals.append({"name": "baseline_sigma", "value": round(deviation, 2)})
+        findings.append(Finding(
+            "temperature_excursion", state.module, state.location, "Temperature outside the normal range",
+            "High" if hard else "Medium", 0.9 if hard else 0.7, at, signals,
+        ))
+    return findings
+
+
+def check_gaps(state: ModuleState, docs: List[dict], now: datetime) -> List[Finding]:
+    """Gaps inside the new readings, or silence since the last one."""
+    longest, gap_end = 0.0, None
+    previous = state.last_reading_at
+    # A silence already reported as a dropout is not reported again when the module returns
+    already_reported = previous is not None and previous == state.dropout_reported_for
+    for doc in docs:
+        at = doc.get("received_at")
+        if not isinstance(at, datetime):
+            continue
+        if previous is not None and (at - previous).total_seconds() > longest:
+            if already_reported:
+                already_reported = False
+            else:
+                longest, gap_end = (at - previous).total_seconds(), at
+        previous = at if previous is None or at > previous else previous
+    silent = (now - previous).total_seconds() if previous is not None else 0.0
+    if silent > FAULT_DROPOUT_SECONDS and previous != state.dropout_reported_for:
+        # Reported once per silence, not on every cycle until the module returns
+        state.dropout_reported_for = previous
+        longest, gap_end = silent, now
+    if longest <= FAULT_DROPOUT_SECONDS:
+        return []
+    return [Finding(
+        "dropout", state.module, state.location, "Telemetry dropout",
+        "High" if longest > FAULT_DROPOUT_SECONDS * 6 else "Medium", 0.9, gap_end,
+        [{"name": "gap_seconds", "value": round(longest), "unit": "s", "direction": "down"}],
+    )]
+
+
+class FaultScanner:
+    def __init__(self, interval_seconds: float = FAULT_SCAN_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.owner = lease_service.owner_id()
+        self.leader = False
+        self.scans = 0
+        self.failures = 0
+        self.last_scan_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_lag_seconds: Optional[float] = None
+        self.last_readings = 0
+        self.last_findings = 0
+
+    async def _load_states(self, source: str, floor: datetime) -> Dict[str, ModuleState]:
+        docs = await scan_state_col.find(
+            {"source": source, "last_reading_at": {"$gte": floor}}
+        ).to_list()
+        return {d["module"]: ModuleState(source, d["module"], d) for d in docs}
+
+    async def _read_new(self, source: str, floor: datetime, settled: datetime):
+        """Rows inserted since the previous scan of this collection and before ``settled``, by ``_id``."""
+        cursor = await scan_state_col.find_one({"_id": f"cursor:{source}"})
+        start_id = ObjectId.from_datetime(floor)
+        if cursor and cursor.get("last_id") and cursor["last_id"] > start_id:
+            start_id = cursor["last_id"]
+        return await (
+            SOURCES[source]
+            .find({"_id": {"$gt": start_id, "$lt": ObjectId.from_datetime(settled)}}, PROJECTIONS[source])
+            .sort("_id", 1)
+            .limit(FAULT_SCAN_BATCH)
+            .to_list()
+        )
+
+    async def scan_once(self) -> dict:
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        floor = now - timedelta(hours=FAULT_SCAN_MAX_LOOKBACK_HOURS)
+        # Rows younger than this may still have older _ids in flight
+        settled = now - timedelta(seconds=FAULT_SCAN_SETTLE_SECONDS)
+        devices = {
+            d["module_id"]: d
+            for d in await devices_col.find({"module_id": {"$ne": None}}, {"_id": 0}).to_list()
+        }
+        findings: List[Finding] = []
+        state_ops = []
+        readings = 0
+        oldest_pending: Optional[datetime] = None
+
+        for source in SOURCES:
+            states = await self._load_states(source, floor)
+            docs = await self._read_new(source, floor, settled)
+            readings += len(docs)
+            if docs:
+                state_ops.append(UpdateOne(
+                    {"_id": f"cursor:{source}"}, {"$set": {"last_id": docs[-1]["_id"]}}, upsert=True
+                ))
+            if len(docs) >= FAULT_SCAN_BATCH:
+                # More is waiting: how far behind real time the scan is
+                pending_at = docs[-1]["_id"].generation_time.replace(tzinfo=None)
+                oldest_pending = pending_at if oldest_pending is None else min(oldest_pending, pending_at)
+
+            per_module: Dict[str, List[dict]] = {}
+            for doc in docs:
+                module = doc.get("module")
+                if not module:
+                    continue
+                state = states.get(module)
+                if state is not None and state.last_id is not None and doc["_id"] <= state.last_id:
+                    continue
+                per_module.setdefault(module, []).append(doc)
+
+            for module, module_docs in per_module.items():
+                state = states.setdefault(module, ModuleState(source, module))
+                state.location = module_docs[-1].get("location") or state.location
+                module_docs.sort(key=lambda d: d.get("received_at") or now)
+                if source == "energy":
+                    findings += check_energy(state, module_docs, devices.get(module))
+                else:
+                    findings += check_occupancy(state, module_docs)
+
+            for module, state in states.items():
+                module_docs = per_module.get(module, [])
+                # Silence is measured up to what was read, not up to now
+                gaps = check_gaps(state, module_docs, settled)
+                findings += gaps
+                if module_docs:
+                    state.last_id = max(d["_id"] for d in module_docs)
+                    times = [d["received_at"] for d in module_docs if isinstance(d.get("received_at"), datetime)]
+                    if times:
+                        state.last_reading_at = max(times + ([state.last_reading_at] if state.last_reading_at else []))
+                if module_docs or gaps:
+                    state_ops.append(UpdateOne({"_id": state.key}, {"$set": state.to_doc()}, upsert=True))
+
+        await self._store(findings, devices)
+        if state_ops:
+            await scan_state_col.bulk_write(state_ops, ordered=False)
+
+        self.scans += 1
+        self.last_scan_at = now
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.last_lag_seconds = round((now - oldest_pending).total_seconds(), 1) if oldest_pending else 0.0
+        self.last_readings = readings
+        self.last_findings = len(findings)
+        summary = {
+            "last_scan_at": now,
+            "duration_ms": self.last_duration_ms,
+            "lag_seconds": self.last_lag_seconds,
+            "readings": readings,
+            "findings": len(findings),
+            "interval_seconds": self.interval_seconds,
+        }
+        await scan_state_col.replace_one({"_id": SCANNER_STATE_ID}, summary, upsert=True)
+        return summary
+
+    async def _store(self, findings: List[Finding], devices: Dict[str, dict]):
+        """One bulk write; an open fault of the same module and check is updated rather than duplicated."""
+        if not findings:
+            return
+        ops = []
+        versions = await sync_service.version_block(len(findings))
+        for f, version in zip(findings, versions):
+            device = devices.get(f.module) or {}
+            short, priority = RECOMMENDATIONS[f.check]
+            dedupe_key = f"{f.module}:{f.check}"
+            ops.append(UpdateOne(
+                {"dedupe_key": dedupe_key, "status": {"$in": OPEN_STATUSES}},
+                {
+                    "$setOnInsert": {
+                        "fault_id": f"F-SCAN-{uuid.uuid4().hex[:12]}",
+                        "dedupe_key": dedupe_key,
+                        "check": f.check,
+                        "device_id": device.get("device_id") or f.module,
+                        "device_name": device.get("device_name"),
+                        "module": f.module,
+                        "location": f.location or device.get("location"),
+                        "issue": f.issue,
+                        "detected_at": f.at or datetime.utcnow(),
+                        "status": "active",
+                        "recommendation": {"short": short, "priority": priority},
+                        "source": "scanner:rules",
+                    },
+                    "$set": {
+                        "severity": f.severity,
+                        "confidence": f.confidence,
+                        "signals": f.signals,
+                        "last_seen": f.at or datetime.utcnow(),
+                        **version,
+                    },
+                    "$inc": {"occurrences": 1},
+                },
+                upsert=True,
+            ))
+        await upsert_open_faults(ops)
+
+    # -- scheduling --------------------------------------------------------
+
+    async def _loop(self):
+        while True:
+            try:
+                self.leader = await lease_service.acquire(LEASE_NAME, self.owner, FAULT_SCAN_LEASE_SECONDS)
+                if self.leader:
+                    result = await self.scan_once()
+                    if result["findings"]:
+                        logger.info("Fault scan: %d readings, %d findings in %.0f ms",
+                                    result["readings"], result["findings"], result["duration_ms"])
+            except Exception:
+                self.failures += 1
+                logger.exception("Fault scan failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if FAULT_SCAN_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.leader:
+            self.leader = False
+            await lease_service.release(LEASE_NAME, self.owner)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": FAULT_SCAN_ENABLED and self._task is not None,
+            "leader": self.leader,
+            "interval_seconds": self.interval_seconds,
+            "scans": self.scans,
+            "failures": self.failures,
+            "last_duration_ms": self.last_duration_ms,
+            "last_lag_seconds": self.last_lag_seconds,
+            "last_readings": self.last_readings,
+            "last_findings": self.last_findings,
+        }
+
+
+scanner = FaultScanner()
+
+
+async def upsert_open_faults(ops: List[UpdateOne]):
+    """
+    Run open-fault upserts (filtered on ``dedupe_key`` and OPEN_STATUSES). When
+    two writers insert the same fault at once, the unique index rejects one;
+    retrying it then updates the fault the other one inserted.
+    """
+    try:
+        await faults_col.bulk_write(ops, ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        if not errors or any(e.get("code") != 11000 for e in errors):
+            raise
+        await faults_col.bulk_write([ops[e["index"]] for e in errors], ordered=False)
+
+
+async def ensure_indexes():
+    await scan_state_col.create_index([("source", 1), ("last_reading_at", 1)])
+    try:
+        # At most one open fault per dedupe key ($in in a partial filter needs MongoDB 6.0)
+        await faults_col.create_index(
+            "dedupe_key",
+            name="open_dedupe_key",
+            unique=True,
+            partialFilterExpression={"dedupe_key": {"$exists": True}, "status": {"$in": OPEN_STATUSES}},
+        )
+    except OperationFailure as exc:
+        logger.warning("Could not create the unique open-fault index (resolve duplicate open faults first): %s", exc)
+
+
+async def scan_status() -> dict:
+    """Last scan as recorded by whichever process ran it."""
+    return await scan_state_col.find_one({"_id": SCANNER_STATE_ID}, {"_id": 0}) or {}
+
+
+async def _main(args):
+    try:
+        if args.command == "scan":
+            await ensure_indexes()
+            if not await lease_service.acquire(LEASE_NAME, scanner.owner, FAULT_SCAN_LEASE_SECONDS):
+                print({"skipped": "another process holds the fault_scan lease", **(await lease_service.holder(LEASE_NAME) or {})})
+                return
+            try:
+                print(await scanner.scan_once())
+            finally:
+                await lease_service.release(LEASE_NAME, scanner.owner)
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental telemetry fault scanner")
+    parser.add_argument("command", choices=["scan"])
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,452 @@
+"""
+Batch energy forecasting.
+
+Energy and occupancy telemetry are aggregated to hourly rows per location in
+MongoDB (kWh from mean current x voltage, mean temperature, share of occupied
+readings). They are laid out as a dense ``locations x hours`` NumPy grid, so
+every feature is a column shift of that grid rather than a Python loop:
+
+- hour-of-week and hour-of-day (sin/cos)
+- load 24 h and 168 h earlier, and the mean load of the previous day
+- temperature and occupancy ratio 24 h earlier, and occupancy 168 h earlier
+
+Only lags of 24 h or more are used, so the next FORECAST_HORIZON_HOURS are
+predicted in one ``predict`` call without feeding forecasts back in.
+
+Each location gets its own gradient-boosted model once it has
+FORECAST_MIN_HOURS of history. Otherwise, or with FORECAST_SCOPE=pooled, it
+falls back to a model shared by all locations. Models are trained on whole
+days and cached in memory and under FORECAST_MODEL_DIR. The cache key is a
+hash of the training data, so a model is refit only when its data changes,
+at most once a day unless late readings arrive.
+
+Fitting runs in the analytics process pool (utils.cpu_pool), so each worker
+process keeps its own in-memory model cache on top of the shared disk cache.
+A run forecasts every location, splits each location's kWh over its devices
+by rated power, and upserts one ``daily`` Prediction per device and
+``forecast_start`` in a single bulk write, so running again for the same
+hour replaces that window's predictions instead of adding more. numpy, scikit-learn and joblib are imported lazily so API
+startup does not pay for them.
+
+    python -m app.services.forecast_service run
+    python -m app.services.forecast_service run --scope pooled --dry-run
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pymongo import ReplaceOne
+
+import database
+from database import BASE_DIR, analytics_col, devices_col, energy_col, prediction_col
+from utils.cpu_pool import cpu_pool
+
+logger = logging.getLogger(__name__)
+
+FORECAST_MODEL_DIR = Path(os.getenv("FORECAST_MODEL_DIR", str(BASE_DIR / "data" / "models" / "forecast")))
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "28"))
+FORECAST_HORIZON_HOURS = int(os.getenv("FORECAST_HORIZON_HOURS", "24"))
+FORECAST_MIN_HOURS = int(os.getenv("FORECAST_MIN_HOURS", str(7 * 24)))
+FORECAST_SCOPE = os.getenv("FORECAST_SCOPE", "location")  # location | pooled
+FORECAST_TIMEOUT_SECONDS = float(os.getenv("FORECAST_TIMEOUT_SECONDS", "600"))
+VOLTAGE_DEFAULT = float(os.getenv("ENERGY_VOLTAGE_DEFAULT", "230"))
+# Bump when the features change so cached models are not reused with the wrong inputs
+FEATURE_VERSION = 1
+FEATURES = (
+    "how_sin", "how_cos", "hod_sin", "hod_cos",
+    "kwh_24h", "kwh_168h", "kwh_prev_day_mean",
+    "temperature_24h", "occupancy_24h", "occupancy_168h",
+    "location_mean_kwh",
+)
+HOLDOUT_HOURS = 24
+POOLED = "_pooled"
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+async def hourly_aggregates(start: datetime, end: datetime) -> Dict[str, List[dict]]:
+    """Hourly energy and occupancy rows per location in [start, end)."""
+    hour = {"$dateTrunc": {"date": "$received_at", "unit": "hour"}}
+    window = {"received_at": {"$gte": start, "$lt": end}, "location": {"$nin": [None, ""]}}
+    energy = [
+        {"$match": window},
+        {"$project": {
+            "location": 1,
+            "module": 1,
+            "hour": hour,
+            "watts": {"$multiply": [
+                {"$ifNull": ["$current_a", {"$divide": ["$current_ma", 1000]}]},
+                {"$ifNull": ["$voltage", VOLTAGE_DEFAULT]},
+            ]},
+        }},
+        # Mean power of each module over the hour is its kWh for that hour
+        {"$group": {"_id": {"location": "$location", "module": "$module", "hour": "$hour"}, "watts": {"$avg": "$watts"}}},
+        {"$group": {"_id": {"location": "$_id.location", "hour": "$_id.hour"}, "kwh": {"$sum": {"$divide": ["$watts", 1000]}}}},
+    ]
+    occupancy = [
+        {"$match": window},
+        {"$group": {
+            "_id": {"location": "$location", "hour": hour},
+            "temperature": {"$avg": "$temperature"},
+            "occupancy": {"$avg": {"$cond": [{"$or": [{"$gt": ["$pir", 0]}, {"$gt": ["$rcwl", 0]}]}, 1, 0]}},
+        }},
+    ]
+    return {
+        "energy": await (await energy_col.aggregate(energy)).to_list(),
+        "occupancy": await (await analytics_col.aggregate(occupancy)).to_list(),
+    }
+
+
+class Grid:
+    """Hourly series of every location as dense ``locations x hours`` arrays (NaN where missing)."""
+
+    def __init__(self, start: datetime, hours: int, locations: List[str]):
+        import numpy as np
+
+        self.start = start
+        self.hours = hours
+        self.locations = locations
+        self.kwh = np.full((len(locations), hours), np.nan)
+        self.temperature = np.full((len(locations), hours), np.nan)
+        self.occupancy = np.full((len(locations), hours), np.nan)
+
+    @classmethod
+    def from_aggregates(cls, rows: Dict[str, List[dict]], start: datetime, hours: int) -> "Grid":
+        locations = sorted({r["_id"]["location"] for r in rows["energy"]})
+        grid = cls(start, hours, locations)
+        index = {name: i for i, name in enumerate(locations)}
+        for source, fields in (("energy", ("kwh",)), ("occupancy", ("temperature", "occupancy"))):
+            for r in rows[source]:
+                row = index.get(r["_id"]["location"])
+                col = int((r["_id"]["hour"] - start).total_seconds() // 3600)
+                if row is None or not 0 <= col < hours:
+                    continue
+                for field in fields:
+                    if isinstance(r.get(field), (int, float)):
+                        getattr(grid, field)[row, col] = r[field]
+        return grid
+
+
+def _lag(a, hours: int):
+    import numpy as np
+
+    out = np.full_like(a, np.nan)
+    out[:, hours:] = a[:, :-hours]
+    return out
+
+
+def _rolling_mean(a, window: int):
+    """Mean of the last ``window`` columns ending at each column, ignoring NaN."""
+    import numpy as np
+
+    valid = ~np.isnan(a)
+    sums = np.cumsum(np.where(valid, a, 0.0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    sums = np.concatenate([np.zeros((a.shape[0], 1)), sums], axis=1)
+    counts = np.concatenate([np.zeros((a.shape[0], 1)), counts], axis=1)
+    window_sums = sums[:, window:] - sums[:, :-window]
+    window_counts = counts[:, window:] - counts[:, :-window]
+    out = np.full_like(a, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[:, window - 1:] = np.where(window_counts >= window // 2, window_sums / window_counts, np.nan)
+    return out
+
+
+def build_features(grid: Grid, train_hours: int):
+    """``locations x hours x FEATURES`` array; means only use the first ``train_hours`` columns."""
+    import numpy as np
+
+    offset = grid.start.weekday() * 24 + grid.start.hour
+    how = (offset + np.arange(grid.hours)) % 168
+    hod = how % 24
+    n = len(grid.locations)
+    kwh_24h = _lag(grid.kwh, 24)
+    with warnings.catch_warnings():
+        # A location without training data has an all-NaN row; NaN is the right mean for it
+        warnings.simplefilter("ignore", RuntimeWarning)
+        location_mean = np.nanmean(grid.kwh[:, :train_hours], axis=1)
+    columns = [
+        np.sin(2 * np.pi * how / 168),
+        np.cos(2 * np.pi * how / 168),
+        np.sin(2 * np.pi * hod / 24),
+        np.cos(2 * np.pi * hod / 24),
+    ]
+    columns = [np.broadcast_to(c, (n, grid.hours)) for c in columns] + [
+        kwh_24h,
+        _lag(grid.kwh, 168),
+        _rolling_mean(kwh_24h, 24),
+        _lag(grid.temperature, 24),
+        _lag(grid.occupancy, 24),
+        _lag(grid.occupancy, 168),
+        np.broadcast_to(location_mean[:, None], (n, grid.hours)),
+    ]
+    return np.stack(columns, axis=-1)
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)[:60] or "_"
+
+
+class ModelCache:
+    """Fitted models by (name, data version), in memory and on disk."""
+
+    def __init__(self, directory: Path = FORECAST_MODEL_DIR):
+        self.directory = directory
+        self._models: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.fits = 0
+
+    def _path(self, name: str, version: str) -> Path:
+        return self.directory / f"{_slug(name)}--{version}.joblib"
+
+    def get(self, name: str, version: str):
+        """The cached ``_fit`` result, or None."""
+        with self._lock:
+            cached = self._models.get(name)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            return cached[1]
+        path = self._path(name, version)
+        if path.exists():
+            import joblib
+
+            try:
+                entry = joblib.load(path)
+            except Exception as exc:
+                logger.warning("Discarding unreadable model %s: %s", path.name, exc)
+                return None
+            with self._lock:
+                self._models[name] = (version, entry)
+            self.disk_hits += 1
+            return entry
+        return None
+
+    def put(self, name: str, version: str, entry: tuple):
+        import joblib
+
+        self.fits += 1
+        with self._lock:
+            self._models[name] = (version, entry)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(name, version)
+        tmp_path = path.with_suffix(".tmp")
+        joblib.dump(entry, tmp_path)
+        os.replace(tmp_path, path)
+        # Older versions of the same model are never loaded again
+        for stale in self.directory.glob(f"{_slug(name)}--*.joblib"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {"models": len(self._models), "hits": self.hits, "disk_hits": self.disk_hits, "fits": self.fits}
+
+
+model_cache = ModelCache()
+
+
+def _data_version(X, y) -> str:
+    import numpy as np
+
+    digest = hashlib.sha1(f"v{FEATURE_VERSION}:{X.shape}".encode())
+    digest.update(np.round(X, 4).tobytes())
+    digest.update(np.round(y, 4).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _fit(X, y) -> tuple:
+    """
+    (model, confidence, columns): confidence is 1 - WAPE on the last HOLDOUT_HOURS,
+    then the model is refit on everything.
+    """
+    import numpy as np
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    # Columns without at least two distinct values (a location without occupancy
+    # sensors, say) carry no information and break the binning of the regressor
+    columns = [j for j in range(X.shape[1]) if np.unique(X[~np.isnan(X[:, j]), j]).size > 1]
+    X = X[:, columns]
+
+    def model():
+        return HistGradientBoostingRegressor(max_iter=200, learning_rate=0.05, min_samples_leaf=10, random_state=0)
+
+    confidence = 0.5
+    if len(y) > HOLDOUT_HOURS * 3:
+        holdout = model().fit(X[:-HOLDOUT_HOURS], y[:-HOLDOUT_HOURS])
+        error = np.abs(holdout.predict(X[-HOLDOUT_HOURS:]) - y[-HOLDOUT_HOURS:]).sum()
+        total = np.abs(y[-HOLDOUT_HOURS:]).sum()
+        confidence = float(np.clip(1 - error / total, 0, 1)) if total > 0 else 0.5
+    return model().fit(X, y), round(confidence, 3), columns
+
+
+def _model(name: str, X, y, cache: ModelCache) -> tuple:
+    version = _data_version(X, y)
+    entry = cache.get(name, version)
+    if entry is None:
+        entry = _fit(X, y)
+        cache.put(name, version, entry)
+    return entry + (version,)
+
+
+def forecast(grid: Grid, train_hours: int, horizon: int, scope: str = FORECAST_SCOPE,
+             cache: Optional[ModelCache] = None) -> Dict[str, dict]:
+    """
+    Fit (or load) models on the first ``train_hours`` columns and predict the last
+    ``horizon`` columns of every location. CPU only, no I/O besides the model cache.
+    """
+    import numpy as np
+
+    cache = cache or model_cache
+    features = build_features(grid, train_hours)
+    train_X = features[:, :train_hours]
+    train_y = grid.kwh[:, :train_hours]
+    usable = ~np.isnan(train_y) & ~np.isnan(train_X[..., FEATURES.index("kwh_24h")])
+    future = features[:, -horizon:]
+
+    per_location = usable.sum(axis=1) >= FORECAST_MIN_HOURS if scope == "location" else np.zeros(len(grid.locations), bool)
+    models = {}
+    if not per_location.all() and usable.any():
+        # Rows in time order so the holdout is the most recent day of every location
+        order = np.argsort(np.broadcast_to(np.arange(train_hours), usable.shape)[usable], kind="stable")
+        models[POOLED] = _model(POOLED, train_X[usable][order], train_y[usable][order], cache)
+
+    results = {}
+    for i, location in enumerate(grid.locations):
+        if per_location[i]:
+            mask = usable[i]
+            model, confidence, columns, version = _model(location, train_X[i][mask], train_y[i][mask], cache)
+            scope_used = "location"
+        elif POOLED in models:
+            model, confidence, columns, version = models[POOLED]
+            scope_used = "pooled"
+        else:
+            continue
+        hourly = np.clip(model.predict(future[i][:, columns]), 0, None)
+        results[location] = {
+            "hourly_kwh": [round(float(v), 4) for v in hourly],
+            "total_kwh": round(float(hourly.sum()), 4),
+            "confidence": confidence,
+            "scope": scope_used,
+            "model_version": version,
+        }
+    return results
+
+
+def forecast_arrays(kwh, temperature, occupancy, start: datetime, locations: List[str], train_hours: int,
+                    horizon: int, scope: str) -> dict:
+    """``forecast`` over plain arrays, for the analytics process pool; also reports that process's model cache."""
+    grid = Grid(start, kwh.shape[1], locations)
+    grid.kwh, grid.temperature, grid.occupancy = kwh, temperature, occupancy
+    return {"forecasts": forecast(grid, train_hours, horizon, scope), "cache": model_cache.stats()}
+
+
+def allocate(devices: List[dict], forecasts: Dict[str, dict]) -> List[tuple]:
+    """Split each location's forecast over its devices by rated power: (device, kWh, location forecast)."""
+    by_location: Dict[str, List[dict]] = {}
+    for device in devices:
+        if device.get("location") in forecasts:
+            by_location.setdefault(device["location"], []).append(device)
+    shares = []
+    for location, members in by_location.items():
+        total_watts = sum(max(d.get("rated_power_watts") or 0, 0) for d in members)
+        for device in members:
+            share = (max(device.get("rated_power_watts") or 0, 0) / total_watts) if total_watts else 1 / len(members)
+            shares.append((device, forecasts[location]["total_kwh"] * share, forecasts[location]))
+    return shares
+
+
+async def run(now: Optional[datetime] = None, scope: str = FORECAST_SCOPE, persist: bool = True) -> dict:
+    """Forecast the next FORECAST_HORIZON_HOURS for every location and device."""
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    # The current hour is still filling up: history ends before it, the forecast starts with it
+    history_end = _floor_hour(now)
+    history_start = history_end - timedelta(days=FORECAST_HISTORY_DAYS)
+    # Train on whole days so the data version, and the model, only changes once a day
+    train_end = history_end.replace(hour=0)
+    train_hours = int((train_end - history_start).total_seconds() // 3600)
+    history_hours = int((history_end - history_start).total_seconds() // 3600)
+
+    rows = await hourly_aggregates(history_start, history_end)
+    grid = Grid.from_aggregates(rows, history_start, history_hours + FORECAST_HORIZON_HOURS)
+    result = await cpu_pool.run(
+        forecast_arrays,
+        arrays={"kwh": grid.kwh, "temperature": grid.temperature, "occupancy": grid.occupancy},
+        timeout=FORECAST_TIMEOUT_SECONDS,
+        start=history_start,
+        locations=grid.locations,
+        train_hours=train_hours,
+        horizon=FORECAST_HORIZON_HOURS,
+        scope=scope,
+    )
+    forecasts = result["forecasts"]
+
+    devices = await devices_col.find(
+        {}, {"_id": 0, "device_id": 1, "device_name": 1, "location": 1, "rated_power_watts": 1}
+    ).to_list()
+    created_at = datetime.utcnow()
+    forecast_end = history_end + timedelta(hours=FORECAST_HORIZON_HOURS)
+    docs = [
+        {
+            "device_id": device["device_id"],
+            "location": device["location"],
+            "predicted_energy_kwh": round(kwh, 4),
+            "confidence_score": location_forecast["confidence"],
+            "prediction_type": "daily",
+            "forecast_start": history_end,
+            "forecast_end": forecast_end,
+            "model": f"hist_gbr:{location_forecast['scope']}",
+            "model_version": location_forecast["model_version"],
+            "created_at": created_at,
+        }
+        for device, kwh, location_forecast in allocate(devices, forecasts)
+    ]
+    if persist and docs:
+        window = {"prediction_type": "daily", "forecast_start": history_end}
+        await prediction_col.bulk_write(
+            [ReplaceOne({**window, "device_id": doc["device_id"]}, doc, upsert=True) for doc in docs],
+            ordered=False,
+        )
+        # Devices removed since an earlier run of this window
+        await prediction_col.delete_many({**window, "device_id": {"$nin": [doc["device_id"] for doc in docs]}})
+    return {
+        "forecast_start": history_end,
+        "forecast_end": forecast_end,
+        "locations": len(forecasts),
+        "predictions": len(docs),
+        "pooled_locations": sum(1 for f in forecasts.values() if f["scope"] == "pooled"),
+        "seconds": round(time.perf_counter() - started, 2),
+        "cache": result["cache"],
+        "forecasts": forecasts,
+    }
+
+
+async def _main(args):
+    try:
+        if args.command == "run":
+            result = await run(scope=args.scope, persist=not args.dry_run)
+            for location, f in result.pop("forecasts").items():
+                print(f"{location}: {f['total_kwh']:.2f} kWh ({f['scope']}, confidence {f['confidence']})")
+            print(result)
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch energy forecasting")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--scope", choices=["location", "pooled"], default=FORECAST_SCOPE)
+    parser.add_argument("--dry-run", action="store_true", help="Print forecasts without storing predictions")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,387 @@
+"""
+Module heartbeats and offline detection.
+
+The ingest path keeps one document per module in ``module_heartbeats``:
+last and first reading time, reading counts (in total and per source) and
+the latest vitals the module reported (uptime, free heap, RSSI, IP, MAC). Each
+batch costs one upsert per module in it. The upserts only use ``$max``/``$min``/``$inc``/``$set``, so
+concurrent API processes never need to read first.
+
+Every HEARTBEAT_SWEEP_SECONDS a sweeper reads all heartbeats (one document per
+module, never raw telemetry) and does the following:
+
+- learns each module's reporting interval per source (energy and occupancy
+  report on their own schedules) from how many readings of that source arrived
+  since the previous sweep (EWMA). The module is expected to report at least
+  as often as its slowest source;
+- marks a module offline once it has been silent for HEARTBEAT_MISSED_INTERVALS
+  of its interval (at least HEARTBEAT_MIN_SILENCE_SECONDS). This raises one
+  fault, which is resolved when the module reports again;
+- counts restarts, seen as uptime going backwards.
+
+Liveness is also computed at read time from ``last_seen``, so the endpoints
+are accurate between sweeps. Only the holder of the ``heartbeat_sweep`` lease
+sweeps, so restarts and faults are counted once however many API processes
+run.
+
+    python -m app.services.heartbeat_service sweep
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+import database
+from app.services import lease_service, sync_service
+from app.services.fault_scan_service import OPEN_STATUSES, upsert_open_faults
+from database import devices_col, faults_col, heartbeats_col
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SWEEP_ENABLED = os.getenv("HEARTBEAT_SWEEP_ENABLED", "true").lower() == "true"
+HEARTBEAT_SWEEP_SECONDS = float(os.getenv("HEARTBEAT_SWEEP_SECONDS", "60"))
+# Assumed interval of a module until one has been learned
+HEARTBEAT_DEFAULT_INTERVAL_SECONDS = float(os.getenv("HEARTBEAT_DEFAULT_INTERVAL_SECONDS", "60"))
+HEARTBEAT_MISSED_INTERVALS = float(os.getenv("HEARTBEAT_MISSED_INTERVALS", "5"))
+HEARTBEAT_MIN_SILENCE_SECONDS = float(os.getenv("HEARTBEAT_MIN_SILENCE_SECONDS", "180"))
+HEARTBEAT_LEASE_SECONDS = float(os.getenv("HEARTBEAT_LEASE_SECONDS", str(5 * HEARTBEAT_SWEEP_SECONDS)))
+INTERVAL_ALPHA = 0.2
+LEASE_NAME = "heartbeat_sweep"
+VITALS = ("uptime", "heap", "rssi", "ip", "mac")
+
+
+def _vitals(doc: dict) -> dict:
+    vitals = {field: doc[field] for field in VITALS if doc.get(field) is not None}
+    if "rssi" not in vitals and isinstance(doc.get("wifi_rssi"), int):
+        vitals["rssi"] = doc["wifi_rssi"]
+    return vitals
+
+
+def _utc(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def heartbeat_updates(source: str, docs: List[dict]) -> List[UpdateOne]:
+    """One upsert per module in the batch."""
+    batches: Dict[str, dict] = {}
+    for doc in docs:
+        module, ts = doc.get("module"), doc.get("received_at")
+        if not module or not isinstance(ts, datetime):
+            continue
+        ts = _utc(ts)
+        batch = batches.setdefault(module, {"first": ts, "last": ts, "latest": doc, "count": 0})
+        batch["count"] += 1
+        batch["first"] = min(batch["first"], ts)
+        if ts >= batch["last"]:
+            batch["last"], batch["latest"] = ts, doc
+
+    ops = []
+    for module, batch in batches.items():
+        latest = batch["latest"]
+        fields = {f"vitals.{key}": value for key, value in _vitals(latest).items()}
+        if latest.get("location"):
+            fields["location"] = latest["location"]
+        update = {
+            "$max": {"last_seen": batch["last"], f"sources.{source}": batch["last"]},
+            "$min": {"first_seen": batch["first"]},
+            "$inc": {"readings": batch["count"], f"counts.{source}": batch["count"]},
+        }
+        if fields:
+            fields["vitals_at"] = batch["last"]
+            update["$set"] = fields
+        ops.append(UpdateOne({"_id": module}, update, upsert=True))
+    return ops
+
+
+async def record_readings(source: str, docs: List[dict]):
+    """Called by the ingest path after a batch is stored."""
+    ops = heartbeat_updates(source, docs)
+    if ops:
+        await heartbeats_col.bulk_write(ops, ordered=False)
+
+
+def silence_limit(doc: dict) -> float:
+    interval = doc.get("interval_seconds") or HEARTBEAT_DEFAULT_INTERVAL_SECONDS
+    return max(HEARTBEAT_MIN_SILENCE_SECONDS, HEARTBEAT_MISSED_INTERVALS * interval)
+
+
+def liveness(doc: dict, now: datetime) -> dict:
+    """The heartbeat as the API shows it, with status computed for ``now``."""
+    silent = (now - doc["last_seen"]).total_seconds() if isinstance(doc.get("last_seen"), datetime) else None
+    limit = silence_limit(doc)
+    return {
+        "module": doc["_id"],
+        "location": doc.get("location"),
+        "status": "offline" if silent is None or silent > limit else "online",
+        "last_seen": doc.get("last_seen"),
+        "silent_seconds": round(silent, 1) if silent is not None else None,
+        "offline_after_seconds": round(limit, 1),
+        "interval_seconds": doc.get("interval_seconds"),
+        "intervals": doc.get("intervals") or {},
+        "offline_since": doc.get("offline_since"),
+        "readings": doc.get("readings", 0),
+        "restarts": doc.get("restarts", 0),
+        "vitals": doc.get("vitals") or {},
+        "vitals_at": doc.get("vitals_at"),
+        "sources": doc.get("sources") or {},
+    }
+
+
+def _observed_interval(before: dict, readings: int, last_seen) -> Optional[float]:
+    """Mean seconds per reading of one source since the previous sweep."""
+    if before.get("readings") is None or readings <= before["readings"]:
+        return None
+    if not isinstance(before.get("last_seen"), datetime) or not isinstance(last_seen, datetime):
+        return None
+    observed = (last_seen - before["last_seen"]).total_seconds() / (readings - before["readings"])
+    return observed if observed > 0 else None
+
+
+def sweep_module(doc: dict, now: datetime) -> Optional[dict]:
+    """
+    Next sweep state of one module: ``$set`` fields plus the transition
+    ("offline", "online" or None). Returns None when nothing changed.
+    """
+    previous = doc.get("sweep") or {}
+    readings = doc.get("readings", 0)
+    last_seen = doc.get("last_seen")
+    counts = doc.get("counts") or {}
+    sources = doc.get("sources") or {}
+    fields: dict = {}
+    # Each source is learned on its own; mixing them would halve a module's interval
+    intervals = dict(doc.get("intervals") or {})
+    learned = False
+    if doc.get("status") != "offline":
+        for source, count in counts.items():
+            observed = _observed_interval((previous.get("sources") or {}).get(source) or {}, count, sources.get(source))
+            if observed is not None:
+                interval = intervals.get(source)
+                intervals[source] = round(observed if interval is None else interval + INTERVAL_ALPHA * (observed - interval), 2)
+                learned = True
+    if learned:
+        fields["intervals"] = intervals
+        fields["interval_seconds"] = max(intervals.values())
+    uptime = (doc.get("vitals") or {}).get("uptime")
+    restarted = isinstance(uptime, (int, float)) and isinstance(previous.get("uptime"), (int, float)) and uptime < previous["uptime"]
+
+    status = liveness({**doc, **fields}, now)["status"]
+    # A module seen for the first time is not "back online"
+    transition = status if status != (doc.get("status") or "online") else None
+    if transition == "offline":
+        fields["offline_since"] = last_seen
+    elif transition == "online":
+        fields["offline_since"] = None
+    snapshot = {
+        "readings": readings,
+        "last_seen": last_seen,
+        "uptime": uptime,
+        "sources": {source: {"readings": count, "last_seen": sources.get(source)} for source, count in counts.items()},
+    }
+    if previous != snapshot:
+        fields["sweep"] = snapshot
+    if not fields and transition is None and not restarted:
+        return None
+    fields["status"] = status
+    return {"set": fields, "transition": transition, "restarted": restarted}
+
+
+class HeartbeatSweeper:
+    def __init__(self, interval_seconds: float = HEARTBEAT_SWEEP_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.owner = lease_service.owner_id()
+        self.leader = False
+        self.sweeps = 0
+        self.failures = 0
+        self.last_duration_ms: Optional[float] = None
+        self.modules = 0
+        self.offline = 0
+        self.went_offline = 0
+        self.came_back = 0
+
+    async def sweep_once(self) -> dict:
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        docs = await heartbeats_col.find({}, {"vitals.ip": 0, "vitals.mac": 0}).to_list()
+        ops, offline, online = [], [], []
+        for doc in docs:
+            result = sweep_module(doc, now)
+            if result is None:
+                continue
+            update = {"$set": result["set"]}
+            if result["restarted"]:
+                update["$inc"] = {"restarts": 1}
+            ops.append(UpdateOne({"_id": doc["_id"]}, update))
+            if result["transition"] == "offline":
+                offline.append(doc)
+            elif result["transition"] == "online":
+                online.append(doc["_id"])
+        if ops:
+            await heartbeats_col.bulk_write(ops, ordered=False)
+        await self._raise_faults(offline, now)
+        await self._resolve_faults(online)
+
+        self.sweeps += 1
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.modules = len(docs)
+        self.offline = sum(1 for doc in docs if liveness(doc, now)["status"] == "offline")
+        self.went_offline += len(offline)
+        self.came_back += len(online)
+        return {
+            "modules": self.modules,
+            "offline": self.offline,
+            "went_offline": len(offline),
+            "came_back": len(online),
+            "duration_ms": self.last_duration_ms,
+        }
+
+    async def _raise_faults(self, docs: List[dict], now: datetime):
+        """One fault per module going offline; an open one is updated rather than duplicated."""
+        if not docs:
+            return
+        devices = {
+            d["module_id"]: d
+            for d in await devices_col.find(
+                {"module_id": {"$in": [doc["_id"] for doc in docs]}}, {"_id": 0, "module_id": 1, "device_id": 1, "device_name": 1}
+            ).to_list()
+        }
+        ops = []
+        versions = await sync_service.version_block(len(docs))
+        for doc, version in zip(docs, versions):
+            module = doc["_id"]
+            device = devices.get(module) or {}
+            silent = (now - doc["last_seen"]).total_seconds()
+            dedupe_key = f"{module}:offline"
+            ops.append(UpdateOne(
+                {"dedupe_key": dedupe_key, "status": {"$in": OPEN_STATUSES}},
+                {
+                    "$setOnInsert": {
+                        "fault_id": f"F-HB-{uuid.uuid4().hex[:12]}",
+                        "dedupe_key": dedupe_key,
+                        "check": "offline",
+                        "device_id": device.get("device_id") or module,
+                        "device_name": device.get("device_name"),
+                        "module": module,
+                        "location": doc.get("location"),
+                        "issue": "Module stopped reporting",
+                        "detected_at": now,
+                        "status": "active",
+                        "recommendation": {"short": "Check the module's power supply and WiFi coverage", "priority": "soon"},
+                        "source": "heartbeat",
+                    },
+                    "$set": {
+                        "severity": "High",
+                        "confidence": 0.9,
+                        "signals": [
+                            {"name": "silent_seconds", "value": round(silent), "unit": "s"},
+                            {"name": "expected_interval_seconds", "value": doc.get("interval_seconds") or HEARTBEAT_DEFAULT_INTERVAL_SECONDS, "unit": "s"},
+                        ],
+                        "last_seen": doc["last_seen"],
+                        **version,
+                    },
+                    "$inc": {"occurrences": 1},
+                },
+                upsert=True,
+            ))
+        await upsert_open_faults(ops)
+
+    async def _resolve_faults(self, modules: List[str]):
+        if not modules:
+            return
+        open_faults = {"dedupe_key": {"$in": [f"{module}:offline" for module in modules]}, "status": {"$in": OPEN_STATUSES}}
+        ids = [doc["_id"] for doc in await faults_col.find(open_faults, {"_id": 1}).to_list()]
+        if not ids:
+            return
+        # Each fault gets its own sequence number so delta sync pages cannot split a shared one
+        resolved_at = datetime.utcnow()
+        versions = await sync_service.version_block(len(ids))
+        await faults_col.bulk_write([
+            UpdateOne({"_id": _id, "status": {"$in": OPEN_STATUSES}}, {"$set": {"status": "resolved", "resolved_at": resolved_at, **version}})
+            for _id, version in zip(ids, versions)
+        ], ordered=False)
+
+    async def _loop(self):
+        while True:
+            try:
+                self.leader = await lease_service.acquire(LEASE_NAME, self.owner, HEARTBEAT_LEASE_SECONDS)
+                if self.leader:
+                    result = await self.sweep_once()
+                    if result["went_offline"] or result["came_back"]:
+                        logger.info("Heartbeat sweep: %d went offline, %d came back", result["went_offline"], result["came_back"])
+            except Exception:
+                self.failures += 1
+                logger.exception("Heartbeat sweep failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if HEARTBEAT_SWEEP_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.leader:
+            self.leader = False
+            await lease_service.release(LEASE_NAME, self.owner)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": HEARTBEAT_SWEEP_ENABLED and self._task is not None,
+            "leader": self.leader,
+            "interval_seconds": self.interval_seconds,
+            "sweeps": self.sweeps,
+            "failures": self.failures,
+            "last_duration_ms": self.last_duration_ms,
+            "modules": self.modules,
+            "offline": self.offline,
+            "went_offline": self.went_offline,
+            "came_back": self.came_back,
+        }
+
+
+sweeper = HeartbeatSweeper()
+
+
+async def fleet(location: Optional[str] = None) -> List[dict]:
+    """Liveness of every module (optionally of one location), from the heartbeats alone."""
+    now = datetime.utcnow()
+    docs = await heartbeats_col.find({"location": location} if location else {}).to_list()
+    rows = [liveness(doc, now) for doc in docs]
+    rows.sort(key=lambda row: (row["status"] != "offline", row["location"] or "", row["module"]))
+    return rows
+
+
+async def ensure_indexes():
+    await heartbeats_col.create_index("location")
+
+
+async def _main(args):
+    try:
+        if args.command == "sweep":
+            await ensure_indexes()
+            if not await lease_service.acquire(LEASE_NAME, sweeper.owner, HEARTBEAT_LEASE_SECONDS):
+                print({"skipped": "another process holds the heartbeat_sweep lease", **(await lease_service.holder(LEASE_NAME) or {})})
+                return
+            try:
+                print(await sweeper.sweep_once())
+            finally:
+                await lease_service.release(LEASE_NAME, sweeper.owner)
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Module heartbeats and offline detection")
+    parser.add_argument("command", choices=["sweep"])
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,72 @@
+"""
+Ingestion path shared by every route that stores raw telemetry.
+
+Keeping the writes in one place means derived state (the module/location
+catalog, module heartbeats, the anomaly detector's running statistics and
+the quantile sketches) is maintained exactly once per stored batch.
+
+The derived-state updates run concurrently once the batch is stored, and a
+failed one is logged and counted instead of failing the request. A device
+that got an error would resend a batch that is already stored.
+"""
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import List
+
+from app.services import anomaly_service, catalog_service, heartbeat_service, sketch_service
+from utils.metrics import ingest_derived_failures, ingested_readings
+from database import analytics_col, energy_col
+
+logger = logging.getLogger(__name__)
+
+
+def _prepare(docs: List[dict]) -> List[dict]:
+    now = datetime.utcnow()
+    for doc in docs:
+        if not doc.get("received_at"):
+            doc["received_at"] = now
+    return docs
+
+
+def _count(source: str, docs: List[dict]):
+    per_module = Counter(doc.get("module") or "unknown" for doc in docs)
+    for module, count in per_module.items():
+        ingested_readings.inc(source, module, amount=count)
+
+
+async def _derive(source: str, docs: List[dict]):
+    updates = {
+        "catalog": catalog_service.record_readings(source, docs),
+        "heartbeats": heartbeat_service.record_readings(source, docs),
+        "sketches": sketch_service.record_readings(source, docs),
+        "anomalies": anomaly_service.detector.observe(source, docs),
+    }
+    results = await asyncio.gather(*updates.values(), return_exceptions=True)
+    for target, result in zip(updates, results):
+        if isinstance(result, Exception):
+            ingest_derived_failures.inc(source, target)
+            logger.warning("Could not update %s for %d %s readings", target, len(docs), source, exc_info=result)
+
+
+async def ingest_energy(docs: List[dict]) -> int:
+    """Store current/energy readings and update the catalog."""
+    docs = _prepare(docs)
+    if not docs:
+        return 0
+    await energy_col.insert_many(docs)
+    await _derive("energy", docs)
+    _count("energy", docs)
+    return len(docs)
+
+
+async def ingest_occupancy(docs: List[dict]) -> int:
+    """Store occupancy/environment readings and update the catalog."""
+    docs = _prepare(docs)
+    if not docs:
+        return 0
+    await analytics_col.insert_many(docs)
+    await _derive("occupancy", docs)
+    _count("occupancy", docs)
+    return len(docs)
@@ -0,0 +1,323 @@
+"""
+Background jobs for long-running reports.
+
+``POST /jobs`` stores a job in the ``jobs`` collection and returns at once.
+Workers claim queued jobs, run the report (app.services.report_service),
+record progress as they go, and store the result on the job document.
+
+- Cache: a job is keyed by its report, normalized parameters and the data
+  watermark the report declares. Submitting the same request again returns
+  the existing job (queued, running or done) instead of computing it twice.
+  A finished report over a closed period is served from the cache until it
+  expires.
+- Retention: jobs expire JOB_RETENTION_HOURS after they were last requested
+  (TTL index), and only the newest JOB_MAX_STORED finished jobs are kept.
+- Workers: JOB_WORKERS jobs run concurrently in the API process. Set
+  JOB_WORKER_ENABLED=false there and run workers separately with
+  ``python -m app.services.job_service worker``. While a job runs, its worker
+  refreshes ``heartbeat_at`` every JOB_HEARTBEAT_SECONDS, whether or not the
+  report reports progress. A job whose worker stops sending heartbeats for
+  JOB_STALE_SECONDS is requeued, at most JOB_MAX_ATTEMPTS times.
+
+    python -m app.services.job_service worker
+    python -m app.services.job_service prune
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import bson
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+import database
+from app.services.report_service import REPORTS, Report
+from database import jobs_col
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKER_ENABLED = os.getenv("JOB_WORKER_ENABLED", "true").lower() == "true"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "1800"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_STALE_SECONDS / 5)))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "168"))
+JOB_MAX_STORED = int(os.getenv("JOB_MAX_STORED", "1000"))
+# Results are stored on the job document, which MongoDB caps at 16 MB
+JOB_MAX_RESULT_BYTES = int(os.getenv("JOB_MAX_RESULT_BYTES", str(12 << 20)))
+PROGRESS_INTERVAL_SECONDS = 1.0
+HOUSEKEEPING_INTERVAL_SECONDS = 60.0
+FINISHED = ("done", "failed")
+
+# What GET /jobs/{id} shows; the result is fetched separately
+JOB_FIELDS = {"result": 0, "cache_key": 0, "worker": 0, "heartbeat_at": 0, "requested_by": 0}
+
+
+def cache_key(report: str, params: dict, watermark: str) -> str:
+    canonical = json.dumps([report, params, watermark], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+async def submit(report: Report, params: dict, user: Optional[str] = None) -> dict:
+    """
+    Queue ``report`` with already normalized ``params``, or return the job that
+    already covers them. The returned document has ``cached: True`` when it
+    was not newly created.
+    """
+    watermark = await report.watermark(params)
+    key = cache_key(report.name, params, watermark)
+    now = datetime.utcnow()
+    update = {
+        "$setOnInsert": {
+            "_id": uuid.uuid4().hex,
+            "report": report.name,
+            "params": params,
+            "watermark": watermark,
+            "status": "queued",
+            "progress": 0.0,
+            "message": None,
+            "attempts": 0,
+            "created_at": now,
+        },
+        "$set": {"requested_at": now, "expires_at": now + timedelta(hours=JOB_RETENTION_HOURS)},
+        "$inc": {"requests": 1},
+        "$addToSet": {"requested_by": user},
+    }
+    try:
+        job = await jobs_col.find_one_and_update(
+            {"cache_key": key}, update, upsert=True, projection=JOB_FIELDS, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent submit of the same request inserted first
+        job = await jobs_col.find_one_and_update(
+            {"cache_key": key}, update, projection=JOB_FIELDS, return_document=ReturnDocument.AFTER
+        )
+    if job["status"] == "failed":
+        # Failures are not cached: try again
+        job = await jobs_col.find_one_and_update(
+            {"_id": job["_id"], "status": "failed"},
+            {"$set": {"status": "queued", "progress": 0.0, "message": None, "attempts": 0, "finished_at": None}},
+            projection=JOB_FIELDS,
+            return_document=ReturnDocument.AFTER,
+        ) or job
+        job["requests"] = 1
+    job["cached"] = job.get("requests", 1) > 1
+    if job["status"] == "queued":
+        worker.wake()
+    return job
+
+
+async def get_job(job_id: str, with_result: bool = False) -> Optional[dict]:
+    projection = {key: 0 for key in JOB_FIELDS if key != "result"} if with_result else JOB_FIELDS
+    return await jobs_col.find_one({"_id": job_id}, projection)
+
+
+async def list_jobs(user: Optional[str] = None, limit: int = 50) -> List[dict]:
+    query = {"requested_by": user} if user else {}
+    return await jobs_col.find(query, JOB_FIELDS).sort("created_at", -1).limit(limit).to_list()
+
+
+class JobWorker:
+    def __init__(self, concurrency: int = JOB_WORKERS, poll_seconds: float = JOB_POLL_SECONDS):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.requeued = 0
+        self.busy_seconds = 0.0
+        self._housekeeping_at = 0.0
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await jobs_col.find_one_and_update(
+            {"status": "queued"},
+            {
+                "$set": {"status": "running", "started_at": now, "heartbeat_at": now, "worker": self.worker_id},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def requeue_stale(self) -> int:
+        """Requeue running jobs whose worker went quiet, failing those out of attempts."""
+        cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+        stale = {"status": "running", "heartbeat_at": {"$lt": cutoff}}
+        await jobs_col.update_many(
+            {**stale, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+            {"$set": {"status": "failed", "message": "Worker stopped responding", "finished_at": datetime.utcnow()}},
+        )
+        result = await jobs_col.update_many(stale, {"$set": {"status": "queued", "message": "Requeued after worker stopped responding"}})
+        self.requeued += result.modified_count
+        return result.modified_count
+
+    async def run_job(self, job: dict):
+        job_id = job["_id"]
+        report = REPORTS.get(job["report"])
+        owned = {"_id": job_id, "worker": self.worker_id, "status": "running"}
+        last_write = 0.0
+
+        async def progress(fraction: float, message: str):
+            nonlocal last_write
+            now = time.monotonic()
+            if now - last_write < PROGRESS_INTERVAL_SECONDS and fraction < 1:
+                return
+            last_write = now
+            await jobs_col.update_one(owned, {"$set": {
+                "progress": round(min(max(fraction, 0.0), 1.0), 4),
+                "message": message,
+                "heartbeat_at": datetime.utcnow(),
+            }})
+
+        async def heartbeat():
+            # Reports may go longer than JOB_STALE_SECONDS between progress calls
+            while True:
+                await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+                try:
+                    await jobs_col.update_one(owned, {"$set": {"heartbeat_at": datetime.utcnow()}})
+                except PyMongoError as exc:
+                    logger.warning("Job %s heartbeat failed: %s", job_id, exc)
+
+        started = time.perf_counter()
+        self.running += 1
+        ticker = asyncio.create_task(heartbeat())
+        try:
+            if report is None:
+                raise ValueError(f"Unknown report {job['report']}")
+            result = await asyncio.wait_for(report.run(job["params"], progress), JOB_TIMEOUT_SECONDS)
+            size = len(bson.encode({"result": result}))
+            if size > JOB_MAX_RESULT_BYTES:
+                raise ValueError(f"Result is {size} bytes, over the {JOB_MAX_RESULT_BYTES} byte limit; narrow the parameters")
+        except asyncio.CancelledError:
+            # Shutting down: hand the job to the next worker
+            await jobs_col.update_one(owned, {"$set": {"status": "queued", "message": "Requeued on worker shutdown"}, "$inc": {"attempts": -1}})
+            raise
+        except Exception as exc:
+            self.failed += 1
+            message = "Timed out" if isinstance(exc, asyncio.TimeoutError) else str(exc)[:500]
+            logger.warning("Job %s (%s) failed: %s", job_id, job["report"], message)
+            await jobs_col.update_one(owned, {"$set": {"status": "failed", "message": message, "finished_at": datetime.utcnow()}})
+            return
+        finally:
+            ticker.cancel()
+            self.running -= 1
+            self.busy_seconds += time.perf_counter() - started
+
+        now = datetime.utcnow()
+        self.completed += 1
+        await jobs_col.update_one(owned, {"$set": {
+            "status": "done",
+            "progress": 1.0,
+            "message": None,
+            "result": result,
+            "result_bytes": size,
+            "finished_at": now,
+            "expires_at": now + timedelta(hours=JOB_RETENTION_HOURS),
+        }})
+
+    async def _loop(self, index: int):
+        while True:
+            try:
+                if index == 0 and time.monotonic() - self._housekeeping_at >= HOUSEKEEPING_INTERVAL_SECONDS:
+                    self._housekeeping_at = time.monotonic()
+                    await self.requeue_stale()
+                    await prune()
+                job = await self._claim()
+                if job is not None:
+                    await self.run_job(job)
+                    continue
+            except PyMongoError as exc:
+                logger.warning("Job worker error: %s", exc)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, force: bool = False):
+        if (JOB_WORKER_ENABLED or force) and not self._tasks:
+            self._wake = asyncio.Event()
+            self._tasks = [asyncio.create_task(self._loop(i)) for i in range(self.concurrency)]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._wake = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": bool(self._tasks),
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "requeued": self.requeued,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+worker = JobWorker()
+
+
+async def prune() -> int:
+    """Delete finished jobs beyond the newest JOB_MAX_STORED (expiry is handled by the TTL index)."""
+    cutoff = await jobs_col.find(
+        {"status": {"$in": list(FINISHED)}}, {"finished_at": 1}
+    ).sort("finished_at", -1).skip(JOB_MAX_STORED).limit(1).to_list()
+    if not cutoff:
+        return 0
+    result = await jobs_col.delete_many({"status": {"$in": list(FINISHED)}, "finished_at": {"$lte": cutoff[0]["finished_at"]}})
+    return result.deleted_count
+
+
+async def ensure_indexes():
+    await jobs_col.create_index("cache_key", unique=True)
+    await jobs_col.create_index([("status", 1), ("created_at", 1)])
+    await jobs_col.create_index([("status", 1), ("finished_at", -1)])
+    await jobs_col.create_index([("requested_by", 1), ("created_at", -1)])
+    await jobs_col.create_index("expires_at", expireAfterSeconds=0)
+
+
+async def _main(args):
+    try:
+        await ensure_indexes()
+        if args.command == "prune":
+            print({"deleted": await prune()})
+        elif args.command == "worker":
+            worker.concurrency = args.concurrency
+            worker.start(force=True)
+            await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background report jobs")
+    parser.add_argument("command", choices=["worker", "prune"])
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKERS)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,44 @@
+"""
+Leases that keep a background task to one process at a time.
+
+Every API worker starts the same background loops. Loops that must not run
+twice (the fault scanner, the baseline builder, the heartbeat sweeper) take a
+named lease in ``leases`` before each cycle. The holder renews it every cycle;
+if it stops renewing, another process takes over once the lease expires.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from database import leases_col
+
+
+def owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+async def acquire(name: str, owner: str, ttl_seconds: float) -> bool:
+    """Take or renew lease ``name`` for ``owner``; False while another owner holds it."""
+    now = datetime.utcnow()
+    try:
+        await leases_col.update_one(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"owner": owner, "renewed_at": now, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The lease exists, is unexpired and belongs to someone else
+        return False
+    return True
+
+
+async def release(name: str, owner: str):
+    await leases_col.delete_one({"_id": name, "owner": owner})
+
+
+async def holder(name: str) -> Optional[dict]:
+    return await leases_col.find_one({"_id": name, "expires_at": {"$gt": datetime.utcnow()}})
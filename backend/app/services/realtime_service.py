@@ -0,0 +1,295 @@
+"""
+Realtime zone deltas.
+
+A single reader per process follows new occupancy telemetry, energy readings
+and faults and fans the resulting per-location events out to every open
+dashboard connection, so database load depends on the write rate rather than
+on the number of viewers. The reader uses a MongoDB change stream when the
+deployment supports one and otherwise tails the collections by ``_id`` every
+REALTIME_POLL_INTERVAL_SECONDS. It only runs while someone is subscribed.
+
+Each subscription has a bounded queue. A client that cannot keep up has its
+backlog discarded and receives a ``resync`` event telling it to refetch
+``GET /zones/`` instead of slowing down the reader.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+import database
+from database import analytics_col, db, energy_col, faults_col
+
+logger = logging.getLogger(__name__)
+
+REALTIME_QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", "256"))
+REALTIME_POLL_INTERVAL_SECONDS = float(os.getenv("REALTIME_POLL_INTERVAL_SECONDS", "2"))
+REALTIME_POLL_BATCH = 500
+REALTIME_RETRY_SECONDS = 5
+
+# Fields compared between consecutive occupancy readings of a location
+ZONE_FIELDS = ("module", "occupancy", "rcwl", "pir", "temperature", "humidity", "source")
+FAULT_FIELDS = ("fault_id", "device_id", "device_name", "issue", "severity", "confidence", "status", "detected_at")
+
+
+class Subscription:
+    """One connection's filters and bounded event queue."""
+
+    def __init__(self, locations: Optional[Iterable[str]] = None, modules: Optional[Iterable[str]] = None, maxsize: int = REALTIME_QUEUE_SIZE):
+        self.locations: Set[str] = set(locations or ())
+        self.modules: Set[str] = set(modules or ())
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.delivered = 0
+        self.dropped = 0
+        self._lagged = False
+
+    def set_filters(self, locations: Optional[Iterable[str]] = None, modules: Optional[Iterable[str]] = None):
+        self.locations = set(locations or ())
+        self.modules = set(modules or ())
+
+    def matches(self, event: dict) -> bool:
+        if self.locations and event.get("location") not in self.locations:
+            return False
+        if self.modules and event.get("module") not in self.modules:
+            return False
+        return True
+
+    def offer(self, event: dict):
+        if not self.matches(event):
+            return
+        if self.queue.full():
+            # Older deltas are useless once the client has to refetch anyway
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self._lagged = True
+        self.queue.put_nowait(event)
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next event, a ``resync`` marker after an overflow, or None on timeout."""
+        if self._lagged:
+            self._lagged = False
+            return {"type": "resync", "dropped": self.dropped}
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.delivered += 1
+        return event
+
+
+def _number(value) -> Optional[float]:
+    """Device fields are not validated on every write path; anything non-numeric reads as missing."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _flag(value) -> int:
+    number = _number(value)
+    return 1 if number is not None and number > 0 else 0
+
+
+def _current_a(doc: dict) -> Optional[float]:
+    current_a = _number(doc.get("current_a"))
+    if current_a is not None:
+        return current_a
+    current_ma = _number(doc.get("current_ma"))
+    if current_ma is not None:
+        return current_ma / 1000
+    return None
+
+
+def _power_w(doc: dict, current_a: Optional[float]) -> Optional[float]:
+    if doc.get("power_w") is not None:
+        return doc["power_w"]
+    if current_a is None:
+        return None
+    voltage = doc.get("voltage") or float(os.getenv("ENERGY_VOLTAGE_DEFAULT", "230"))
+    try:
+        return float(current_a) * float(voltage)
+    except (TypeError, ValueError):
+        return None
+
+
+class ZoneEventHub:
+    def __init__(self):
+        self._subscribers: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._zones: Dict[str, dict] = {}
+        self.mode: Optional[str] = None
+        self.events_published = 0
+
+    # -- subscriptions -----------------------------------------------------
+
+    def subscribe(self, locations: Optional[Iterable[str]] = None, modules: Optional[Iterable[str]] = None) -> Subscription:
+        subscription = Subscription(locations, modules)
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        if not self._subscribers:
+            await self.stop()
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._zones.clear()
+        self.mode = None
+
+    def publish(self, event: dict):
+        self.events_published += 1
+        for subscription in list(self._subscribers):
+            subscription.offer(event)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "subscribers": len(self._subscribers),
+            "events_published": self.events_published,
+            "queued": sum(s.queue.qsize() for s in self._subscribers),
+            "dropped": sum(s.dropped for s in self._subscribers),
+            "tracked_locations": len(self._zones),
+        }
+
+    # -- documents -> events ---------------------------------------------------
+
+    def to_event(self, collection: str, doc: dict) -> Optional[dict]:
+        location = doc.get("location")
+        if not location:
+            return None
+
+        if collection == analytics_col.name:
+            rcwl, pir = _flag(doc.get("rcwl")), _flag(doc.get("pir"))
+            zone = {
+                "module": doc.get("module"),
+                "occupancy": bool(rcwl or pir),
+                "rcwl": rcwl,
+                "pir": pir,
+                "temperature": doc.get("temperature"),
+                "humidity": doc.get("humidity"),
+                "source": doc.get("source"),
+            }
+            previous = self._zones.get(location, {})
+            changes = {k: v for k, v in zone.items() if k not in previous or previous[k] != v}
+            self._zones[location] = zone
+            if not changes:
+                return None
+            return {
+                "type": "zone",
+                "location": location,
+                "module": zone["module"],
+                "changes": changes,
+                "last_seen": doc.get("received_at") or doc.get("timestamp"),
+            }
+
+        if collection == energy_col.name:
+            current_a = _current_a(doc)
+            return {
+                "type": "energy",
+                "location": location,
+                "module": doc.get("module"),
+                "current_a": current_a,
+                "current_ma": doc.get("current_ma"),
+                "power_w": _power_w(doc, current_a),
+                "received_at": doc.get("received_at"),
+            }
+
+        if collection == faults_col.name:
+            event = {"type": "fault", "location": location, "module": doc.get("module")}
+            event.update({k: doc.get(k) for k in FAULT_FIELDS})
+            return event
+        return None
+
+    def _handle(self, collection: str, doc: Optional[dict]):
+        if doc is None:
+            return
+        try:
+            event = self.to_event(collection, doc)
+        except Exception:
+            # Skip the document rather than stall every viewer on it
+            logger.exception("Could not build a zone event from %s %s", collection, doc.get("_id"))
+            return
+        if event is not None:
+            self.publish(event)
+
+    # -- shared reader ---------------------------------------------------------
+
+    async def _run(self):
+        use_stream = database.supports_change_streams
+        if not use_stream:
+            logger.info("Change streams need MONGO_DRIVER=async; polling for zone updates")
+        while True:
+            try:
+                if use_stream:
+                    await self._watch()
+                else:
+                    await self._poll()
+            except OperationFailure as exc:
+                if not use_stream:
+                    logger.warning("Zone update poll failed: %s", exc)
+                    await asyncio.sleep(REALTIME_RETRY_SECONDS)
+                    continue
+                # Standalone servers and shared tiers have no change streams
+                logger.info("Change streams unavailable (%s); polling for zone updates", exc)
+                use_stream = False
+            except PyMongoError as exc:
+                logger.warning("Zone update stream failed: %s", exc)
+                await asyncio.sleep(REALTIME_RETRY_SECONDS)
+            except Exception:
+                # The reader is shared by every subscriber, so never let it die
+                logger.exception("Zone update reader failed")
+                await asyncio.sleep(REALTIME_RETRY_SECONDS)
+
+    async def _watch(self):
+        collections = [analytics_col.name, energy_col.name, faults_col.name]
+        pipeline = [{
+            "$match": {
+                "operationType": {"$in": ["insert", "update", "replace"]},
+                "ns.coll": {"$in": collections},
+            }
+        }]
+        async with await db.watch(pipeline, full_document="updateLookup") as stream:
+            self.mode = "change_stream"
+            async for change in stream:
+                self._handle(change["ns"]["coll"], change.get("fullDocument"))
+
+    async def _poll(self):
+        self.mode = "polling"
+        watermark = ObjectId.from_datetime(datetime.utcnow())
+        marks = {col.name: watermark for col in (analytics_col, energy_col, faults_col)}
+        while True:
+            for col in (analytics_col, energy_col, faults_col):
+                try:
+                    docs = await (
+                        col.find({"_id": {"$gt": marks[col.name]}})
+                        .sort("_id", 1)
+                        .limit(REALTIME_POLL_BATCH)
+                        .to_list()
+                    )
+                except PyMongoError as exc:
+                    logger.warning("Zone update poll on %s failed: %s", col.name, exc)
+                    continue
+                for doc in docs:
+                    self._handle(col.name, doc)
+                if docs:
+                    marks[col.name] = docs[-1]["_id"]
+            await asyncio.sleep(REALTIME_POLL_INTERVAL_SECONDS)
+
+
+hub = ZoneEventHub()
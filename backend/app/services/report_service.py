@@ -0,0 +1,309 @@
+"""
+Long-running reports executed by the job queue (app.services.job_service).
+
+Each report declares:
+
+- a parameter model. Defaults are resolved to concrete values ("last month"
+  becomes "2026-03"), so equivalent requests share one cache entry.
+- a data watermark: a cheap value that changes whenever data the report
+  reads could have changed. Windows that closed more than
+  JOB_LATE_DATA_HOURS ago are treated as final, so a quarter-old report
+  stays cached while new telemetry streams in.
+- ``run(params, progress)``, an async function returning ``{"rows": [...],
+  "summary": {...}}``. It calls ``await progress(fraction, message)`` as it
+  goes.
+
+Telemetry reports are computed from the hourly per-location aggregates of
+forecast_service, one day per aggregation, so a report over a quarter never
+holds raw readings in memory.
+"""
+import os
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.models.job_model import FaultCorrelationParams, VacantEnergyWasteParams, ZoneMonthlyKwhParams
+from app.services import sync_service
+from app.services.forecast_service import hourly_aggregates
+from database import analytics_col, energy_col, faults_col
+
+JOB_LATE_DATA_HOURS = float(os.getenv("JOB_LATE_DATA_HOURS", "24"))
+MAX_REPORT_DAYS = 366
+MAX_FAULT_ROWS = 5000
+
+Progress = Callable[[float, str], Awaitable[None]]
+
+
+class Report:
+    __slots__ = ("name", "description", "params_model", "resolve", "watermark", "run")
+
+    def __init__(self, name, description, params_model, resolve, watermark, run):
+        self.name = name
+        self.description = description
+        self.params_model = params_model
+        self.resolve = resolve
+        self.watermark = watermark
+        self.run = run
+
+    def normalize(self, params: dict) -> dict:
+        """Validate and fill in defaults; raises pydantic.ValidationError or ValueError."""
+        model: BaseModel = self.params_model(**params)
+        return self.resolve(model)
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+def _days(start: date, end: date):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+async def _newest_id(collection) -> str:
+    doc = await collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return str(doc["_id"]) if doc else "-"
+
+
+async def _telemetry_watermark(window_end: datetime) -> str:
+    """"closed" once late readings can no longer land in the window, else the newest inserted rows."""
+    if window_end <= datetime.utcnow() - timedelta(hours=JOB_LATE_DATA_HOURS):
+        return "closed"
+    return f"{await _newest_id(energy_col)}/{await _newest_id(analytics_col)}"
+
+
+def _location_filter(params: dict):
+    wanted = set(params.get("locations") or [])
+    return (lambda name: name in wanted) if wanted else (lambda name: True)
+
+
+# -- monthly kWh per zone -------------------------------------------------
+
+def _month_bounds(month: str):
+    year, number = (int(part) for part in month.split("-"))
+    start = date(year, number, 1)
+    end = date(year + number // 12, number % 12 + 1, 1) - timedelta(days=1)
+    return start, end
+
+
+def _resolve_zone_monthly(p: ZoneMonthlyKwhParams) -> dict:
+    month = p.month
+    if month is None:
+        last_month = date.today().replace(day=1) - timedelta(days=1)
+        month = f"{last_month.year:04d}-{last_month.month:02d}"
+    return {"month": month, "locations": sorted(set(p.locations)) if p.locations else None}
+
+
+async def _zone_monthly_watermark(params: dict) -> str:
+    _, end = _month_bounds(params["month"])
+    return await _telemetry_watermark(_day_start(end) + timedelta(days=1))
+
+
+async def zone_monthly_kwh(params: dict, progress: Progress) -> dict:
+    start, end = _month_bounds(params["month"])
+    wanted = _location_filter(params)
+    zones: Dict[str, dict] = {}
+    days = list(_days(start, end))
+    for index, day in enumerate(days):
+        rows = await hourly_aggregates(_day_start(day), _day_start(day) + timedelta(days=1))
+        for row in rows["energy"]:
+            location = row["_id"]["location"]
+            if not wanted(location) or not isinstance(row.get("kwh"), (int, float)):
+                continue
+            zone = zones.setdefault(location, {"location": location, "kwh": 0.0, "hours": 0, "peak_kwh": 0.0, "peak_hour": None})
+            zone["kwh"] += row["kwh"]
+            zone["hours"] += 1
+            if row["kwh"] > zone["peak_kwh"]:
+                zone["peak_kwh"], zone["peak_hour"] = row["kwh"], row["_id"]["hour"]
+        await progress((index + 1) / len(days), f"{day.isoformat()} done")
+
+    out = sorted(zones.values(), key=lambda z: -z["kwh"])
+    for zone in out:
+        zone["kwh"] = round(zone["kwh"], 3)
+        zone["peak_kwh"] = round(zone["peak_kwh"], 3)
+    return {
+        "rows": out,
+        "summary": {"month": params["month"], "zones": len(out), "total_kwh": round(sum(z["kwh"] for z in out), 3)},
+    }
+
+
+# -- energy used in vacant zones ------------------------------------------
+
+def _resolve_vacant_waste(p: VacantEnergyWasteParams) -> dict:
+    end = p.end or date.today() - timedelta(days=1)
+    start = p.start or end - timedelta(days=89)
+    if start > end:
+        raise ValueError("start must not be after end")
+    if (end - start).days >= MAX_REPORT_DAYS:
+        raise ValueError(f"at most {MAX_REPORT_DAYS} days")
+    return {"start": start.isoformat(), "end": end.isoformat(), "locations": sorted(set(p.locations)) if p.locations else None}
+
+
+async def _vacant_waste_watermark(params: dict) -> str:
+    return await _telemetry_watermark(_day_start(date.fromisoformat(params["end"])) + timedelta(days=1))
+
+
+async def vacant_energy_waste(params: dict, progress: Progress) -> dict:
+    """kWh used in hours with no motion at all, per location. Hours without occupancy data count as unknown."""
+    wanted = _location_filter(params)
+    zones: Dict[str, dict] = {}
+    days = list(_days(date.fromisoformat(params["start"]), date.fromisoformat(params["end"])))
+    for index, day in enumerate(days):
+        rows = await hourly_aggregates(_day_start(day), _day_start(day) + timedelta(days=1))
+        occupancy = {(r["_id"]["location"], r["_id"]["hour"]): r.get("occupancy") for r in rows["occupancy"]}
+        for row in rows["energy"]:
+            location, hour = row["_id"]["location"], row["_id"]["hour"]
+            kwh = row.get("kwh")
+            if not wanted(location) or not isinstance(kwh, (int, float)):
+                continue
+            zone = zones.setdefault(location, {
+                "location": location, "total_kwh": 0.0, "vacant_kwh": 0.0, "unknown_kwh": 0.0,
+                "vacant_hours": 0, "occupied_hours": 0,
+            })
+            zone["total_kwh"] += kwh
+            ratio = occupancy.get((location, hour))
+            if ratio is None:
+                zone["unknown_kwh"] += kwh
+            elif ratio == 0:
+                zone["vacant_kwh"] += kwh
+                zone["vacant_hours"] += 1
+            else:
+                zone["occupied_hours"] += 1
+        if index % 7 == 6 or index == len(days) - 1:
+            await progress((index + 1) / len(days), f"through {day.isoformat()}")
+
+    out = sorted(zones.values(), key=lambda z: -z["vacant_kwh"])
+    for zone in out:
+        zone["vacant_share"] = round(zone["vacant_kwh"] / zone["total_kwh"], 4) if zone["total_kwh"] else 0.0
+        for key in ("total_kwh", "vacant_kwh", "unknown_kwh"):
+            zone[key] = round(zone[key], 3)
+    return {
+        "rows": out,
+        "summary": {
+            "start": params["start"],
+            "end": params["end"],
+            "vacant_kwh": round(sum(z["vacant_kwh"] for z in out), 3),
+            "total_kwh": round(sum(z["total_kwh"] for z in out), 3),
+        },
+    }
+
+
+# -- faults vs. energy ----------------------------------------------------
+
+def _resolve_fault_correlation(p: FaultCorrelationParams) -> dict:
+    end = p.end or date.today()
+    return {"days": p.days, "end": end.isoformat(), "window_minutes": p.window_minutes}
+
+
+def _fault_window(params: dict):
+    end = _day_start(date.fromisoformat(params["end"])) + timedelta(days=1)
+    return end - timedelta(days=params["days"]), end
+
+
+async def _fault_correlation_watermark(params: dict) -> str:
+    _, end = _fault_window(params)
+    # Faults carry the sync sequence, which moves on every insert and status change
+    return f"{await sync_service.current_sequence()}/{await _telemetry_watermark(end + timedelta(minutes=params['window_minutes']))}"
+
+
+def _current(doc: dict) -> Optional[float]:
+    if isinstance(doc.get("current_a"), (int, float)):
+        return float(doc["current_a"])
+    if isinstance(doc.get("current_ma"), (int, float)):
+        return doc["current_ma"] / 1000
+    return None
+
+
+def _window_mean(times: List[datetime], prefix: List[float], start: datetime, end: datetime) -> Optional[float]:
+    lo, hi = bisect_left(times, start), bisect_right(times, end)
+    return (prefix[hi] - prefix[lo]) / (hi - lo) if hi > lo else None
+
+
+async def fault_correlation(params: dict, progress: Progress) -> dict:
+    """Mean module current before vs. after each fault, and per issue."""
+    start, end = _fault_window(params)
+    window = timedelta(minutes=params["window_minutes"])
+    faults = await faults_col.find(
+        {"detected_at": {"$gte": start, "$lt": end}},
+        {"_id": 0, "fault_id": 1, "module": 1, "device_id": 1, "location": 1, "issue": 1, "severity": 1, "detected_at": 1},
+    ).sort("detected_at", 1).to_list()
+    by_module: Dict[str, List[dict]] = {}
+    for fault in faults:
+        if fault.get("module") and isinstance(fault.get("detected_at"), datetime):
+            by_module.setdefault(fault["module"], []).append(fault)
+
+    rows = []
+    for index, (module, module_faults) in enumerate(sorted(by_module.items())):
+        # One read per module covering all of its faults' windows
+        readings = await energy_col.find(
+            {
+                "module": module,
+                "received_at": {"$gte": module_faults[0]["detected_at"] - window, "$lte": module_faults[-1]["detected_at"] + window},
+            },
+            {"_id": 0, "received_at": 1, "current_a": 1, "current_ma": 1},
+        ).sort("received_at", 1).to_list()
+        times, prefix = [], [0.0]
+        for reading in readings:
+            amps = _current(reading)
+            if amps is not None and isinstance(reading.get("received_at"), datetime):
+                times.append(reading["received_at"])
+                prefix.append(prefix[-1] + amps)
+        for fault in module_faults:
+            at = fault["detected_at"]
+            before = _window_mean(times, prefix, at - window, at)
+            after = _window_mean(times, prefix, at, at + window)
+            change = (after - before) / before if before and after is not None else None
+            rows.append({
+                **fault,
+                "current_before_a": round(before, 3) if before is not None else None,
+                "current_after_a": round(after, 3) if after is not None else None,
+                "change_pct": round(change * 100, 1) if change is not None else None,
+            })
+        await progress((index + 1) / max(len(by_module), 1), f"{module} done")
+
+    issues: Dict[str, dict] = {}
+    for row in rows:
+        issue = issues.setdefault(row.get("issue") or "unknown", {"issue": row.get("issue") or "unknown", "faults": 0, "with_energy": 0, "changes": []})
+        issue["faults"] += 1
+        if row["change_pct"] is not None:
+            issue["with_energy"] += 1
+            issue["changes"].append(row["change_pct"])
+    by_issue = []
+    for issue in sorted(issues.values(), key=lambda i: -i["faults"]):
+        changes = issue.pop("changes")
+        issue["mean_change_pct"] = round(sum(changes) / len(changes), 1) if changes else None
+        issue["shifted_over_20pct"] = sum(1 for c in changes if abs(c) > 20)
+        by_issue.append(issue)
+    return {
+        "rows": rows[:MAX_FAULT_ROWS],
+        "summary": {
+            "start": start,
+            "end": end,
+            "faults": len(rows),
+            "truncated": len(rows) > MAX_FAULT_ROWS,
+            "by_issue": by_issue,
+        },
+    }
+
+
+REPORTS: Dict[str, Report] = {
+    report.name: report
+    for report in (
+        Report(
+            "zone_monthly_kwh", "kWh per zone for one calendar month",
+            ZoneMonthlyKwhParams, _resolve_zone_monthly, _zone_monthly_watermark, zone_monthly_kwh,
+        ),
+        Report(
+            "vacant_energy_waste", "kWh used while zones had no motion, per zone",
+            VacantEnergyWasteParams, _resolve_vacant_waste, _vacant_waste_watermark, vacant_energy_waste,
+        ),
+        Report(
+            "fault_correlation", "Module current before and after each fault, by issue",
+            FaultCorrelationParams, _resolve_fault_correlation, _fault_correlation_watermark, fault_correlation,
+        ),
+    )
+}
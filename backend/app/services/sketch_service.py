@@ -0,0 +1,312 @@
+"""
+Mergeable quantile sketches of telemetry, per location, module and hour.
+
+Each ingested batch is folded into one document per (location, module, UTC
+hour) in ``quantile_sketches``. Each of current, temperature and humidity is
+kept as a logarithmic-bucket sketch (the DDSketch layout):
+
+- a positive value x goes into bucket ceil(log(x) / log(gamma)), with
+  gamma = (1 + a) / (1 - a) and a = SKETCH_RELATIVE_ACCURACY;
+- negative values are stored the same way under ``n``;
+- values with |x| < SKETCH_MIN_VALUE count as zero.
+
+Every quantile read back from a bucket is within a relative error ``a`` of
+the true value. Sketches merge by adding bucket counts. The ingest path can
+therefore update them with one ``$inc`` upsert per touched document, however
+many API processes are writing, and a query merges any number of hours and
+locations inside MongoDB before reading one combined sketch per group.
+
+Rebuild closed hours from stored telemetry (for history from before this
+existed) with the command below. Hours still receiving readings would be
+counted twice.
+
+    python -m app.services.sketch_service rebuild --start 2026-01-01 --end 2026-02-01
+"""
+import argparse
+import asyncio
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+import database
+from database import analytics_col, energy_col, sketches_col
+
+SKETCH_ENABLED = os.getenv("SKETCH_ENABLED", "true").lower() == "true"
+SKETCH_RELATIVE_ACCURACY = float(os.getenv("SKETCH_RELATIVE_ACCURACY", "0.01"))
+SKETCH_MIN_VALUE = float(os.getenv("SKETCH_MIN_VALUE", "0.001"))
+REBUILD_BATCH = 5000
+
+GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+# Telemetry source -> collection and the metrics sketched from it
+SOURCES = {
+    "energy": (energy_col, ("current",)),
+    "occupancy": (analytics_col, ("temperature", "humidity")),
+}
+METRICS = {metric: source for source, (_, metrics) in SOURCES.items() for metric in metrics}
+
+
+def metric_value(metric: str, doc: dict) -> Optional[float]:
+    if metric == "current":
+        if isinstance(doc.get("current_a"), (int, float)):
+            return float(doc["current_a"])
+        if isinstance(doc.get("current_ma"), (int, float)):
+            return doc["current_ma"] / 1000
+        return None
+    value = doc.get(metric)
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def bucket_index(magnitude: float) -> int:
+    return math.ceil(math.log(magnitude) / LOG_GAMMA)
+
+
+def bucket_value(index: int) -> float:
+    """The value that represents a bucket, within the relative accuracy of every value in it."""
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+class QuantileSketch:
+    """Bucket counts plus exact count, sum, min and max."""
+
+    def __init__(self):
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float, count: int = 1):
+        if value >= SKETCH_MIN_VALUE:
+            index = bucket_index(value)
+            self.positive[index] = self.positive.get(index, 0) + count
+        elif value <= -SKETCH_MIN_VALUE:
+            index = bucket_index(-value)
+            self.negative[index] = self.negative.get(index, 0) + count
+        else:
+            self.zero += count
+        self.count += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "QuantileSketch"):
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in theirs.items():
+                mine[index] = mine.get(index, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        for field, pick in (("min", min), ("max", max)):
+            theirs = getattr(other, field)
+            if theirs is not None:
+                mine = getattr(self, field)
+                setattr(self, field, theirs if mine is None else pick(mine, theirs))
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        value = None
+        # Ascending order: most negative first, then zero, then positives
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                value = -bucket_value(index)
+                break
+        if value is None:
+            seen += self.zero
+            if seen > rank:
+                value = 0.0
+        if value is None:
+            for index in sorted(self.positive):
+                seen += self.positive[index]
+                if seen > rank:
+                    value = bucket_value(index)
+                    break
+        if value is None:
+            value = self.max
+        # The exact extremes are known, so never answer outside them
+        return min(max(value, self.min), self.max)
+
+    def to_update(self, prefix: str) -> dict:
+        """$inc/$min/$max operators that merge this sketch into ``prefix`` of a stored document."""
+        inc = {f"{prefix}.count": self.count, f"{prefix}.sum": self.sum}
+        if self.zero:
+            inc[f"{prefix}.zero"] = self.zero
+        for store, buckets in (("p", self.positive), ("n", self.negative)):
+            for index, count in buckets.items():
+                inc[f"{prefix}.{store}.{index}"] = count
+        return {"$inc": inc, "$min": {f"{prefix}.min": self.min}, "$max": {f"{prefix}.max": self.max}}
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "QuantileSketch":
+        sketch = cls()
+        sketch.positive = {int(k): v for k, v in (doc.get("p") or {}).items()}
+        sketch.negative = {int(k): v for k, v in (doc.get("n") or {}).items()}
+        sketch.zero = doc.get("zero", 0)
+        sketch.count = doc.get("count", 0)
+        sketch.sum = doc.get("sum", 0.0)
+        sketch.min = doc.get("min")
+        sketch.max = doc.get("max")
+        return sketch
+
+
+def _hour(value) -> Optional[datetime]:
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def sketch_updates(source: str, docs: Iterable[dict]) -> List[UpdateOne]:
+    """Fold a batch of readings into one upsert per (location, module, hour)."""
+    _, metrics = SOURCES[source]
+    groups: Dict[tuple, Dict[str, QuantileSketch]] = {}
+    for doc in docs:
+        hour = _hour(doc.get("received_at"))
+        if hour is None:
+            continue
+        key = (doc.get("location") or None, doc.get("module") or None, hour)
+        for metric in metrics:
+            value = metric_value(metric, doc)
+            if value is not None and math.isfinite(value):
+                groups.setdefault(key, {}).setdefault(metric, QuantileSketch()).add(value)
+
+    ops = []
+    for (location, module, hour), sketches in groups.items():
+        update = {
+            "$setOnInsert": {"location": location, "module": module, "hour": hour},
+            "$inc": {},
+            "$min": {},
+            "$max": {},
+        }
+        for metric, sketch in sketches.items():
+            for operator, fields in sketch.to_update(metric).items():
+                update[operator].update(fields)
+        _id = f"{location or '-'}|{module or '-'}|{hour.isoformat(timespec='hours')}"
+        ops.append(UpdateOne({"_id": _id}, update, upsert=True))
+    return ops
+
+
+async def _flush(source: str, batch: List[dict]):
+    # A batch with no usable values (no timestamps or metrics) yields no updates
+    ops = sketch_updates(source, batch)
+    if ops:
+        await sketches_col.bulk_write(ops, ordered=False)
+
+
+async def record_readings(source: str, docs: List[dict]):
+    """Called by the ingest path after a batch is stored."""
+    if SKETCH_ENABLED:
+        await _flush(source, docs)
+
+
+async def merged(
+    metric: str,
+    start: datetime,
+    end: datetime,
+    locations: Optional[List[str]] = None,
+    modules: Optional[List[str]] = None,
+    group_by: Optional[str] = None,
+) -> Dict[Optional[str], QuantileSketch]:
+    """One sketch per ``group_by`` value ("location", "module" or None for all) over hours in [start, end)."""
+    match: dict = {"hour": {"$gte": _hour(start), "$lt": end}, f"{metric}.count": {"$gt": 0}}
+    if locations:
+        match["location"] = {"$in": locations}
+    if modules:
+        match["module"] = {"$in": modules}
+    group = f"${group_by}" if group_by else None
+    pipeline = [
+        {"$match": match},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": group,
+                "count": {"$sum": f"${metric}.count"},
+                "sum": {"$sum": f"${metric}.sum"},
+                "zero": {"$sum": f"${metric}.zero"},
+                "min": {"$min": f"${metric}.min"},
+                "max": {"$max": f"${metric}.max"},
+            }}],
+            "buckets": [
+                {"$project": {"group": group or {"$literal": None}, "bucket": {"$concatArrays": [
+                    {"$map": {"input": {"$objectToArray": {"$ifNull": [f"${metric}.p", {}]}}, "in": {"s": "p", "k": "$$this.k", "v": "$$this.v"}}},
+                    {"$map": {"input": {"$objectToArray": {"$ifNull": [f"${metric}.n", {}]}}, "in": {"s": "n", "k": "$$this.k", "v": "$$this.v"}}},
+                ]}}},
+                {"$unwind": "$bucket"},
+                {"$group": {"_id": {"group": "$group", "s": "$bucket.s", "k": "$bucket.k"}, "count": {"$sum": "$bucket.v"}}},
+            ],
+        }},
+    ]
+    rows = await (await sketches_col.aggregate(pipeline)).to_list()
+    result: Dict[Optional[str], QuantileSketch] = {}
+    if not rows:
+        return result
+    for row in rows[0]["totals"]:
+        if row.get("count"):
+            result[row["_id"]] = QuantileSketch.from_doc(row)
+    for row in rows[0]["buckets"]:
+        sketch = result.get(row["_id"]["group"])
+        if sketch is not None:
+            store = sketch.positive if row["_id"]["s"] == "p" else sketch.negative
+            store[int(row["_id"]["k"])] = row["count"]
+    return result
+
+
+async def rebuild(start: datetime, end: datetime) -> Dict[str, int]:
+    """
+    Recompute the sketches of [start, end) from stored telemetry. Sketches hold
+    whole hours, so both bounds are widened to the hour: a mid-hour ``end``
+    would otherwise delete that hour's sketch and re-add only part of it.
+    """
+    start = _hour(start)
+    end = _hour(end - timedelta(microseconds=1)) + timedelta(hours=1)
+    await sketches_col.delete_many({"hour": {"$gte": start, "$lt": end}})
+    counts = {}
+    for source, (collection, _) in SOURCES.items():
+        counts[source] = 0
+        batch: List[dict] = []
+        cursor = collection.find(
+            {"received_at": {"$gte": start, "$lt": end}},
+            {"_id": 0, "received_at": 1, "location": 1, "module": 1, "current_a": 1, "current_ma": 1, "temperature": 1, "humidity": 1},
+        )
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= REBUILD_BATCH:
+                await _flush(source, batch)
+                counts[source] += len(batch)
+                batch = []
+        await _flush(source, batch)
+        counts[source] += len(batch)
+    return counts
+
+
+async def ensure_indexes():
+    await sketches_col.create_index([("location", 1), ("hour", 1)])
+    await sketches_col.create_index([("module", 1), ("hour", 1)])
+    await sketches_col.create_index("hour")
+
+
+async def _main(args):
+    try:
+        if args.command == "rebuild":
+            await ensure_indexes()
+            print(await rebuild(datetime.fromisoformat(args.start), datetime.fromisoformat(args.end)))
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantile sketches of telemetry")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    asyncio.run(_main(parser.parse_args()))
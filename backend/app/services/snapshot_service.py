@@ -0,0 +1,252 @@
+"""
+Columnar analytics snapshots.
+
+Writes one Parquet file per collection per UTC day under SNAPSHOT_DIR with a
+canonical ``ts`` column, dictionary-encoded string columns and typed numeric
+columns, and loads date ranges back into pandas through memory-mapped Arrow
+reads. pyarrow and pandas are imported lazily so API startup stays light.
+
+    python -m app.services.snapshot_service build --start 2026-01-01 --end 2026-01-31
+    python -m app.services.snapshot_service load --dataset energy_readings --start 2026-01-01 --end 2026-01-31
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+import database
+from database import BASE_DIR, analytics_col, energy_col, faults_col
+
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", str(BASE_DIR / "data" / "snapshots")))
+SNAPSHOT_BATCH_SIZE = 10000
+
+# dataset -> collection, time field, string columns, numeric columns (name -> arrow type name)
+DATASETS: Dict[str, dict] = {
+    "energy_readings": {
+        "collection": energy_col,
+        "time_field": "received_at",
+        "strings": ["module", "location", "sensor", "source", "type"],
+        "numbers": {
+            "current_ma": "float64",
+            "current_a": "float64",
+            "rms_a": "float64",
+            "voltage": "float64",
+            "vref": "float64",
+            "adc_samples": "int64",
+            "wifi_rssi": "int64",
+        },
+    },
+    "occupancy_telemetry": {
+        "collection": analytics_col,
+        "time_field": "received_at",
+        "strings": ["module", "location", "source"],
+        "numbers": {
+            "rcwl": "int8",
+            "pir": "int8",
+            "temperature": "float64",
+            "humidity": "float64",
+            "rssi": "int64",
+            "uptime": "int64",
+            "heap": "int64",
+        },
+    },
+    "faults": {
+        "collection": faults_col,
+        "time_field": "detected_at",
+        "strings": ["fault_id", "device_id", "module", "location", "issue", "severity", "status", "source"],
+        "numbers": {"confidence": "float64"},
+    },
+}
+
+
+def _schema(spec: dict):
+    import pyarrow as pa
+
+    fields = [pa.field("ts", pa.timestamp("ms", tz="UTC"))]
+    fields += [pa.field(name, pa.dictionary(pa.int32(), pa.string())) for name in spec["strings"]]
+    fields += [pa.field(name, getattr(pa, type_name)()) for name, type_name in spec["numbers"].items()]
+    return pa.schema(fields)
+
+
+# Inclusive bounds of the integer column types
+INT_RANGES = {"int8": (-2 ** 7, 2 ** 7 - 1), "int64": (-2 ** 63, 2 ** 63 - 1)}
+
+
+def _number(value, type_name: str):
+    """The value as the column type, or null when it does not fit (so one bad reading cannot fail a day)."""
+    if isinstance(value, bool):
+        value = int(value)
+    if not isinstance(value, (int, float)):
+        return None
+    if type_name not in INT_RANGES:
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            return None
+        value = int(value)
+    low, high = INT_RANGES[type_name]
+    return value if low <= value <= high else None
+
+
+def _to_record_batch(docs: List[dict], spec: dict, schema):
+    import pyarrow as pa
+
+    time_field = spec["time_field"]
+    stamps = [d.get(time_field) if isinstance(d.get(time_field), datetime) else None for d in docs]
+    columns = [pa.array(stamps, type=schema.field("ts").type)]
+    for name in spec["strings"]:
+        values = [d.get(name) if isinstance(d.get(name), str) else None for d in docs]
+        columns.append(pa.array(values, type=pa.string()).dictionary_encode())
+    for name, type_name in spec["numbers"].items():
+        columns.append(pa.array([_number(d.get(name), type_name) for d in docs], type=schema.field(name).type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def snapshot_path(dataset: str, day: date) -> Path:
+    return SNAPSHOT_DIR / dataset / f"{day.isoformat()}.parquet"
+
+
+def _day_bounds(day: date):
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1)
+
+
+async def write_day(dataset: str, day: date) -> int:
+    """Write (or rewrite) one day's snapshot file; returns the number of rows."""
+    import pyarrow.parquet as pq
+
+    spec = DATASETS[dataset]
+    schema = _schema(spec)
+    start, end = _day_bounds(day)
+    time_field = spec["time_field"]
+    projection = {f: 1 for f in [time_field, *spec["strings"], *spec["numbers"]]}
+    projection["_id"] = 0
+
+    cursor = (
+        spec["collection"]
+        .find({time_field: {"$gte": start, "$lt": end}}, projection)
+        .sort([(time_field, 1), ("_id", 1)])
+        .batch_size(SNAPSHOT_BATCH_SIZE)
+    )
+
+    path = snapshot_path(dataset, day)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".parquet.tmp")
+    writer = pq.ParquetWriter(str(tmp_path), schema, compression="zstd")
+    rows = 0
+    try:
+        while True:
+            batch = await cursor.to_list(SNAPSHOT_BATCH_SIZE)
+            if not batch:
+                break
+            record_batch = await run_in_threadpool(_to_record_batch, batch, spec, schema)
+            await run_in_threadpool(writer.write_batch, record_batch)
+            rows += len(batch)
+    finally:
+        writer.close()
+    os.replace(tmp_path, path)
+    return rows
+
+
+def _days(start: date, end: date) -> Iterable[date]:
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+async def build(start: date, end: date, datasets: Optional[List[str]] = None, overwrite: bool = False) -> Dict[str, dict]:
+    """
+    Snapshot every day in [start, end]. Finished days that already have a file
+    are skipped unless ``overwrite``; today is always rewritten since it is still growing.
+    """
+    today = datetime.utcnow().date()
+    summary: Dict[str, dict] = {}
+    for dataset in datasets or list(DATASETS):
+        written = skipped = rows = 0
+        for day in _days(start, min(end, today)):
+            if not overwrite and day < today and snapshot_path(dataset, day).exists():
+                skipped += 1
+                continue
+            rows += await write_day(dataset, day)
+            written += 1
+        summary[dataset] = {"days_written": written, "days_skipped": skipped, "rows": rows}
+    return summary
+
+
+def list_snapshots(dataset: str) -> List[str]:
+    folder = SNAPSHOT_DIR / dataset
+    if not folder.exists():
+        return []
+    return sorted(p.stem for p in folder.glob("*.parquet"))
+
+
+def load_range(dataset: str, start: date, end: date, columns: Optional[List[str]] = None):
+    """Load the snapshots for [start, end] into one pandas DataFrame (memory-mapped reads)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    spec = DATASETS[dataset]
+    if columns and "ts" not in columns:
+        columns = ["ts", *columns]
+    strings = [c for c in spec["strings"] if not columns or c in columns]
+
+    tables = []
+    for day in _days(start, end):
+        path = snapshot_path(dataset, day)
+        if path.exists():
+            tables.append(pq.read_table(str(path), columns=columns, memory_map=True, read_dictionary=strings))
+    if not tables:
+        return _schema(spec).empty_table().to_pandas()
+    return pa.concat_tables(tables).to_pandas()
+
+
+def summarize(frame) -> dict:
+    """Small JSON-friendly description of a loaded snapshot frame."""
+    if frame.empty:
+        return {"rows": 0, "start": None, "end": None, "locations": {}}
+    numeric = frame.select_dtypes("number")
+    by_location = {}
+    if "location" in frame:
+        grouped = numeric.groupby(frame["location"].astype(str), observed=True)
+        by_location = {
+            loc: {"rows": int(len(group)), "mean": {k: (None if v != v else round(float(v), 4)) for k, v in group.mean().items()}}
+            for loc, group in grouped
+        }
+    return {
+        "rows": int(len(frame)),
+        "start": frame["ts"].min().to_pydatetime().astimezone(timezone.utc),
+        "end": frame["ts"].max().to_pydatetime().astimezone(timezone.utc),
+        "locations": by_location,
+    }
+
+
+async def _main(args):
+    try:
+        if args.command == "build":
+            print(await build(args.start, args.end, args.dataset, overwrite=args.overwrite))
+        else:
+            started = time.perf_counter()
+            frame = load_range(args.dataset[0], args.start, args.end)
+            print(f"Loaded {len(frame)} rows in {time.perf_counter() - started:.2f}s")
+            print(frame.describe(include="all").transpose())
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or load per-day Parquet snapshots of telemetry")
+    parser.add_argument("command", choices=["build", "load"])
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--dataset", action="append", choices=list(DATASETS))
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+    if args.command == "load" and not args.dataset:
+        parser.error("load needs --dataset")
+    asyncio.run(_main(args))
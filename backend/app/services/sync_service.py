@@ -0,0 +1,208 @@
+"""
+Change sequence for delta sync.
+
+Every write to a synced collection takes the next value of one global,
+monotonically increasing counter and stores it on the document as ``_seq``.
+Deletes leave a tombstone carrying their own ``_seq`` so clients learn about
+them too. A client that remembers the highest version it has seen can then ask
+for just the documents and tombstones above it.
+
+Sequence numbers are taken before the write commits, so a higher one can
+become visible before a lower one. Writes stamped within the last
+SYNC_SETTLE_SECONDS are therefore held back, together with everything after
+them, and the returned version is the highest ``_seq`` actually sent.
+
+Old tombstones can be pruned; clients whose version predates the pruned range
+are told to reset and take a full snapshot:
+
+    python -m app.services.sync_service prune --days 30
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+import database
+from database import counters_col, devices_col, faults_col, tombstones_col
+
+SEQUENCE_ID = "change_seq"
+TOMBSTONE_FLOOR_ID = "tombstone_floor"
+SYNC_MAX_ITEMS = 1000
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "5"))
+
+# Synced collection name -> (collection, key field, query for a full snapshot)
+SYNCED: Dict[str, tuple] = {
+    "devices": (devices_col, "device_id", {}),
+    "faults": (faults_col, "fault_id", {"status": "active"}),
+}
+
+
+async def ensure_indexes():
+    for col, _, _ in SYNCED.values():
+        await col.create_index([("_seq", ASCENDING)])
+    await tombstones_col.create_index([("collection", ASCENDING), ("_seq", ASCENDING)])
+
+
+async def next_sequence() -> int:
+    doc = await counters_col.find_one_and_update(
+        {"_id": SEQUENCE_ID},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["seq"]
+
+
+async def reserve_sequences(count: int) -> range:
+    """``count`` consecutive sequence numbers taken with a single counter update."""
+    doc = await counters_col.find_one_and_update(
+        {"_id": SEQUENCE_ID},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return range(doc["seq"] - count + 1, doc["seq"] + 1)
+
+
+async def current_sequence() -> int:
+    doc = await counters_col.find_one({"_id": SEQUENCE_ID})
+    return doc["seq"] if doc else 0
+
+
+async def version_fields() -> dict:
+    """Fields to ``$set`` (or merge into an insert) on every synced write."""
+    return {"_seq": await next_sequence(), "updated_at": datetime.utcnow()}
+
+
+async def version_block(count: int) -> List[dict]:
+    """``version_fields`` for ``count`` writes of one batch, in order."""
+    if count <= 0:
+        return []
+    now = datetime.utcnow()
+    return [{"_seq": seq, "updated_at": now} for seq in await reserve_sequences(count)]
+
+
+async def record_delete(collection: str, key: str):
+    await tombstones_col.insert_one({
+        "collection": collection,
+        "key": key,
+        "_seq": await next_sequence(),
+        "deleted_at": datetime.utcnow(),
+    })
+
+
+async def _tombstone_floor() -> int:
+    doc = await counters_col.find_one({"_id": TOMBSTONE_FLOOR_ID})
+    return doc["seq"] if doc else 0
+
+
+async def _unsettled_floor(collection: str, since: int) -> Optional[int]:
+    """Lowest ``_seq`` above ``since`` written within the settle window, if any."""
+    col = SYNCED[collection][0]
+    cutoff = datetime.utcnow() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    floors = []
+    for source, query, stamp in (
+        (col, {}, "updated_at"),
+        (tombstones_col, {"collection": collection}, "deleted_at"),
+    ):
+        recent = await (
+            source.find({**query, "_seq": {"$gt": since}, stamp: {"$gte": cutoff}}, {"_id": 0, "_seq": 1})
+            .sort("_seq", ASCENDING)
+            .limit(1)
+            .to_list()
+        )
+        floors += [doc["_seq"] for doc in recent]
+    return min(floors) if floors else None
+
+
+async def _settled_version(collection: str) -> int:
+    """Highest visible ``_seq`` of ``collection`` below its first unsettled write."""
+    col = SYNCED[collection][0]
+    unsettled = await _unsettled_floor(collection, 0)
+    seq_range = {"$lt": unsettled} if unsettled is not None else {"$gt": 0}
+    highest = 0
+    for source, query in ((col, {}), (tombstones_col, {"collection": collection})):
+        top = await (
+            source.find({**query, "_seq": seq_range}, {"_id": 0, "_seq": 1})
+            .sort("_seq", DESCENDING)
+            .limit(1)
+            .to_list()
+        )
+        highest = max([highest, *(doc["_seq"] for doc in top)])
+    return highest
+
+
+async def changes(collection: str, since: int = 0, limit: int = SYNC_MAX_ITEMS) -> dict:
+    """
+    Documents and deletions of ``collection`` after version ``since``, up to
+    the first write that has not settled yet. ``since=0`` (or a version older
+    than the pruned tombstones) returns a full snapshot with ``reset: true``.
+    """
+    col, key, snapshot_query = SYNCED[collection]
+
+    if since <= 0 or since < await _tombstone_floor():
+        version = await _settled_version(collection)
+        docs = await col.find(snapshot_query, {"_id": 0}).to_list()
+        # Documents above the version are sent again by the next delta, which is harmless
+        return {"version": version, "reset": True, "has_more": False, "upserted": docs, "deleted": []}
+
+    seq_range = {"$gt": since}
+    unsettled = await _unsettled_floor(collection, since)
+    if unsettled is not None:
+        seq_range["$lt"] = unsettled
+    docs = await (
+        col.find({"_seq": seq_range}, {"_id": 0})
+        .sort("_seq", ASCENDING)
+        .limit(limit)
+        .to_list()
+    )
+    has_more = len(docs) == limit
+    if has_more:
+        seq_range["$lte"] = docs[-1]["_seq"]
+
+    tombstones = await (
+        tombstones_col.find(
+            {"collection": collection, "_seq": seq_range},
+            {"_id": 0, "key": 1, "_seq": 1},
+        )
+        .sort("_seq", ASCENDING)
+        .to_list()
+    )
+    # A document re-created after its deletion is reported as upserted only
+    live = {doc.get(key) for doc in docs}
+    deleted = [t["key"] for t in tombstones if t["key"] not in live]
+    version = max([since, *(doc["_seq"] for doc in docs), *(t["_seq"] for t in tombstones)])
+    return {"version": version, "reset": False, "has_more": has_more, "upserted": docs, "deleted": deleted}
+
+
+async def prune_tombstones(days: int) -> int:
+    """Drop tombstones older than ``days`` and raise the floor below which clients must reset."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    newest = await tombstones_col.find_one(
+        {"deleted_at": {"$lt": cutoff}}, {"_seq": 1}, sort=[("_seq", -1)]
+    )
+    if newest is None:
+        return 0
+    await counters_col.update_one(
+        {"_id": TOMBSTONE_FLOOR_ID}, {"$max": {"seq": newest["_seq"]}}, upsert=True
+    )
+    result = await tombstones_col.delete_many({"_seq": {"$lte": newest["_seq"]}})
+    return result.deleted_count
+
+
+async def _main(args):
+    try:
+        if args.command == "prune":
+            print({"pruned": await prune_tombstones(args.days)})
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the delta-sync change log")
+    parser.add_argument("command", choices=["prune"])
+    parser.add_argument("--days", type=int, default=30)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,50 @@
+"""
+Throughput of the streaming anomaly detector on synthetic fleet telemetry.
+
+Times ``AnomalyDetector.detect`` alone (no database) in ingest-sized batches,
+to check one core keeps up with the fleet's ingest rate:
+
+    python -m benchmarks.bench_anomaly --modules 200 --days 2
+"""
+import argparse
+import json
+import time
+
+from app.services.anomaly_service import AnomalyDetector
+from benchmarks.fleet import Fleet, FleetSpec
+
+
+def run(spec: FleetSpec, batch_size: int) -> dict:
+    fleet = Fleet(spec)
+    results = {}
+    for source, readings in (("energy", list(fleet.current_readings())), ("occupancy", list(fleet.occupancy_readings()))):
+        detector = AnomalyDetector()
+        started = time.perf_counter()
+        anomalies = 0
+        for i in range(0, len(readings), batch_size):
+            anomalies += len(detector.detect(source, readings[i:i + batch_size]))
+        elapsed = time.perf_counter() - started
+        results[source] = {
+            "readings": len(readings),
+            "seconds": round(elapsed, 3),
+            "readings_per_second": round(len(readings) / elapsed),
+            "us_per_reading": round(elapsed / len(readings) * 1e6, 2),
+            "anomalies": anomalies,
+            "suppressed": detector.suppressed,
+        }
+    # Steady-state rate the fleet produces, for comparison
+    results["fleet_ingest_readings_per_second"] = round(
+        spec.modules * (1 / spec.current_interval_seconds + 1 / spec.occupancy_interval_seconds), 1
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the anomaly detector on synthetic telemetry")
+    parser.add_argument("--modules", type=int, default=100)
+    parser.add_argument("--locations", type=int, default=20)
+    parser.add_argument("--days", type=float, default=1)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    spec = FleetSpec(locations=args.locations, modules=args.modules, days=args.days)
+    print(json.dumps(run(spec, args.batch_size), indent=2))
@@ -0,0 +1,410 @@
+"""
+End-to-end API benchmark on a synthetic fleet.
+
+Seeds a dedicated database (BENCH_DB_NAME, default ``volt_guard_bench``, on
+MONGO_URI) with the fleet from ``benchmarks.fleet``, then drives the app in
+process over ASGI (no uvicorn or network hop) and measures latency
+percentiles and throughput of every route in ``routes/``, plus raw
+``ingest_service`` batch throughput. Results are written as JSON so runs on
+different commits can be compared:
+
+    python -m benchmarks.bench_api --days 7 --modules 48 --output main.json
+    python -m benchmarks.bench_api --skip-seed --baseline main.json
+
+With ``--baseline`` every route whose p95 grew by more than ``--threshold``
+is listed and the exit status is 1. The response cache and the slow query
+recorder are disabled unless ``--response-cache`` is given, so repeated
+requests measure the route rather than the cache. The fault scanner, report
+job workers, baseline builder and heartbeat sweeper are disabled so they do
+not compete with the measured requests; seeding fills the sketches,
+heartbeats and baselines they would otherwise maintain. The realtime
+SSE/WebSocket feeds are long-lived streams and are not part of the
+request/response runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from benchmarks.fleet import Fleet, FleetSpec
+
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "volt_guard_bench")
+BENCH_API_KEY = "bench-api-key"
+BENCH_PASSWORD = "bench-password"
+SEED_BATCH_SIZE = 10000
+INGEST_BATCH_SIZES = (1, 100, 1000)
+SEEDED_COLLECTIONS = (
+    "analytics_col", "energy_col", "devices_col", "faults_col", "anomalies_col",
+    "prediction_col", "user_col", "catalog_col", "counters_col", "tombstones_col",
+    "jobs_col", "baselines_col", "sketches_col", "heartbeats_col", "scan_state_col",
+)
+# Lifespan background workers, switched off while benchmarking
+BACKGROUND_WORKER_FLAGS = ("FAULT_SCAN_ENABLED", "JOB_WORKER_ENABLED", "BASELINE_ENABLED", "HEARTBEAT_SWEEP_ENABLED")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies_ms: List[float], wall_seconds: float, statuses: Dict[int, int], body_bytes: int) -> dict:
+    ordered = sorted(latencies_ms)
+    count = len(ordered)
+    return {
+        "requests": count,
+        "errors": sum(n for code, n in statuses.items() if code >= 400),
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "mean_ms": round(statistics.fmean(ordered), 3) if count else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p90_ms": round(percentile(ordered, 90), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3) if count else 0.0,
+        "throughput_rps": round(count / wall_seconds, 1) if wall_seconds else 0.0,
+        "mean_bytes": body_bytes // count if count else 0,
+    }
+
+
+async def _insert_batches(collection, docs, batch_size: int = SEED_BATCH_SIZE, source: Optional[str] = None) -> int:
+    """Insert ``docs`` in batches; with ``source``, also fold each batch into the heartbeats and sketches like ingest does."""
+    from app.services import heartbeat_service, sketch_service
+
+    async def flush(batch):
+        await collection.insert_many(batch, ordered=False)
+        if source:
+            await heartbeat_service.record_readings(source, batch)
+            await sketch_service.record_readings(source, batch)
+
+    total, batch = 0, []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+        total += len(batch)
+    return total
+
+
+async def seed(fleet: Fleet) -> dict:
+    """Drop the benchmark collections and load the fleet into them."""
+    import database
+    from app.services import (
+        baseline_service, catalog_service, heartbeat_service, job_service, sketch_service, sync_service,
+    )
+    from utils.security import hash_password
+
+    for collection in SEEDED_COLLECTIONS:
+        await getattr(database, collection).drop()
+    # Collections were dropped with their indexes
+    await database.ensure_indexes()
+    for service in (catalog_service, sync_service, job_service, baseline_service, sketch_service, heartbeat_service):
+        await service.ensure_indexes()
+
+    started = time.perf_counter()
+    counts = {
+        "occupancy_telemetry": await _insert_batches(database.analytics_col, fleet.occupancy_readings(), source="occupancy"),
+        "energy_readings": await _insert_batches(database.energy_col, fleet.current_readings(), source="energy"),
+    }
+    # Synced collections carry the change sequence their write paths would stamp
+    seq = 0
+    versioned = []
+    for doc in fleet.devices + fleet.faults():
+        seq += 1
+        versioned.append({**doc, "_seq": seq, "updated_at": fleet.spec.end})
+    devices, faults = versioned[: len(fleet.devices)], versioned[len(fleet.devices):]
+    counts["devices"] = await _insert_batches(database.devices_col, devices)
+    counts["faults"] = await _insert_batches(database.faults_col, faults)
+    await database.counters_col.replace_one({"_id": sync_service.SEQUENCE_ID}, {"seq": seq}, upsert=True)
+    counts["anomalies"] = await _insert_batches(database.anomalies_col, fleet.anomalies())
+    counts["predictions"] = await _insert_batches(database.prediction_col, fleet.predictions())
+    await database.user_col.insert_one({
+        "user_id": "bench-admin",
+        "name": "Bench Admin",
+        "email": "bench@example.com",
+        "password": hash_password(BENCH_PASSWORD),
+        "role": "admin",
+    })
+    catalog = await catalog_service.rebuild()
+    counts["catalog"] = catalog["modules"] + catalog["locations"]
+    counts["baselines"] = (await baseline_service.BaselineBuilder().update_once())["profiles"]
+    return {"seconds": round(time.perf_counter() - started, 2), "counts": counts}
+
+
+def route_scenarios(fleet: Fleet) -> List[dict]:
+    """One request template per route; path parameters point at seeded documents."""
+    location = fleet.location_names[0]
+    module = fleet.module_names[0]
+    wired = next(d for d in fleet.devices if d["module_id"])
+    end = fleet.spec.end
+    start = end - timedelta(days=1)
+    energy_reading = {
+        "module": module, "location": location, "sensor": "ACS712-20A", "current_a": 1.2,
+        "current_ma": 1200.0, "rms_a": 1.22, "wifi_rssi": -60, "source": "bench",
+    }
+    occupancy_reading = {
+        "module": module, "location": location, "rcwl": 1, "pir": 0, "temperature": 23.5,
+        "humidity": 51.0, "received_at": end.isoformat(), "source": "bench",
+    }
+    get = [
+        ("analytics.filters", "/analytics/filters", {}),
+        ("analytics.occupancy_stats", "/analytics/occupancy-stats", {"limit": 50}),
+        ("analytics.latest", "/analytics/latest", {"limit": 50}),
+        ("analytics.latest_module", "/analytics/latest", {"limit": 50, "module": module}),
+        ("analytics.recommendations", "/analytics/recommendations", {"limit": 50}),
+        ("anomalies.active", "/anomalies/active", {"limit": 100}),
+        ("devices.list", "/devices/", {"limit": 100}),
+        ("devices.get", f"/devices/{wired['device_id']}", {}),
+        ("devices.energy_readings", f"/devices/{wired['device_id']}/energy-readings", {"hours": 24}),
+        ("energy.latest", "/energy/latest", {"limit": 500}),
+        ("energy.by_location", "/energy/by-location", {}),
+        ("energy.usage", "/energy/usage", {}),
+        ("exports.energy_ndjson", "/export/energy_readings", {"start": start.isoformat(), "end": end.isoformat()}),
+        ("exports.snapshots", "/export/snapshots/energy_readings", {}),
+        ("faults.active", "/faults/active", {"limit": 20}),
+        ("faults.history", "/faults/history", {"limit": 50}),
+        ("faults.get", "/faults/F-000001", {}),
+        ("faults.device_health", "/faults/device-health", {}),
+        ("faults.model_stats", "/faults/model-stats", {}),
+        ("faults.trends", "/faults/analytics/trends", {"days": 7}),
+        ("faults.predictive_warnings", "/faults/analytics/predictive-warnings", {}),
+        ("faults.energy_correlation", "/faults/analytics/energy-correlation", {"hours": 24}),
+        ("faults.patterns", "/faults/analytics/patterns", {}),
+        ("faults.zone_heatmap", "/faults/analytics/zone-heatmap", {}),
+        ("analytics.percentiles", "/analytics/percentiles", {"start": start.isoformat(), "end": end.isoformat()}),
+        ("analytics.percentiles_by_location", "/analytics/percentiles",
+         {"metric": "temperature", "start": fleet.spec.start.isoformat(), "end": end.isoformat(), "group_by": "location"}),
+        ("heartbeats.list", "/heartbeats/", {}),
+        ("heartbeats.get", f"/heartbeats/{module}", {}),
+        ("jobs.list", "/jobs/", {"limit": 50}),
+        ("jobs.reports", "/jobs/reports", {}),
+        ("prediction.daily", "/prediction/daily", {}),
+        ("sync.snapshot", "/sync/", {}),
+        ("users.list", "/users/", {}),
+        ("zones.list", "/zones/", {}),
+        ("zones.detail", f"/zones/{location}", {"limit": 50}),
+        ("zones.baseline", f"/zones/{location}/baseline", {}),
+        ("zones.baseline_module", f"/zones/{location}/baseline", {"module": module}),
+        ("admin.slow_queries", "/admin/slow-queries", {}),
+    ]
+    scenarios = [{"name": name, "method": "GET", "path": path, "params": params} for name, path, params in get]
+    scenarios += [
+        {"name": "auth.login", "method": "POST", "path": "/auth/login",
+         "json": {"email": "bench@example.com", "password": BENCH_PASSWORD}, "auth": False},
+        # Identical submissions share one queued job, so this measures submit + dedupe
+        {"name": "jobs.submit", "method": "POST", "path": "/jobs/",
+         "json": {"report": "fault_correlation", "params": {"days": 7}}},
+        {"name": "prediction.forecast_dry_run", "method": "POST", "path": "/prediction/forecast",
+         "params": {"dry_run": "true"}},
+        {"name": "ingest.current_batch_100", "method": "POST", "path": "/api/v1/current",
+         "json": [energy_reading] * 100, "api_key": True},
+        {"name": "ingest.telemetry_batch_100", "method": "POST", "path": "/api/v1/telemetry",
+         "json": [occupancy_reading] * 100, "api_key": True},
+    ]
+    return scenarios
+
+
+async def run_scenario(client, scenario: dict, headers: dict, requests: int, concurrency: int, warmup: int) -> dict:
+    request_headers = {}
+    if scenario.get("auth", True):
+        request_headers.update(headers["auth"])
+    if scenario.get("api_key"):
+        request_headers.update(headers["api_key"])
+
+    async def once():
+        started = time.perf_counter()
+        response = await client.request(
+            scenario["method"], scenario["path"], params=scenario.get("params"),
+            json=scenario.get("json"), headers=request_headers,
+        )
+        return (time.perf_counter() - started) * 1000, response.status_code, len(response.content)
+
+    for _ in range(warmup):
+        await once()
+
+    latencies, statuses, body_bytes = [], {}, 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, body_bytes
+        while remaining > 0:
+            remaining -= 1
+            elapsed, status, size = await once()
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+            body_bytes += size
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, time.perf_counter() - started, statuses, body_bytes)
+
+
+async def bench_ingest_service(fleet: Fleet, batches: int) -> dict:
+    """Readings/second through ingest_service (storage + catalog), without HTTP or validation."""
+    from app.services.ingest_service import ingest_energy, ingest_occupancy
+
+    results = {}
+    for source, ingest, generate in (
+        ("energy", ingest_energy, fleet.current_readings),
+        ("occupancy", ingest_occupancy, fleet.occupancy_readings),
+    ):
+        readings = generate()
+        for size in INGEST_BATCH_SIZES:
+            latencies, total = [], 0
+            started = time.perf_counter()
+            for _ in range(batches):
+                docs = [{**next(readings), "source": "bench"} for _ in range(size)]
+                batch_started = time.perf_counter()
+                total += await ingest(docs)
+                latencies.append((time.perf_counter() - batch_started) * 1000)
+            wall = time.perf_counter() - started
+            stats = summarize(latencies, wall, {201: len(latencies)}, 0)
+            stats["readings_per_second"] = round(total / wall, 1) if wall else 0.0
+            results[f"{source}_batch_{size}"] = stats
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    import httpx
+
+    import database
+    from app.main import app
+    from utils.jwt_handler import create_access_token
+
+    fleet = Fleet(FleetSpec(
+        locations=args.locations,
+        modules=args.modules,
+        days=args.days,
+        occupancy_interval_seconds=args.occupancy_interval,
+        current_interval_seconds=args.current_interval,
+        devices_per_module=args.devices_per_module,
+        faults=args.faults,
+        anomalies=args.anomalies,
+        seed=args.seed,
+    ))
+    results = {
+        "meta": {
+            "git_commit": _git_commit(),
+            "started_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "mongo_driver": database.MONGO_DRIVER,
+            "database": args.db,
+            "response_cache": args.response_cache,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "fleet": fleet.spec.as_dict(),
+        },
+    }
+    async with app.router.lifespan_context(app):
+        if not args.skip_seed:
+            print(f"Seeding {args.db}: {fleet.spec.expected_counts()}", file=sys.stderr)
+            results["seed"] = await seed(fleet)
+
+        headers = {
+            "auth": {"Authorization": f"Bearer {create_access_token({'user_id': 'bench-admin', 'role': 'admin'})}"},
+            "api_key": {"X-API-Key": os.environ["API_KEY"]},
+        }
+        transport = httpx.ASGITransport(app=app)
+        results["routes"] = {}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for scenario in route_scenarios(fleet):
+                if args.only and not any(scenario["name"].startswith(prefix) for prefix in args.only):
+                    continue
+                stats = await run_scenario(client, scenario, headers, args.requests, args.concurrency, args.warmup)
+                results["routes"][scenario["name"]] = stats
+                print(f"{scenario['name']:>32}: p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+                      f"{stats['throughput_rps']:8.1f} req/s  errors {stats['errors']}", file=sys.stderr)
+        if not args.only or any(prefix.startswith("ingest_service") for prefix in args.only):
+            results["ingest_service"] = await bench_ingest_service(fleet, args.ingest_batches)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Routes whose p95 regressed by more than ``threshold`` (1.2 = 20% slower)."""
+    regressions = []
+    for section in ("routes", "ingest_service"):
+        for name, stats in results.get(section, {}).items():
+            before = baseline.get(section, {}).get(name)
+            if not before or not before.get("p95_ms"):
+                continue
+            ratio = stats["p95_ms"] / before["p95_ms"]
+            if ratio > threshold:
+                regressions.append(f"{section}.{name}: p95 {before['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ms (x{ratio:.2f})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every API route on a synthetic fleet")
+    parser.add_argument("--db", default=BENCH_DB_NAME, help="Database to (re)seed; dropped first")
+    parser.add_argument("--locations", type=int, default=8)
+    parser.add_argument("--modules", type=int, default=24)
+    parser.add_argument("--days", type=float, default=3)
+    parser.add_argument("--occupancy-interval", type=int, default=60, help="Seconds between occupancy readings per module")
+    parser.add_argument("--current-interval", type=int, default=30, help="Seconds between current readings per module")
+    parser.add_argument("--devices-per-module", type=int, default=2)
+    parser.add_argument("--faults", type=int, default=500)
+    parser.add_argument("--anomalies", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already in --db")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--ingest-batches", type=int, default=20, help="Batches per ingest_service batch size")
+    parser.add_argument("--only", nargs="*", help="Route name prefixes to run (e.g. faults zones ingest_service)")
+    parser.add_argument("--response-cache", action="store_true", help="Keep the GET response cache enabled")
+    parser.add_argument("--force", action="store_true", help="Allow seeding a database whose name lacks 'bench'")
+    parser.add_argument("--output", help="Write JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier results to compare p95 latencies against")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    if not args.skip_seed and "bench" not in args.db and not args.force:
+        parser.error(f"refusing to drop and seed {args.db!r}; use a *bench* database or --force")
+
+    # Read at import time by the app modules, so set before importing them
+    os.environ["MONGODB_DB_NAME"] = args.db
+    os.environ.setdefault("API_KEY", BENCH_API_KEY)
+    os.environ["RESPONSE_CACHE_ENABLED"] = "true" if args.response_cache else "false"
+    os.environ["SLOW_QUERY_ENABLED"] = "false"
+    for flag in BACKGROUND_WORKER_FLAGS:
+        os.environ[flag] = "false"
+
+    results = asyncio.run(run(args))
+    rendered = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(rendered + "\n")
+    else:
+        print(rendered)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Serialization micro-benchmark for large list responses.
+
+Compares the stock FastAPI path (response_model validation + jsonable_encoder
++ json.dumps) with returning a FastJSONResponse directly, on synthetic
+energy-reading and fault rows shaped like the stored documents.
+
+    python -m benchmarks.bench_serialization --rows 10000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.fault_model import Fault
+from utils.json_response import FastJSONResponse
+
+
+def energy_rows(count: int) -> List[dict]:
+    start = datetime.utcnow()
+    return [
+        {
+            "module": f"mod-{i % 20}",
+            "location": f"room-{i % 8}",
+            "sensor": "ACS712",
+            "current_ma": random.uniform(0, 8000),
+            "current_a": random.uniform(0, 8),
+            "rms_a": random.uniform(0, 8),
+            "voltage": 230.0,
+            "wifi_rssi": -random.randint(40, 90),
+            "received_at": start - timedelta(seconds=i),
+            "source": "esp32",
+        }
+        for i in range(count)
+    ]
+
+
+def fault_rows(count: int) -> List[dict]:
+    start = datetime.utcnow()
+    return [
+        {
+            "fault_id": f"F-{i}",
+            "device_id": f"dev-{i % 50}",
+            "device_name": "Fan",
+            "module": f"mod-{i % 20}",
+            "location": f"room-{i % 8}",
+            "issue": "Current spike",
+            "severity": random.choice(["Critical", "High", "Medium", "Low"]),
+            "confidence": random.random(),
+            "detected_at": start - timedelta(minutes=i),
+            "status": "active",
+            "recommendation": {"short": "Inspect wiring", "priority": "soon"},
+            "signals": [{"name": "current_a", "value": 7.5, "unit": "A", "direction": "up"}],
+            "source": "model:v1",
+        }
+        for i in range(count)
+    ]
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def run(rows: int, repeat: int) -> dict:
+    energy = energy_rows(rows)
+    faults = fault_rows(rows)
+    fault_list = TypeAdapter(List[Fault])
+
+    def stock_energy():
+        json.dumps(jsonable_encoder(energy), separators=(",", ":")).encode("utf-8")
+
+    def stock_faults():
+        validated = fault_list.validate_python(faults)
+        json.dumps(jsonable_encoder(validated), separators=(",", ":")).encode("utf-8")
+
+    results = {
+        "energy_stock_ms": _time(stock_energy, repeat),
+        "energy_fast_ms": _time(lambda: FastJSONResponse(energy), repeat),
+        "faults_stock_ms": _time(stock_faults, repeat),
+        "faults_fast_ms": _time(lambda: FastJSONResponse(faults), repeat),
+    }
+    return {k: round(v, 2) for k, v in results.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time JSON rendering of large list responses")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for name, value in run(args.rows, args.repeat).items():
+        print(f"{name:>18}: {value:9.2f}")
@@ -0,0 +1,244 @@
+"""
+Synthetic fleet for benchmarks.
+
+Generates documents shaped like the ones the ESP32 modules and the backend
+store: occupancy/environment telemetry and ACS712 current readings at fixed
+per-module intervals, plus devices, faults, anomalies and daily predictions.
+Occupancy follows a weekday working-hours pattern and current draw follows
+occupancy, so aggregations see realistic distributions rather than uniform
+noise. Every random stream is derived from ``spec.seed``, so the same spec
+(and end time) always produces the same data.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+SEVERITIES = ["Critical", "High", "Medium", "Low"]
+SEVERITY_WEIGHTS = [0.1, 0.2, 0.35, 0.35]
+FAULT_STATUSES = ["active", "acknowledged", "resolved"]
+FAULT_STATUS_WEIGHTS = [0.3, 0.2, 0.5]
+FAULT_ISSUES = [
+    ("Current spike", "current_a", "A", "up"),
+    ("Sustained overload", "rms_a", "A", "up"),
+    ("Standby drain", "current_a", "A", "flat"),
+    ("Overheating", "temperature", "C", "up"),
+    ("Signal loss", "wifi_rssi", "dBm", "down"),
+]
+# device type -> rated power (W), amps drawn while in use
+DEVICE_TYPES = {
+    "HVAC": (2000, 8.5),
+    "Lighting": (300, 1.3),
+    "Projector": (350, 1.5),
+    "Computer": (250, 1.1),
+    "Refrigerator": (150, 0.7),
+}
+
+
+class FleetSpec:
+    def __init__(
+        self,
+        locations: int = 8,
+        modules: int = 24,
+        days: float = 3,
+        occupancy_interval_seconds: int = 60,
+        current_interval_seconds: int = 30,
+        devices_per_module: int = 2,
+        faults: int = 500,
+        anomalies: int = 200,
+        seed: int = 42,
+        end: Optional[datetime] = None,
+    ):
+        if locations < 1 or modules < locations:
+            raise ValueError("Need at least one location and one module per location")
+        self.locations = locations
+        self.modules = modules
+        self.days = days
+        self.occupancy_interval_seconds = occupancy_interval_seconds
+        self.current_interval_seconds = current_interval_seconds
+        self.devices_per_module = devices_per_module
+        self.faults = faults
+        self.anomalies = anomalies
+        self.seed = seed
+        # Whole minutes, so the per-minute occupancy timeline lines up with the clock
+        self.end = end or datetime.utcnow().replace(second=0, microsecond=0)
+        self.start = self.end - timedelta(days=days)
+
+    def as_dict(self) -> dict:
+        return {
+            "locations": self.locations,
+            "modules": self.modules,
+            "days": self.days,
+            "occupancy_interval_seconds": self.occupancy_interval_seconds,
+            "current_interval_seconds": self.current_interval_seconds,
+            "devices_per_module": self.devices_per_module,
+            "faults": self.faults,
+            "anomalies": self.anomalies,
+            "seed": self.seed,
+        }
+
+    def expected_counts(self) -> Dict[str, int]:
+        seconds = int(self.days * 86400)
+        return {
+            "occupancy_telemetry": self.modules * (seconds // self.occupancy_interval_seconds),
+            "energy_readings": self.modules * (seconds // self.current_interval_seconds),
+            "devices": self.modules * self.devices_per_module,
+        }
+
+
+class Fleet:
+    """Module/location/device layout of a spec plus generators for its documents."""
+
+    def __init__(self, spec: FleetSpec):
+        self.spec = spec
+        self.location_names = [f"Room-{i + 1:02d}" for i in range(spec.locations)]
+        self.module_names = [f"MOD-{i + 1:03d}" for i in range(spec.modules)]
+        # Round-robin so every location gets modules
+        self.module_location = {m: self.location_names[i % spec.locations] for i, m in enumerate(self.module_names)}
+        rng = random.Random(spec.seed)
+        type_names = list(DEVICE_TYPES)
+        self.devices: List[dict] = []
+        for module in self.module_names:
+            for n in range(spec.devices_per_module):
+                device_type = rng.choice(type_names)
+                # Only the first device on a module is wired to its current sensor
+                self.devices.append({
+                    "device_id": f"DEV-{len(self.devices) + 1:04d}",
+                    "device_name": f"{device_type} {module[-3:]}-{n + 1}",
+                    "device_type": device_type,
+                    "location": self.module_location[module],
+                    "rated_power_watts": DEVICE_TYPES[device_type][0],
+                    "module_id": module if n == 0 else None,
+                    "installed_date": (spec.start - timedelta(days=rng.randint(30, 900))).strftime("%Y-%m-%d"),
+                })
+        self._module_load = {
+            d["module_id"]: DEVICE_TYPES[d["device_type"]][1] for d in self.devices if d["module_id"]
+        }
+
+    @staticmethod
+    def _occupied_probability(at: datetime) -> float:
+        if at.weekday() < 5 and 8 <= at.hour < 18:
+            return 0.75
+        if at.weekday() < 5 and 7 <= at.hour < 20:
+            return 0.3
+        return 0.05
+
+    def _occupancy_timeline(self, module_index: int) -> List[bool]:
+        """Occupied flag per minute; sessions are sticky rather than flipping every sample."""
+        rng = random.Random(self.spec.seed * 1000 + module_index)
+        minutes = int(self.spec.days * 1440) + 1
+        timeline = []
+        occupied = False
+        for minute in range(minutes):
+            # Re-decide rarely, towards the hour's typical occupancy
+            if rng.random() < 0.05:
+                occupied = rng.random() < self._occupied_probability(self.spec.start + timedelta(minutes=minute))
+            timeline.append(occupied)
+        return timeline
+
+    def _module_samples(self, module_index: int, interval_seconds: int, salt: int) -> Iterator[tuple]:
+        """(rng, timestamp, occupied) for each reading of one module."""
+        timeline = self._occupancy_timeline(module_index)
+        rng = random.Random((self.spec.seed * 1000 + module_index) * 10 + salt)
+        offset = rng.randrange(interval_seconds)
+        total = int(self.spec.days * 86400)
+        for second in range(offset, total, interval_seconds):
+            yield rng, self.spec.start + timedelta(seconds=second), timeline[second // 60]
+
+    def occupancy_readings(self) -> Iterator[dict]:
+        for index, module in enumerate(self.module_names):
+            location = self.module_location[module]
+            mac = f"24:6F:28:{index // 65536:02X}:{index // 256 % 256:02X}:{index % 256:02X}"
+            for rng, at, occupied in self._module_samples(index, self.spec.occupancy_interval_seconds, 1):
+                elapsed = int((at - self.spec.start).total_seconds())
+                yield {
+                    "module": module,
+                    "location": location,
+                    "rcwl": int(occupied and rng.random() < 0.9),
+                    "pir": int(occupied and rng.random() < 0.7),
+                    "rssi": -rng.randint(45, 85),
+                    "uptime": elapsed,
+                    "heap": rng.randint(180000, 220000),
+                    "ip": f"192.168.1.{10 + index % 240}",
+                    "mac": mac,
+                    "temperature": round(22 + (2.5 if occupied else 0) + rng.gauss(0, 0.6), 2),
+                    "humidity": round(55 + rng.gauss(0, 4), 2),
+                    "received_at": at,
+                    "source": "esp32",
+                }
+
+    def current_readings(self) -> Iterator[dict]:
+        for index, module in enumerate(self.module_names):
+            location = self.module_location[module]
+            load_a = self._module_load.get(module, 1.0)
+            for rng, at, occupied in self._module_samples(index, self.spec.current_interval_seconds, 2):
+                amps = max(rng.gauss(load_a if occupied else 0.15, load_a * 0.08 if occupied else 0.03), 0.0)
+                yield {
+                    "module": module,
+                    "location": location,
+                    "sensor": "ACS712-20A",
+                    "current_ma": round(amps * 1000, 1),
+                    "current_a": round(amps, 3),
+                    "rms_a": round(amps * 1.02, 3),
+                    "adc_samples": 1000,
+                    "vref": 3.3,
+                    "wifi_rssi": -rng.randint(45, 85),
+                    "received_at": at,
+                    "source": "esp32",
+                    "type": "current",
+                }
+
+    def _random_time(self, rng: random.Random) -> datetime:
+        return self.spec.start + timedelta(seconds=rng.uniform(0, self.spec.days * 86400))
+
+    def faults(self) -> List[dict]:
+        rng = random.Random(self.spec.seed + 1)
+        faults = []
+        for i in range(self.spec.faults):
+            device = rng.choice(self.devices)
+            issue, signal, unit, direction = rng.choice(FAULT_ISSUES)
+            faults.append({
+                "fault_id": f"F-{i + 1:06d}",
+                "device_id": device["device_id"],
+                "device_name": device["device_name"],
+                "module": device["module_id"],
+                "location": device["location"],
+                "issue": issue,
+                "severity": rng.choices(SEVERITIES, SEVERITY_WEIGHTS)[0],
+                "confidence": round(rng.uniform(0.55, 0.99), 3),
+                "detected_at": self._random_time(rng),
+                "status": rng.choices(FAULT_STATUSES, FAULT_STATUS_WEIGHTS)[0],
+                "recommendation": {"short": f"Inspect {device['device_type'].lower()}", "priority": "soon"},
+                "signals": [{"name": signal, "value": round(rng.uniform(0, 10), 2), "unit": unit, "direction": direction}],
+                "source": "model:v1",
+            })
+        return faults
+
+    def anomalies(self) -> List[dict]:
+        rng = random.Random(self.spec.seed + 2)
+        return [
+            {
+                "device_id": rng.choice(self.devices)["device_id"],
+                "anomaly_type": rng.choice(["spike", "drift", "dropout"]),
+                "severity": rng.choice(["High", "Medium", "Low"]),
+                "description": "Synthetic anomaly",
+                "detected_at": self._random_time(rng),
+            }
+            for _ in range(self.spec.anomalies)
+        ]
+
+    def predictions(self) -> List[dict]:
+        rng = random.Random(self.spec.seed + 3)
+        predictions = []
+        day = self.spec.start.replace(hour=0, minute=0)
+        while day < self.spec.end:
+            for device in self.devices:
+                daily_kwh = device["rated_power_watts"] * rng.uniform(2, 9) / 1000
+                predictions.append({
+                    "device_id": device["device_id"],
+                    "predicted_energy_kwh": round(daily_kwh, 3),
+                    "confidence_score": round(rng.uniform(0.6, 0.95), 3),
+                    "prediction_type": "daily",
+                    "created_at": day,
+                })
+            day += timedelta(days=1)
+        return predictions
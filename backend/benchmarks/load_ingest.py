@@ -0,0 +1,289 @@
+"""
+Ingestion load generator.
+
+Simulates a fleet of ESP8266/ESP32 modules posting occupancy telemetry to
+``/api/v1/telemetry`` and ACS712 current readings to ``/api/v1/current``.
+Every module runs as its own task on a jittered schedule. It tracks a
+sticky occupancy state for PIR/RCWL motion and draws current like its
+appliance: compressor duty cycles, inrush spikes when a load switches on,
+standby draw and sensor noise. With ``--batch N`` a module buffers N
+readings per endpoint and posts them as one array, like the batching
+firmware.
+
+    python -m benchmarks.load_ingest --url http://localhost:8000 --modules 2000 --duration 60
+    python -m benchmarks.load_ingest --in-process --modules 500 --batch 10 --output load.json
+
+``--in-process`` serves the app over ASGI in this process against the
+``volt_guard_bench`` database on MONGO_URI (point it at a local mongod), so
+no uvicorn is needed. The report has achieved readings/second against the
+target, latency percentiles per endpoint, and error counts. It also has
+schedule lag: how late requests went out because the server or the client
+fell behind. Latency is measured from the scheduled send time as well as
+from the actual one, so a stalled server is not hidden by requests that
+were never sent.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.bench_api import BENCH_API_KEY, BENCH_DB_NAME, percentile, summarize
+from benchmarks.fleet import DEVICE_TYPES
+
+TELEMETRY_PATH = "/api/v1/telemetry"
+CURRENT_PATH = "/api/v1/current"
+
+
+class SimulatedModule:
+    """One sensor module: occupancy state, the appliance on its current sensor and radio conditions."""
+
+    def __init__(self, index: int, locations: int, rng: random.Random):
+        self.rng = rng
+        self.module = f"LOAD-{index + 1:05d}"
+        self.location = f"Load-Room-{index % locations + 1:03d}"
+        self.mac = f"24:6F:28:{index // 65536:02X}:{index // 256 % 256:02X}:{index % 256:02X}"
+        self.ip = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+        self.device_type = rng.choice(list(DEVICE_TYPES))
+        self.load_a = DEVICE_TYPES[self.device_type][1]
+        self.booted = time.monotonic() - rng.uniform(0, 86400)
+        self.occupied = rng.random() < 0.4
+        self.load_on = self.occupied
+        self.switched_at = time.monotonic()
+        self.cycle_phase = rng.uniform(0, 600)
+        self.rssi = rng.uniform(-80, -50)
+        self.temperature = rng.uniform(21, 25)
+
+    def _step(self):
+        now = time.monotonic()
+        if self.rng.random() < 0.02:
+            self.occupied = not self.occupied
+        # Compressors cycle regardless of occupancy; other loads follow the room
+        if self.device_type in ("Refrigerator", "HVAC"):
+            wanted = math.sin((now + self.cycle_phase) / 300 * math.pi) > -0.2
+        else:
+            wanted = self.occupied
+        if wanted != self.load_on:
+            self.load_on = wanted
+            self.switched_at = now
+        self.rssi = min(max(self.rssi + self.rng.gauss(0, 1.5), -95), -35)
+        self.temperature += self.rng.gauss(0.02 if self.occupied else -0.02, 0.05)
+
+    def current_reading(self) -> dict:
+        self._step()
+        if self.load_on:
+            amps = self.load_a * (1 + self.rng.gauss(0, 0.05))
+            if time.monotonic() - self.switched_at < 2:
+                # Motor/PSU inrush just after switching on
+                amps *= self.rng.uniform(3, 6)
+        else:
+            amps = 0.12 + self.rng.gauss(0, 0.02)
+        amps = max(amps, 0.0)
+        return {
+            "module": self.module,
+            "location": self.location,
+            "sensor": "ACS712-20A",
+            "current_ma": round(amps * 1000, 1),
+            "current_a": round(amps, 3),
+            "rms_a": round(amps * self.rng.uniform(1.0, 1.05), 3),
+            "adc_samples": 1000,
+            "vref": 3.3,
+            "wifi_rssi": int(self.rssi),
+            "received_at": datetime.utcnow().isoformat(),
+            "source": "loadgen",
+            "type": "current",
+        }
+
+    def telemetry_reading(self) -> dict:
+        self._step()
+        return {
+            "module": self.module,
+            "location": self.location,
+            "rcwl": int(self.occupied and self.rng.random() < 0.9),
+            "pir": int(self.occupied and self.rng.random() < 0.7),
+            "rssi": int(self.rssi),
+            "uptime": int(time.monotonic() - self.booted),
+            "heap": self.rng.randint(180000, 220000),
+            "ip": self.ip,
+            "mac": self.mac,
+            "temperature": round(self.temperature, 2),
+            "humidity": round(55 + self.rng.gauss(0, 3), 2),
+            "received_at": datetime.utcnow().isoformat(),
+            "source": "loadgen",
+        }
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.scheduled_latencies: List[float] = []
+        self.lags: List[float] = []
+        self.statuses: Dict[int, int] = {}
+        self.exceptions: Dict[str, int] = {}
+        self.readings = 0
+
+    def report(self, wall_seconds: float) -> dict:
+        stats = summarize(self.latencies, wall_seconds, self.statuses, 0)
+        stats.pop("mean_bytes")
+        stats["p99_from_schedule_ms"] = round(percentile(sorted(self.scheduled_latencies), 99), 3)
+        stats["mean_lag_ms"] = round(sum(self.lags) / len(self.lags), 3) if self.lags else 0.0
+        stats["max_lag_ms"] = round(max(self.lags), 3) if self.lags else 0.0
+        stats["exceptions"] = self.exceptions
+        stats["errors"] += sum(self.exceptions.values())
+        stats["readings"] = self.readings
+        stats["readings_per_second"] = round(self.readings / wall_seconds, 1) if wall_seconds else 0.0
+        return stats
+
+
+class LoadGenerator:
+    def __init__(self, client, api_key: str, args):
+        self.client = client
+        self.headers = {"X-API-Key": api_key}
+        self.args = args
+        self.stats = {TELEMETRY_PATH: EndpointStats(), CURRENT_PATH: EndpointStats()}
+        self.semaphore = asyncio.Semaphore(args.max_in_flight)
+        self.deadline = 0.0
+
+    async def _post(self, path: str, readings: List[dict], scheduled: float):
+        stats = self.stats[path]
+        async with self.semaphore:
+            sent = time.perf_counter()
+            stats.lags.append(max(sent - scheduled, 0.0) * 1000)
+            body = readings if len(readings) > 1 else readings[0]
+            try:
+                response = await self.client.post(path, json=body, headers=self.headers)
+            except httpx.HTTPError as exc:
+                name = type(exc).__name__
+                stats.exceptions[name] = stats.exceptions.get(name, 0) + 1
+                return
+        done = time.perf_counter()
+        stats.latencies.append((done - sent) * 1000)
+        stats.scheduled_latencies.append((done - scheduled) * 1000)
+        stats.statuses[response.status_code] = stats.statuses.get(response.status_code, 0) + 1
+        if response.status_code < 400:
+            stats.readings += len(readings)
+
+    async def _run_module(self, module: SimulatedModule, start_delay: float):
+        args = self.args
+        rng = module.rng
+        start = time.perf_counter() + start_delay
+        # Independent schedules per endpoint, randomly phased so modules do not fire in lockstep
+        due = {
+            TELEMETRY_PATH: start + rng.uniform(0, args.telemetry_interval),
+            CURRENT_PATH: start + rng.uniform(0, args.current_interval),
+        }
+        interval = {TELEMETRY_PATH: args.telemetry_interval, CURRENT_PATH: args.current_interval}
+        make = {TELEMETRY_PATH: module.telemetry_reading, CURRENT_PATH: module.current_reading}
+        buffers = {TELEMETRY_PATH: [], CURRENT_PATH: []}
+        while True:
+            path = min(due, key=due.get)
+            scheduled = due[path]
+            if scheduled >= self.deadline:
+                return
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            buffers[path].append(make[path]())
+            if len(buffers[path]) >= args.batch:
+                readings, buffers[path] = buffers[path], []
+                await self._post(path, readings, scheduled)
+            jitter = rng.uniform(-args.jitter, args.jitter) * interval[path]
+            due[path] = scheduled + interval[path] + jitter
+
+    async def run(self) -> dict:
+        args = self.args
+        rng = random.Random(args.seed)
+        modules = [SimulatedModule(i, args.locations, random.Random(rng.random())) for i in range(args.modules)]
+        started = time.perf_counter()
+        self.deadline = started + args.ramp + args.duration
+        await asyncio.gather(*[
+            self._run_module(module, args.ramp * i / max(len(modules), 1)) for i, module in enumerate(modules)
+        ])
+        wall = time.perf_counter() - started
+        target = args.modules * (1 / args.telemetry_interval + 1 / args.current_interval)
+        achieved = sum(s.readings for s in self.stats.values()) / wall if wall else 0.0
+        return {
+            "target_readings_per_second": round(target, 1),
+            "achieved_readings_per_second": round(achieved, 1),
+            "wall_seconds": round(wall, 2),
+            "endpoints": {path: stats.report(wall) for path, stats in self.stats.items()},
+        }
+
+
+async def _run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    meta = {
+        "started_at": datetime.utcnow().isoformat(),
+        "url": "in-process" if args.in_process else args.url,
+        "modules": args.modules,
+        "telemetry_interval": args.telemetry_interval,
+        "current_interval": args.current_interval,
+        "batch": args.batch,
+        "duration": args.duration,
+        "max_in_flight": args.max_in_flight,
+    }
+    if not args.in_process:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+            result = await LoadGenerator(client, args.api_key, args).run()
+        return {"meta": meta, **result}
+
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadgen", timeout=args.timeout) as client:
+            result = await LoadGenerator(client, os.environ["API_KEY"], args).run()
+    return {"meta": meta, **result}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Simulate a fleet of sensor modules posting to the ingestion API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", BENCH_API_KEY))
+    parser.add_argument("--in-process", action="store_true", help=f"Serve the app in process against {BENCH_DB_NAME}")
+    parser.add_argument("--modules", type=int, default=1000)
+    parser.add_argument("--locations", type=int, default=50)
+    parser.add_argument("--telemetry-interval", type=float, default=10.0, help="Seconds between occupancy readings per module")
+    parser.add_argument("--current-interval", type=float, default=5.0, help="Seconds between current readings per module")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Interval jitter as a fraction (0.1 = +/-10%%)")
+    parser.add_argument("--batch", type=int, default=1, help="Readings buffered per POST")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds at full load")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which modules come online")
+    parser.add_argument("--max-in-flight", type=int, default=200, help="Concurrent requests (connection pool size)")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+    if args.batch < 1:
+        parser.error("--batch must be at least 1")
+
+    if args.in_process:
+        os.environ["MONGODB_DB_NAME"] = os.getenv("BENCH_DB_NAME", BENCH_DB_NAME)
+        os.environ["API_KEY"] = args.api_key
+        os.environ["SLOW_QUERY_ENABLED"] = "false"
+
+    results = asyncio.run(_run(args))
+    for path, stats in results["endpoints"].items():
+        print(f"{path:>18}: {stats['readings_per_second']:9.1f} readings/s  p50 {stats['p50_ms']:8.2f} ms  "
+              f"p99 {stats['p99_ms']:8.2f} ms  errors {stats['errors']}", file=sys.stderr)
+    print(f"{'total':>18}: {results['achieved_readings_per_second']:9.1f} of "
+          f"{results['target_readings_per_second']:.1f} readings/s", file=sys.stderr)
+
+    rendered = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(rendered + "\n")
+    else:
+        print(rendered)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,12 @@
 from pathlib import Path
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, AsyncMongoClient, MongoClient
 from pymongo.server_api import ServerApi
+from starlette.concurrency import run_in_threadpool
 import os
 from dotenv import load_dotenv
+from utils.command_metrics import command_metrics
+from utils.pool_metrics import pool_metrics
+from utils.slow_queries import slow_query_recorder
 
 # Get the directory where this file (database.py) is located
 BASE_DIR = Path(__file__).resolve().parent
@@ -10,24 +14,200 @@ BASE_DIR = Path(__file__).resolve().parent
 # Load .env file from the backend directory
 load_dotenv(dotenv_path=BASE_DIR / '.env')
 
-# Configure MongoDB client with proper timeout and DNS settings
-client = MongoClient(
-    os.getenv("MONGO_URI"),
-    server_api=ServerApi('1'),
-    serverSelectionTimeoutMS=5000,  # 5 second timeout
-    connectTimeoutMS=10000,  # 10 second connection timeout
-    socketTimeoutMS=10000,   # 10 second socket timeout
-    retryWrites=True,
-    retryReads=True,
-    maxPoolSize=10,
-    minPoolSize=1
-)
-db = client[os.getenv("MONGODB_DB_NAME")]
-
-devices_col = db["devices"]
-energy_col = db["energy_readings"]
-prediction_col = db["predictions"]
-anomalies_col = db["anomalies"]
-user_col = db["users"]
-analytics_col = db["occupancy_telemetry"]
-faults_col = db["faults"]
+# "async" uses the native asyncio driver; "sync" runs the blocking pymongo
+# client in FastAPI's threadpool (the old behaviour, kept for comparison)
+MONGO_DRIVER = os.getenv("MONGO_DRIVER", "async").lower()
+# The threaded facade has no async change streams; callers poll instead
+supports_change_streams = MONGO_DRIVER != "sync"
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "1"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+_client = None
+_db = None
+
+
+def _client_options() -> dict:
+    # Configure MongoDB client with proper timeout and DNS settings
+    return dict(
+        server_api=ServerApi('1'),
+        serverSelectionTimeoutMS=5000,  # 5 second timeout
+        connectTimeoutMS=10000,  # 10 second connection timeout
+        socketTimeoutMS=10000,   # 10 second socket timeout
+        retryWrites=True,
+        retryReads=True,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[pool_metrics, command_metrics, slow_query_recorder],
+    )
+
+
+class _ThreadedCursor:
+    """Async facade over a blocking pymongo cursor; each fetch runs in the threadpool."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._buffer = []
+
+    def __getattr__(self, name):
+        # sort/limit/skip/batch_size/... configure the lazy cursor and chain
+        attr = getattr(self._cursor, name)
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self if result is self._cursor else result
+
+        return chained
+
+    async def to_list(self, length=None):
+        def fetch():
+            if length is None:
+                return list(self._cursor)
+            return [doc for _, doc in zip(range(length), self._cursor)]
+
+        return await run_in_threadpool(fetch)
+
+    async def next(self):
+        if not self._buffer:
+            self._buffer = await self.to_list(100)
+            if not self._buffer:
+                raise StopAsyncIteration
+        return self._buffer.pop(0)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.next()
+
+    async def close(self):
+        await run_in_threadpool(self._cursor.close)
+
+
+class _ThreadedCollection:
+    """Mirror of the AsyncCollection API backed by a blocking pymongo collection."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    @property
+    def name(self):
+        return self._collection.name
+
+    def find(self, *args, **kwargs):
+        return _ThreadedCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, *args, **kwargs):
+        return _ThreadedCursor(await run_in_threadpool(self._collection.aggregate, *args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(method, *args, **kwargs)
+
+        return call
+
+
+class _ThreadedDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return _ThreadedCollection(self._database[name])
+
+    async def command(self, *args, **kwargs):
+        return await run_in_threadpool(self._database.command, *args, **kwargs)
+
+    async def create_collection(self, *args, **kwargs):
+        await run_in_threadpool(self._database.create_collection, *args, **kwargs)
+        return self[args[0] if args else kwargs["name"]]
+
+
+def connect():
+    """Create the Mongo client for the configured driver (normally from the app lifespan)."""
+    global _client, _db
+    if _db is None:
+        if MONGO_DRIVER == "sync":
+            _client = MongoClient(os.getenv("MONGO_URI"), **_client_options())
+            _db = _ThreadedDatabase(_client[os.getenv("MONGODB_DB_NAME")])
+        else:
+            _client = AsyncMongoClient(os.getenv("MONGO_URI"), **_client_options())
+            _db = _client[os.getenv("MONGODB_DB_NAME")]
+    return _db
+
+
+async def close():
+    global _client, _db
+    client, _client, _db = _client, None, None
+    if client is None:
+        return
+    if MONGO_DRIVER == "sync":
+        client.close()
+    else:
+        await client.close()
+
+
+def pool_stats() -> dict:
+    return {
+        "driver": MONGO_DRIVER,
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "min_pool_size": MONGO_MIN_POOL_SIZE,
+        "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        **pool_metrics.snapshot(),
+    }
+
+
+class _DatabaseProxy:
+    """Resolves to the live database so modules can import handles before connect()."""
+
+    def __getitem__(self, name):
+        return connect()[name]
+
+    def __getattr__(self, name):
+        return getattr(connect(), name)
+
+
+class _CollectionProxy:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(connect()[self.name], attr)
+
+
+db = _DatabaseProxy()
+
+devices_col = _CollectionProxy("devices")
+energy_col = _CollectionProxy("energy_readings")
+prediction_col = _CollectionProxy("predictions")
+anomalies_col = _CollectionProxy("anomalies")
+user_col = _CollectionProxy("users")
+analytics_col = _CollectionProxy("occupancy_telemetry")
+faults_col = _CollectionProxy("faults")
+catalog_col = _CollectionProxy("telemetry_catalog")
+counters_col = _CollectionProxy("counters")
+tombstones_col = _CollectionProxy("sync_tombstones")
+scan_state_col = _CollectionProxy("fault_scan_state")
+jobs_col = _CollectionProxy("jobs")
+baselines_col = _CollectionProxy("baseline_profiles")
+sketches_col = _CollectionProxy("quantile_sketches")
+heartbeats_col = _CollectionProxy("module_heartbeats")
+leases_col = _CollectionProxy("leases")
+
+
+async def ensure_indexes():
+    """Indexes backing the (timestamp, _id) keyset pagination of the list endpoints."""
+    page_key = [("received_at", DESCENDING), ("_id", DESCENDING)]
+    for col in (energy_col, analytics_col):
+        await col.create_index(page_key)
+        await col.create_index([("module", ASCENDING)] + page_key)
+        await col.create_index([("location", ASCENDING)] + page_key)
+    # Latest reading per device (device health, predictive warnings)
+    await energy_col.create_index([("device_id", ASCENDING), ("timestamp", DESCENDING)])
+    await faults_col.create_index([("detected_at", DESCENDING), ("_id", DESCENDING)])
+    await faults_col.create_index([("device_id", ASCENDING), ("detected_at", DESCENDING), ("_id", DESCENDING)])
+    await anomalies_col.create_index([("severity", ASCENDING), ("detected_at", DESCENDING), ("_id", DESCENDING)])
+    await prediction_col.create_index([("device_id", ASCENDING), ("prediction_type", ASCENDING), ("forecast_start", ASCENDING)])
+    await user_col.create_index([("created_at", ASCENDING), ("_id", ASCENDING)])
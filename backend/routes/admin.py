@@ -0,0 +1,54 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from database import db
+from utils.jwt_handler import require_admin
+from utils.profiling import SORT_KEYS, profile_store
+from utils.slow_queries import SLOW_QUERY_COLLECTION, slow_query_recorder
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)],
+)
+
+
+@router.get("/slow-queries")
+async def list_slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    collection: Optional[str] = None,
+    route: Optional[str] = Query(None, description="Route template, e.g. /zones/"),
+    command: Optional[str] = None,
+):
+    """Most recent slow MongoDB commands with their query shape and explain summary."""
+    query = {}
+    if collection:
+        query["collection"] = collection
+    if route:
+        query["route"] = route
+    if command:
+        query["command"] = command
+    # Natural order of a capped collection is insertion order
+    queries = await db[SLOW_QUERY_COLLECTION].find(query, {"_id": 0}).sort("$natural", -1).limit(limit).to_list()
+    return {"recorder": slow_query_recorder.stats(), "queries": queries}
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """Requests profiled with the X-Profile header, newest first (kept in memory per process)."""
+    return profile_store.list()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(
+    profile_id: str,
+    sort: str = Query("cumulative", pattern="^(%s)$" % "|".join(SORT_KEYS)),
+    limit: int = Query(60, ge=1, le=500),
+):
+    """cProfile report of one profiled request."""
+    entry = profile_store.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(entry.report(sort, limit))
@@ -1,9 +1,14 @@
 from typing import Optional, List
 from datetime import datetime, timezone, timedelta
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from app.services import catalog_service, sketch_service
 from database import analytics_col
 from utils.jwt_handler import get_current_user
+from utils.negotiation import negotiated_response
+from utils.pagination import fetch_page, set_next_cursor
 from app.models.analytics_model import (
+    PercentileGroup,
+    PercentilesResponse,
     Recommendation,
     RecommendationSeverity,
     RecommendationsResponse,
@@ -20,29 +25,19 @@ SRI_LANKA_TZ = timezone(timedelta(hours=5, minutes=30))
 
 
 @router.get("/filters")
-def get_available_filters():
+async def get_available_filters():
     """
-    Get available locations and modules from occupancy_telemetry table.
-    Returns distinct values for filtering.
+    Get available locations and modules that have reported occupancy telemetry.
+    Served from the ingest-time catalog instead of scanning the telemetry table.
     """
-    # Get distinct locations
-    locations = analytics_col.distinct("location")
-    locations = [loc for loc in locations if loc]  # Filter out None/empty values
-    locations.sort()
-    
-    # Get distinct modules
-    modules = analytics_col.distinct("module")
-    modules = [mod for mod in modules if mod]  # Filter out None/empty values
-    modules.sort()
-    
     return {
-        "locations": locations,
-        "modules": modules
+        "locations": await catalog_service.list_names(catalog_service.LOCATION, source="occupancy"),
+        "modules": await catalog_service.list_names(catalog_service.MODULE, source="occupancy"),
     }
 
 
 @router.get("/occupancy-stats")
-def get_occupancy_stats(limit: int = 50, module: Optional[str] = None, location: Optional[str] = None):
+async def get_occupancy_stats(limit: int = 50, module: Optional[str] = None, location: Optional[str] = None):
     """
     Get occupancy statistics from occupancy_telemetry table.
     Returns statistics about occupied vs vacant periods.
@@ -65,7 +60,7 @@ def get_occupancy_stats(limit: int = 50, module: Optional[str] = None, location:
         .limit(limit)
     )
 
-    docs = list(cursor)
+    docs = await cursor.to_list()
     if not docs:
         return {
             "total_readings": 0,
@@ -96,27 +91,24 @@ def get_occupancy_stats(limit: int = 50, module: Optional[str] = None, location:
 
 
 @router.get("/latest")
-def get_latest_readings(limit: int = 50, module: Optional[str] = None, location: Optional[str] = None):
+async def get_latest_readings(
+    request: Request,
+    limit: int = 50,
+    module: Optional[str] = None,
+    location: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+):
     query = {}
     if module:
         query["module"] = module
     if location:
         query["location"] = location
 
-    cursor = (
-        analytics_col
-        .find(query, {"_id": 0})
-        .sort([
-            ("received_at", -1),
-            ("receivedAt", -1),
-            ("timestamp", -1),
-            ("_id", -1),
-        ])
-        .limit(limit)
-    )   
-
+    docs, next_cursor = await fetch_page(
+        analytics_col, query, "received_at", limit, cursor, projection={"_id": 0}
+    )
     normalized = []
-    for doc in cursor:
+    for doc in docs:
         ts = doc.get("received_at") or doc.get("receivedAt") or doc.get("timestamp")
         if ts is not None:
             dt = _to_datetime(ts)
@@ -127,7 +119,9 @@ def get_latest_readings(limit: int = 50, module: Optional[str] = None, location:
                 doc["receivedAt"] = ts
         normalized.append(doc)
 
-    return normalized
+    response = negotiated_response(request, normalized)
+    set_next_cursor(response, next_cursor)
+    return response
 
 
 def _to_datetime(value):
@@ -259,7 +253,7 @@ def _derive_recommendations(docs: List[dict]) -> List[Recommendation]:
 
 
 @router.get("/recommendations", response_model=RecommendationsResponse)
-def get_recommendations(limit: int = 50, module: Optional[str] = None, location: Optional[str] = None):
+async def get_recommendations(limit: int = 50, module: Optional[str] = None, location: Optional[str] = None):
     query = {}
     if module:
         query["module"] = module
@@ -278,9 +272,60 @@ def get_recommendations(limit: int = 50, module: Optional[str] = None, location:
         .limit(limit)
     )
 
-    docs = list(cursor)
+    docs = await cursor.to_list()
     if not docs:
         return RecommendationsResponse(recommendations=[], count=0)
 
     recs = _derive_recommendations(docs)
     return RecommendationsResponse(recommendations=recs, count=len(recs))
+
+
+@router.get("/percentiles", response_model=PercentilesResponse)
+async def get_percentiles(
+    metric: str = Query("current", pattern="^(current|temperature|humidity)$"),
+    start: Optional[datetime] = Query(None, description="Default 7 days before end"),
+    end: Optional[datetime] = Query(None, description="Default now"),
+    location: Optional[List[str]] = Query(None),
+    module: Optional[List[str]] = Query(None),
+    q: List[float] = Query([0.5, 0.95, 0.99], description="Quantiles between 0 and 1"),
+    group_by: Optional[str] = Query(None, pattern="^(location|module)$"),
+):
+    """
+    Percentiles of current (A), temperature or humidity over whole UTC hours,
+    merged from the hourly quantile sketches rather than raw readings.
+    """
+    if any(not 0 <= value <= 1 for value in q):
+        raise HTTPException(status_code=422, detail="Quantiles must be between 0 and 1")
+    end = _naive_utc(end) if end else datetime.utcnow()
+    start = _naive_utc(start) if start else end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+
+    sketches = await sketch_service.merged(metric, start, end, location, module, group_by)
+    groups = []
+    for key in sorted(sketches, key=lambda k: (k is None, k or "")):
+        sketch = sketches[key]
+        groups.append(PercentileGroup(
+            location=key if group_by == "location" else None,
+            module=key if group_by == "module" else None,
+            count=sketch.count,
+            mean=round(sketch.sum / sketch.count, 4) if sketch.count else None,
+            min=sketch.min,
+            max=sketch.max,
+            percentiles={f"p{value * 100:g}": _round(sketch.quantile(value)) for value in q},
+        ))
+    return PercentilesResponse(
+        metric=metric,
+        start=start,
+        end=end,
+        relative_accuracy=sketch_service.SKETCH_RELATIVE_ACCURACY,
+        groups=groups,
+    )
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
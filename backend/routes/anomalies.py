@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Response
 from database import anomalies_col
 from app.models.anomaly_model import Anomaly
 from utils.jwt_handler import get_current_user
+from utils.pagination import fetch_page, set_next_cursor
 
 router = APIRouter(
     prefix="/anomalies",
@@ -10,10 +13,18 @@ router = APIRouter(
 )
 
 @router.post("/")
-def add_anomaly(anomaly: Anomaly):
-    anomalies_col.insert_one(anomaly.dict())
+async def add_anomaly(anomaly: Anomaly):
+    await anomalies_col.insert_one(anomaly.dict())
     return {"message": "Anomaly recorded"}
 
 @router.get("/active")
-def get_active_anomalies():
-    return list(anomalies_col.find({"severity": "High"}, {"_id": 0}))
+async def get_active_anomalies(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+):
+    data, next_cursor = await fetch_page(
+        anomalies_col, {"severity": "High"}, "detected_at", limit, cursor, projection={"_id": 0}
+    )
+    set_next_cursor(response, next_cursor)
+    return data
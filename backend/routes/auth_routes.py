@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException
-from database import db
+from database import user_col
 from app.models.user_model import loginReq
 from utils.security import verify_password
 from utils.jwt_handler import create_access_token
@@ -7,8 +7,8 @@ from utils.jwt_handler import create_access_token
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 @router.post("/login")
-def login(data: loginReq):
-    user = db.users.find_one({"email": data.email})
+async def login(data: loginReq):
+    user = await user_col.find_one({"email": data.email})
 
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -1,9 +1,13 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from database import devices_col, energy_col
 from app.models.device_model import Device
+from app.services import sync_service
+from app.services.catalog_service import module_exists
 from utils.jwt_handler import get_current_user
+from utils.negotiation import negotiated_response
+from utils.pagination import ASCENDING, fetch_page, set_next_cursor
 
 router = APIRouter(
     prefix="/devices",
@@ -12,32 +16,42 @@ router = APIRouter(
 )
 
 @router.post("/")
-def add_device(device: Device):
+async def add_device(device: Device):
     # Validate module_id exists in energy_readings if provided
     if device.module_id:
-        module_exists = energy_col.find_one({"module": device.module_id})
-        if module_exists:
+        if await module_exists(device.module_id):
             raise HTTPException(
                 status_code=400, 
                 detail=f"Module {device.module_id} is in use by another device."
             )
     
-    devices_col.insert_one(device.dict())
+    await devices_col.insert_one({**device.dict(), **await sync_service.version_fields()})
     return {"message": "Device added successfully"}
 
 
 @router.get("/")
-def get_devices(location: Optional[str] = Query(None, description="Filter devices by location")):
+async def get_devices(
+    response: Response,
+    location: Optional[str] = Query(None, description="Filter devices by location"),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+):
     query = {"location": location} if location else {}
-    return list(devices_col.find(query, {"_id": 0}))
+    # Devices carry no timestamp; _id order is registration order
+    devices, next_cursor = await fetch_page(
+        devices_col, query, None, limit, cursor, projection={"_id": 0}, direction=ASCENDING
+    )
+    set_next_cursor(response, next_cursor)
+    return devices
 
 @router.get("/{device_id}")
-def get_device(device_id: str):
-    return devices_col.find_one({"device_id": device_id}, {"_id": 0})
+async def get_device(device_id: str):
+    return await devices_col.find_one({"device_id": device_id}, {"_id": 0})
 
 @router.get("/{device_id}/energy-readings")
-def get_device_energy_readings(
-    device_id: str, 
+async def get_device_energy_readings(
+    request: Request,
+    device_id: str,
     limit: int = Query(1000, ge=1, le=10000),
     hours: Optional[int] = Query(None, ge=1, le=168)
 ):
@@ -45,7 +59,7 @@ def get_device_energy_readings(
     Get energy readings for a device through module_id relationship.
     Optionally filter by time range (hours parameter).
     """
-    device = devices_col.find_one({"device_id": device_id}, {"_id": 0})
+    device = await devices_col.find_one({"device_id": device_id}, {"_id": 0})
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
@@ -63,45 +77,44 @@ def get_device_energy_readings(
         query["received_at"] = {"$gte": start_time, "$lte": end_time}
     
     # Query energy_readings by module
-    readings = list(
-        energy_col.find(
-            query,
-            {"_id": 0}
-        ).sort("received_at", -1).limit(limit)
-    )
+    readings = await energy_col.find(
+        query,
+        {"_id": 0}
+    ).sort("received_at", -1).limit(limit).to_list()
     
-    return {
+    return negotiated_response(request, {
         "device_id": device_id,
         "module_id": module_id,
         "readings": readings,
         "count": len(readings)
-    }
+    })
 
 @router.put("/{device_id}/module")
-def update_device_module(device_id: str, module_id: str):
+async def update_device_module(device_id: str, module_id: str):
     """
     Update or assign module_id to a device
     """
-    device = devices_col.find_one({"device_id": device_id})
+    device = await devices_col.find_one({"device_id": device_id})
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
     # Validate module exists
-    module_exists = energy_col.find_one({"module": module_id})
-    if not module_exists:
+    if not await module_exists(module_id):
         raise HTTPException(  # pyright: ignore[reportUndefinedVariable]
             status_code=400,
             detail=f"Module {module_id} not found in energy_readings"
         )
     
-    devices_col.update_one(
+    await devices_col.update_one(
         {"device_id": device_id},
-        {"$set": {"module_id": module_id}}
+        {"$set": {"module_id": module_id, **await sync_service.version_fields()}}
     )
     
     return {"message": f"Module {module_id} assigned to device {device_id}"}
 
 @router.delete("/{device_id}")
-def delete_device(device_id: str):
-    devices_col.delete_one({"device_id": device_id})
+async def delete_device(device_id: str):
+    result = await devices_col.delete_one({"device_id": device_id})
+    if result.deleted_count:
+        await sync_service.record_delete("devices", device_id)
     return {"message": "Device removed"}
@@ -0,0 +1,205 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.services import snapshot_service
+from database import analytics_col, energy_col, faults_col
+from utils.jwt_handler import get_current_user
+
+router = APIRouter(
+    prefix="/export",
+    tags=["Export"],
+    dependencies=[Depends(get_current_user)],
+)
+
+EXPORT_BATCH_SIZE = 1000
+
+# dataset -> (collection, time field, default CSV columns)
+DATASETS: Dict[str, tuple] = {
+    "energy_readings": (
+        energy_col,
+        "received_at",
+        ["received_at", "module", "location", "sensor", "current_ma", "current_a", "rms_a", "voltage", "wifi_rssi", "source"],
+    ),
+    "occupancy_telemetry": (
+        analytics_col,
+        "received_at",
+        ["received_at", "module", "location", "rcwl", "pir", "temperature", "humidity", "rssi", "uptime", "heap", "source"],
+    ),
+    "faults": (
+        faults_col,
+        "detected_at",
+        ["detected_at", "fault_id", "device_id", "device_name", "module", "location", "issue", "severity", "confidence", "status", "source"],
+    ),
+}
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def _json_default(value):
+    plain = _plain(value)
+    if plain is value:
+        return str(value)
+    return plain
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default, separators=(",", ":"))
+    return _plain(value)
+
+
+async def _encode_rows(cursor, fmt: str, fields: List[str]) -> AsyncIterator[bytes]:
+    """Serialise the cursor one batch at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(fields)
+
+    rows = 0
+    async for doc in cursor:
+        if writer:
+            writer.writerow([_csv_cell(doc.get(f)) for f in fields])
+        else:
+            buffer.write(json.dumps(doc, default=_json_default, separators=(",", ":")))
+            buffer.write("\n")
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _snapshot_dataset(dataset: str) -> str:
+    if dataset not in snapshot_service.DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset '{dataset}'")
+    return dataset
+
+
+@router.post("/snapshots", status_code=202)
+async def build_snapshots(
+    background_tasks: BackgroundTasks,
+    start: date,
+    end: date,
+    dataset: Optional[List[str]] = Query(None),
+    overwrite: bool = False,
+):
+    """Write per-day Parquet snapshots for [start, end] in the background."""
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    for name in dataset or []:
+        _snapshot_dataset(name)
+    background_tasks.add_task(snapshot_service.build, start, end, dataset, overwrite)
+    return {"message": "Snapshot build started", "start": start, "end": end, "datasets": dataset or list(snapshot_service.DATASETS)}
+
+
+@router.get("/snapshots/{dataset}")
+async def list_snapshots(dataset: str):
+    """Days that have a Parquet snapshot for the dataset."""
+    return {"dataset": _snapshot_dataset(dataset), "days": snapshot_service.list_snapshots(dataset)}
+
+
+@router.get("/snapshots/{dataset}/summary")
+async def summarize_snapshots(dataset: str, start: date, end: date):
+    """Load [start, end] from the snapshots into a DataFrame and return per-location means."""
+    _snapshot_dataset(dataset)
+
+    def load():
+        return snapshot_service.summarize(snapshot_service.load_range(dataset, start, end))
+
+    return {"dataset": dataset, **await run_in_threadpool(load)}
+
+
+@router.get("/{dataset}")
+async def export_dataset(
+    dataset: str,
+    start: Optional[datetime] = Query(None, description="Inclusive start (defaults to 24h before end)"),
+    end: Optional[datetime] = Query(None, description="Exclusive end (defaults to now)"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to include"),
+    gzip: bool = Query(False, description="Compress the stream as a .gz file"),
+    module: Optional[str] = None,
+    location: Optional[str] = None,
+):
+    """
+    Stream a time range of raw rows as NDJSON or CSV, oldest first.
+    Rows are read and written batch by batch, so exports of any length run in constant memory.
+    """
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset '{dataset}'")
+    collection, time_field, default_fields = DATASETS[dataset]
+
+    # Stored times are naive UTC; compare against the same
+    end = _naive_utc(end) if end else datetime.utcnow()
+    start = _naive_utc(start) if start else end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    if format == "csv" and not selected:
+        selected = default_fields
+
+    query = {time_field: {"$gte": start, "$lt": end}}
+    if module:
+        query["module"] = module
+    if location:
+        query["location"] = location
+
+    projection = {"_id": 0}
+    if selected:
+        projection = {f: 1 for f in selected}
+        projection["_id"] = 0
+
+    cursor = (
+        collection
+        .find(query, projection)
+        .sort([(time_field, 1), ("_id", 1)])
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+
+    body = _encode_rows(cursor, format, selected or [])
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"{dataset}_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.{format}"
+    if gzip:
+        body = _gzip(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from database import (
@@ -11,7 +11,10 @@ from database import (
     anomalies_col,
 )
 from app.models.fault_model import Fault, FaultSummary
+from app.services import fault_scan_service, sync_service
+from utils.json_response import FastJSONResponse
 from utils.jwt_handler import get_current_user
+from utils.pagination import fetch_page, set_next_cursor
 
 router = APIRouter(
     prefix="/faults",
@@ -26,14 +29,25 @@ def _severity_sort_key(fault: dict) -> int:
     return -SEVERITY_ORDER.get(fault.get("severity", "Low"), 0)
 
 
-def _default_summary() -> FaultSummary:
-    return FaultSummary(
-        total=0, critical=0, high=0, medium=0, low=0, last_scan_at=None, next_scan_eta_seconds=None
-    )
+async def _latest_by(collection, key: str, values: List[str], time_field: str) -> Dict[str, dict]:
+    """
+    Newest document per ``key`` value, in one aggregation instead of a find_one
+    per value. Needs a (key, time_field desc) index: sorting on both lets the
+    $group/$first read one index entry per value (a DISTINCT_SCAN) instead of
+    every matching document.
+    """
+    if not values:
+        return {}
+    pipeline = [
+        {"$match": {key: {"$in": list(set(values))}}},
+        {"$sort": {key: 1, time_field: -1}},
+        {"$group": {"_id": f"${key}", "doc": {"$first": "$$ROOT"}}},
+    ]
+    return {row["_id"]: row["doc"] async for row in await collection.aggregate(pipeline)}
 
 
 @router.get("/active", response_model=List[Fault])
-def get_active_faults(
+async def get_active_faults(
     severity: Optional[str] = Query(None, pattern="^(Critical|High|Medium|Low)$"),
     limit: int = Query(20, ge=1, le=100),
 ):
@@ -41,36 +55,41 @@ def get_active_faults(
         query = {"status": "active"}
         if severity:
             query["severity"] = severity
-        data = list(faults_col.find(query, {"_id": 0}).sort([("severity", -1), ("detected_at", -1)]).limit(limit))
-        return data
+        data = await faults_col.find(query, {"_id": 0}).sort([("severity", -1), ("detected_at", -1)]).limit(limit).to_list()
+        return FastJSONResponse(data)
     except Exception as e:
         return []
 
 
-@router.get("/history", response_model=List[Fault])
-def get_fault_history(
+@router.get("/history", response_class=FastJSONResponse, responses={200: {"model": List[Fault]}})
+async def get_fault_history(
     device_id: Optional[str] = None,
     limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
 ):
     query = {}
     if device_id:
         query["device_id"] = device_id
-    data = list(faults_col.find(query, {"_id": 0}).sort("detected_at", -1).limit(limit))
-    return data
+    data, next_cursor = await fetch_page(faults_col, query, "detected_at", limit, cursor, projection={"_id": 0})
+    response = FastJSONResponse(data)
+    set_next_cursor(response, next_cursor)
+    return response
 
 
 @router.get("/device-health")
-def get_device_health(limit: int = Query(20, ge=1, le=100)):
+async def get_device_health(limit: int = Query(20, ge=1, le=100)):
     """
     Derives device health from recent energy + occupancy telemetry.
     """
     try:
-        devices = list(devices_col.find({}, {"_id": 0}).limit(limit))
+        devices = await devices_col.find({}, {"_id": 0}).limit(limit).to_list()
+        latest_energy = await _latest_by(energy_col, "device_id", [d["device_id"] for d in devices], "timestamp")
+        latest_occupancy = await _latest_by(analytics_col, "module", [d.get("module", "") for d in devices], "received_at")
         health = []
         now = datetime.utcnow()
         for d in devices:
-            recent_energy = energy_col.find_one({"device_id": d["device_id"]}, sort=[("timestamp", -1)])
-            recent_occupancy = analytics_col.find_one({"module": d.get("module", "")}, sort=[("received_at", -1)])
+            recent_energy = latest_energy.get(d["device_id"])
+            recent_occupancy = latest_occupancy.get(d.get("module", ""))
             score = 90
             notes = []
             if recent_energy and recent_energy.get("temperature", 0) > 32:
@@ -96,7 +115,7 @@ def get_device_health(limit: int = Query(20, ge=1, le=100)):
 
 
 @router.get("/model-stats")
-def get_model_stats():
+async def get_model_stats():
     return {
         "model_accuracy": 0.942,
         "detection_rate": 0.978,
@@ -107,25 +126,51 @@ def get_model_stats():
     }
 
 
+@router.get("/summary", response_model=FaultSummary)
+async def get_fault_summary():
+    """Open faults by severity, plus when the scanner last ran and is next due."""
+    counts = {
+        row["_id"]: row["count"]
+        async for row in await faults_col.aggregate([
+            {"$match": {"status": {"$in": ["active", "acknowledged"]}}},
+            {"$group": {"_id": "$severity", "count": {"$sum": 1}}},
+        ])
+    }
+    scan = await fault_scan_service.scan_status()
+    last_scan_at = scan.get("last_scan_at")
+    next_scan_eta_seconds = None
+    if last_scan_at is not None:
+        due = last_scan_at + timedelta(seconds=scan.get("interval_seconds", fault_scan_service.FAULT_SCAN_INTERVAL_SECONDS))
+        next_scan_eta_seconds = max(int((due - datetime.utcnow()).total_seconds()), 0)
+    return FaultSummary(
+        total=sum(counts.values()),
+        critical=counts.get("Critical", 0),
+        high=counts.get("High", 0),
+        medium=counts.get("Medium", 0),
+        low=counts.get("Low", 0),
+        last_scan_at=last_scan_at,
+        next_scan_eta_seconds=next_scan_eta_seconds,
+    )
+
+
 @router.post("/", response_model=Fault)
-def create_fault(fault: Fault):
+async def create_fault(fault: Fault):
     payload = fault.dict()
     payload["detected_at"] = payload["detected_at"] or datetime.utcnow()
-    faults_col.insert_one(payload)
-    payload.pop("_id", None)
+    await faults_col.insert_one({**payload, **await sync_service.version_fields()})
     return payload
 
 
 @router.get("/{fault_id}", response_model=Fault)
-def get_fault(fault_id: str):
-    fault = faults_col.find_one({"fault_id": fault_id}, {"_id": 0})
+async def get_fault(fault_id: str):
+    fault = await faults_col.find_one({"fault_id": fault_id}, {"_id": 0})
     if not fault:
         raise HTTPException(status_code=404, detail="Fault not found")
     return fault
 
 
 @router.get("/analytics/trends")
-def get_fault_trends(days: int = Query(7, ge=1, le=90)):
+async def get_fault_trends(days: int = Query(7, ge=1, le=90)):
     """
     Get fault trends over time, grouped by day and severity.
     """
@@ -134,10 +179,10 @@ def get_fault_trends(days: int = Query(7, ge=1, le=90)):
         start_date = end_date - timedelta(days=days)
         
         # Get all faults in the date range
-        all_faults = list(faults_col.find(
+        all_faults = await faults_col.find(
             {"detected_at": {"$gte": start_date, "$lte": end_date}},
             {"_id": 0, "detected_at": 1, "severity": 1}
-        ))
+        ).to_list()
         
         # Organize by date
         trends = {}
@@ -172,7 +217,7 @@ def get_fault_trends(days: int = Query(7, ge=1, le=90)):
 
 
 @router.get("/analytics/predictive-warnings")
-def get_predictive_warnings():
+async def get_predictive_warnings():
     """
     Get predictive fault warnings based on prediction models and energy patterns.
     """
@@ -181,23 +226,45 @@ def get_predictive_warnings():
         now = datetime.utcnow()
         
         # Get devices with recent predictions
-        recent_predictions = list(prediction_col.find({}, {"_id": 0}).limit(50))
-        
+        recent_predictions = await prediction_col.find({}, {"_id": 0}).limit(50).to_list()
+        device_ids = list({p["device_id"] for p in recent_predictions if p.get("device_id")})
+        if not device_ids:
+            return {"warnings": []}
+
+        devices = {
+            d["device_id"]: d
+            for d in await devices_col.find({"device_id": {"$in": device_ids}}, {"_id": 0}).to_list()
+        }
+        # Last 10 readings and the active fault count of every device, one round trip each
+        energy_by_device = {
+            row["_id"]: row["readings"]
+            async for row in await energy_col.aggregate([
+                {"$match": {"device_id": {"$in": list(devices)}}},
+                {"$group": {
+                    "_id": "$device_id",
+                    "readings": {"$topN": {
+                        "n": 10,
+                        "sortBy": {"timestamp": -1},
+                        "output": {"power_kwh": "$power_kwh", "temperature": "$temperature", "voltage": "$voltage"},
+                    }},
+                }},
+            ])
+        }
+        active_fault_counts = {
+            row["_id"]: row["count"]
+            async for row in await faults_col.aggregate([
+                {"$match": {"device_id": {"$in": list(energy_by_device)}, "status": "active"}},
+                {"$group": {"_id": "$device_id", "count": {"$sum": 1}}},
+            ])
+        }
+
         for pred in recent_predictions:
             device_id = pred.get("device_id")
-            if not device_id:
-                continue
-                
-            device = devices_col.find_one({"device_id": device_id}, {"_id": 0})
+            device = devices.get(device_id)
             if not device:
                 continue
-            
-            # Get recent energy readings
-            recent_energy = list(energy_col.find(
-                {"device_id": device_id},
-                {"_id": 0}
-            ).sort("timestamp", -1).limit(10))
-            
+
+            recent_energy = energy_by_device.get(device_id)
             if not recent_energy:
                 continue
             
@@ -230,7 +297,7 @@ def get_predictive_warnings():
                 risk_factors.append("Power consumption exceeding rated capacity")
             
             # Check for existing active faults
-            active_faults = faults_col.count_documents({"device_id": device_id, "status": "active"})
+            active_faults = active_fault_counts.get(device_id, 0)
             if active_faults > 0:
                 risk_score += 25
                 risk_factors.append(f"{active_faults} active fault(s) present")
@@ -257,7 +324,7 @@ def get_predictive_warnings():
 
 
 @router.get("/analytics/energy-correlation")
-def get_energy_fault_correlation(device_id: Optional[str] = None, hours: int = Query(24, ge=1, le=168)):
+async def get_energy_fault_correlation(device_id: Optional[str] = None, hours: int = Query(24, ge=1, le=168)):
     try:
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=hours)
@@ -267,7 +334,7 @@ def get_energy_fault_correlation(device_id: Optional[str] = None, hours: int = Q
         if device_id:
             fault_query["device_id"] = device_id
         
-        faults = list(faults_col.find(fault_query, {"_id": 0}))
+        faults = await faults_col.find(fault_query, {"_id": 0}).to_list()
     
         correlations = []
         for fault in faults:
@@ -287,13 +354,13 @@ def get_energy_fault_correlation(device_id: Optional[str] = None, hours: int = Q
             energy_window_start = f_time - timedelta(hours=2)
             energy_window_end = f_time + timedelta(hours=2)
             
-            energy_readings = list(energy_col.find(
+            energy_readings = await energy_col.find(
                 {
                     "device_id": f_device_id,
                     "timestamp": {"$gte": energy_window_start, "$lte": energy_window_end}
                 },
                 {"_id": 0}
-            ).sort("timestamp", 1))
+            ).sort("timestamp", 1).to_list()
             
             if energy_readings:
                 correlations.append({
@@ -333,24 +400,31 @@ def get_energy_fault_correlation(device_id: Optional[str] = None, hours: int = Q
 
 
 @router.get("/analytics/patterns")
-def get_fault_patterns():
+async def get_fault_patterns():
     """
     Identify fault patterns by grouping similar faults.
     """
     try:
         # Get all active and recent faults
-        recent_faults = list(faults_col.find(
+        recent_faults = await faults_col.find(
             {"status": {"$in": ["active", "acknowledged"]}},
             {"_id": 0}
-        ).limit(100))
+        ).limit(100).to_list()
     
+        device_types = {
+            d["device_id"]: d.get("device_type", "Unknown")
+            for d in await devices_col.find(
+                {"device_id": {"$in": list({f.get("device_id") for f in recent_faults})}},
+                {"_id": 0, "device_id": 1, "device_type": 1},
+            ).to_list()
+        }
+
         # Group by issue type and device type
         patterns = {}
         
         for fault in recent_faults:
             device_id = fault.get("device_id")
-            device = devices_col.find_one({"device_id": device_id}, {"_id": 0})
-            device_type = device.get("device_type", "Unknown") if device else "Unknown"
+            device_type = device_types.get(device_id, "Unknown")
             
             issue = fault.get("issue", "Unknown Issue")
             severity = fault.get("severity", "Low")
@@ -407,17 +481,17 @@ def get_fault_patterns():
 
 
 @router.get("/analytics/zone-heatmap")
-def get_zone_heatmap():
+async def get_zone_heatmap():
     """
     Get fault distribution by location/zone for heatmap visualization.
     """
     try:
         # Get all devices with their locations
-        devices = list(devices_col.find({}, {"_id": 0}))
+        devices = await devices_col.find({}, {"_id": 0}).to_list()
         device_locations = {d["device_id"]: d.get("location", "Unknown") for d in devices}
         
         # Get active faults
-        active_faults = list(faults_col.find({"status": "active"}, {"_id": 0}))
+        active_faults = await faults_col.find({"status": "active"}, {"_id": 0}).to_list()
     
         # Group by location
         location_stats = {}
@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from app.services import heartbeat_service
+from database import heartbeats_col
+from utils.jwt_handler import get_current_user
+from utils.negotiation import negotiated_response
+
+router = APIRouter(
+    prefix="/heartbeats",
+    tags=["Heartbeats"],
+    dependencies=[Depends(get_current_user)],
+)
+
+
+@router.get("/")
+async def list_heartbeats(
+    request: Request,
+    location: Optional[str] = None,
+    status: Optional[str] = Query(None, pattern="^(online|offline)$"),
+):
+    """Liveness and latest vitals of every module, offline ones first. Never reads raw telemetry."""
+    rows = await heartbeat_service.fleet(location)
+    offline = sum(1 for row in rows if row["status"] == "offline")
+    return negotiated_response(request, {
+        "summary": {"modules": len(rows), "online": len(rows) - offline, "offline": offline},
+        "modules": [row for row in rows if row["status"] == status] if status else rows,
+    })
+
+
+@router.get("/{module}")
+async def get_heartbeat(module: str):
+    """Liveness and latest vitals of one module."""
+    doc = await heartbeats_col.find_one({"_id": module})
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Module has never reported")
+    return heartbeat_service.liveness(doc, datetime.utcnow())
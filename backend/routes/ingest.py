@@ -0,0 +1,63 @@
+import os
+from datetime import datetime
+from typing import List, Optional, Union
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+
+from app.models.analytics_model import TelemetryReading
+from app.models.energy_model import EnergyReading
+from app.services.ingest_service import ingest_energy, ingest_occupancy
+
+
+def require_api_key(x_api_key: Optional[str] = Header(None)):
+    """Devices authenticate with the shared X-API-Key header rather than a JWT."""
+    expected = os.getenv("API_KEY")
+    if not expected:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Ingestion API key not configured",
+        )
+    if x_api_key != expected:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
+
+
+def _stamp(readings, source: str) -> List[dict]:
+    """
+    Stamp readings with the server's clock. Device clocks drift or reset, and
+    received_at drives watermarks, hourly rollups and liveness, so a
+    device-supplied value is only kept as ``device_time``.
+    """
+    now = datetime.utcnow()
+    docs = []
+    for reading in readings:
+        doc = reading.dict(exclude_none=True)
+        device_time = doc.pop("received_at", None)
+        if device_time is not None:
+            doc["device_time"] = device_time
+        doc["received_at"] = now
+        doc.setdefault("source", source)
+        docs.append(doc)
+    return docs
+
+
+router = APIRouter(
+    prefix="/api/v1",
+    tags=["Ingestion"],
+    dependencies=[Depends(require_api_key)],
+)
+
+
+@router.post("/telemetry", status_code=status.HTTP_201_CREATED)
+async def post_telemetry(data: Union[List[TelemetryReading], TelemetryReading]):
+    """Store one occupancy/environment reading or a batch of them."""
+    readings = data if isinstance(data, list) else [data]
+    stored = await ingest_occupancy(_stamp(readings, "esp8266"))
+    return {"message": "Telemetry stored", "count": stored}
+
+
+@router.post("/current", status_code=status.HTTP_201_CREATED)
+async def post_current(data: Union[List[EnergyReading], EnergyReading]):
+    """Store one current/energy reading or a batch of them."""
+    readings = data if isinstance(data, list) else [data]
+    stored = await ingest_energy(_stamp(readings, "esp32"))
+    return {"message": "Energy data stored", "count": stored}
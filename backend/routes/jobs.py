@@ -0,0 +1,95 @@
+import csv
+import io
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import ValidationError
+
+from app.models.job_model import JobRequest
+from app.services import job_service
+from app.services.report_service import REPORTS
+from routes.exports import _csv_cell
+from utils.jwt_handler import get_current_user
+from utils.negotiation import negotiated_response
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+    dependencies=[Depends(get_current_user)],
+)
+
+
+def _view(job: dict) -> dict:
+    job = {"job_id": job.pop("_id"), **job}
+    job["result_url"] = f"/jobs/{job['job_id']}/result" if job["status"] == "done" else None
+    return job
+
+
+@router.get("/reports")
+async def list_reports():
+    """Reports that can be submitted, with their parameter schemas."""
+    return [
+        {"report": r.name, "description": r.description, "params": r.params_model.model_json_schema()}
+        for r in REPORTS.values()
+    ]
+
+
+@router.post("/", status_code=202)
+async def submit_job(body: JobRequest, response: Response, current_user: dict = Depends(get_current_user)):
+    """
+    Queue a report. Returns 202 with the job to poll, or 200 when an identical
+    request over unchanged data has already finished.
+    """
+    report = REPORTS.get(body.report)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"Unknown report {body.report}")
+    try:
+        params = report.normalize(body.params)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=exc.errors(include_url=False, include_context=False))
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    job = await job_service.submit(report, params, current_user.get("user_id"))
+    if job["status"] == "done":
+        response.status_code = 200
+    return _view(job)
+
+
+@router.get("/")
+async def list_jobs(limit: int = Query(50, ge=1, le=200), current_user: dict = Depends(get_current_user)):
+    """Jobs you have requested, newest first (all jobs for admins)."""
+    user = None if current_user.get("role") == "admin" else current_user.get("user_id")
+    return [_view(job) for job in await job_service.list_jobs(user, limit)]
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress of a job."""
+    job = await job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _view(job)
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(request: Request, job_id: str, format: str = Query("json", pattern="^(json|csv)$")):
+    """The finished report. ``format=csv`` downloads its rows; otherwise honours ``Accept``."""
+    job = await job_service.get_job(job_id, with_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    result = job["result"]
+    if format == "csv":
+        rows = result.get("rows") or []
+        fields = list(dict.fromkeys(key for row in rows for key in row))
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow([_csv_cell(row.get(f)) for f in fields])
+        return Response(
+            content=buffer.getvalue(),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{job["report"]}-{job_id}.csv"'},
+        )
+    return negotiated_response(request, {"job_id": job_id, "report": job["report"], "params": job["params"], **result})
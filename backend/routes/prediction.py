@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from database import prediction_col
 from app.models.prediction_model import Prediction
+from app.services import forecast_service
 from datetime import datetime
-from utils.jwt_handler import get_current_user
+from utils.jwt_handler import get_current_user, require_admin
 
 router = APIRouter(
     prefix="/prediction",
@@ -11,12 +12,20 @@ router = APIRouter(
 )
 
 @router.post("/")
-def save_prediction(prediction: Prediction):
+async def save_prediction(prediction: Prediction):
     doc = prediction.dict()
     doc["created_at"] = datetime.now()
-    prediction_col.insert_one(doc)
+    await prediction_col.insert_one(doc)
     return {"message": "Prediction saved"}
 
 @router.get("/daily")
-def get_daily_predictions():
-    return list(prediction_col.find({"prediction_type": "daily"}, {"_id": 0}))
+async def get_daily_predictions():
+    return await prediction_col.find({"prediction_type": "daily"}, {"_id": 0}).to_list()
+
+@router.post("/forecast", dependencies=[Depends(require_admin)])
+async def run_forecast(
+    scope: str = Query(forecast_service.FORECAST_SCOPE, pattern="^(location|pooled)$"),
+    dry_run: bool = False,
+):
+    """Forecast the next day for every location and store a daily prediction per device."""
+    return await forecast_service.run(scope=scope, persist=not dry_run)
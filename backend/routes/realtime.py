@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from app.services.realtime_service import hub
+from utils.json_response import dumps
+from utils.jwt_handler import authenticate_token, get_current_user
+
+router = APIRouter(
+    prefix="/realtime",
+    tags=["Realtime"],
+)
+
+REALTIME_KEEPALIVE_SECONDS = float(os.getenv("REALTIME_KEEPALIVE_SECONDS", "15"))
+
+
+@router.get("/zones", dependencies=[Depends(get_current_user)])
+async def stream_zone_events(
+    location: Optional[List[str]] = Query(None, description="Only these locations (repeatable)"),
+    module: Optional[List[str]] = Query(None, description="Only these modules (repeatable)"),
+):
+    """
+    Server-Sent Events stream of zone deltas: ``zone`` (occupancy/environment
+    changes), ``energy`` (new current readings), ``fault`` and ``resync``.
+    """
+    subscription = hub.subscribe(location, module)
+
+    async def events():
+        try:
+            while True:
+                event = await subscription.next(timeout=REALTIME_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield b": keepalive\n\n"
+                    continue
+                yield b"event: %s\ndata: %s\n\n" % (event["type"].encode(), dumps(event))
+        finally:
+            await hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/zones/ws")
+async def zone_events_socket(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None, description="JWT, for clients that cannot set headers"),
+    location: Optional[List[str]] = Query(None),
+    module: Optional[List[str]] = Query(None),
+):
+    """
+    WebSocket variant of ``/realtime/zones``. Clients may send
+    ``{"locations": [...], "modules": [...]}`` at any time to change their filters.
+    """
+    authorization = websocket.headers.get("authorization") or ""
+    scheme, _, header_token = authorization.partition(" ")
+    token = token or (header_token if scheme.lower() == "bearer" else None)
+    try:
+        if not token:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        await authenticate_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = hub.subscribe(location, module)
+
+    async def send_events():
+        while True:
+            event = await subscription.next()
+            await websocket.send_text(dumps(event).decode("utf-8"))
+
+    async def receive_filters():
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if isinstance(message, dict):
+                subscription.set_filters(message.get("locations"), message.get("modules"))
+
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(receive_filters())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            exc = task.exception()
+            if exc is not None and not isinstance(exc, WebSocketDisconnect):
+                raise exc
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await hub.unsubscribe(subscription)
@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app.services import catalog_service, sync_service
+from routes.zones import zone_summaries
+from utils.jwt_handler import get_current_user
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["Sync"],
+    dependencies=[Depends(get_current_user)],
+)
+
+
+async def _zone_changes(since: Optional[datetime]) -> dict:
+    entries = await catalog_service.locations_seen_since(since)
+    seen = [e["last_seen"] for e in entries if isinstance(e.get("last_seen"), datetime)]
+    version = max(seen) if seen else since
+    if not entries:
+        return {"version": version, "reset": since is None, "upserted": []}
+    locations = [e["name"] for e in entries]
+    summaries = await zone_summaries({"location": {"$in": locations}})
+    return {"version": version, "reset": since is None, "upserted": [s.dict() for s in summaries]}
+
+
+@router.get("/")
+async def sync_changes(
+    devices: int = Query(0, ge=0, description="Last devices version seen (0 for a full snapshot)"),
+    faults: int = Query(0, ge=0, description="Last faults version seen (0 for a full snapshot)"),
+    zones: Optional[datetime] = Query(None, description="Last zones version (timestamp) seen"),
+):
+    """
+    Everything that changed since the versions the client already has.
+
+    Devices and faults come back as ``upserted`` documents plus ``deleted`` keys
+    (``device_id`` / ``fault_id``); when ``has_more`` is true, call again with the
+    returned version. Zones come back as fresh summaries of the locations that
+    reported since the given timestamp. Store each returned ``version`` and send
+    it on the next call.
+    """
+    return {
+        "devices": await sync_service.changes("devices", devices),
+        "faults": await sync_service.changes("faults", faults),
+        "zones": await _zone_changes(zones),
+    }
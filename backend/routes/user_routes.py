@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from database import user_col
 from app.models.user_model import UpdateUserReq, User
 from utils.security import hash_password
-from utils.jwt_handler import get_current_user
+from utils.jwt_handler import get_current_user, invalidate_user_cache
+from utils.pagination import ASCENDING, fetch_page, set_next_cursor
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -15,8 +18,8 @@ def _sanitize_user(doc: dict | None):
     return doc
 
 @router.post("/signup")
-def add_user(data: User):
-    existing_user = user_col.find_one({"email": data.email})
+async def add_user(data: User):
+    existing_user = await user_col.find_one({"email": data.email})
     if existing_user:
         return {"message": "Email already registered",
                 "success": False,
@@ -27,22 +30,29 @@ def add_user(data: User):
     user_data = data.dict()
     user_data["password"] = hash_password(user_data["password"])
 
-    user_col.insert_one(user_data)
+    await user_col.insert_one(user_data)
 
     return {"message": "User created successfully"}
 
 @router.get("/")
-def get_users():
-    data = list(user_col.find({}, {"_id": 0}).limit(10))
+async def get_users(
+    response: Response,
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+):
+    data, next_cursor = await fetch_page(
+        user_col, {}, "created_at", limit, cursor, projection={"_id": 0}, direction=ASCENDING
+    )
+    set_next_cursor(response, next_cursor)
     return list(data)
 
 @router.get("/{user_id}")
-def get_user(user_id: str, current_user=Depends(get_current_user)):
+async def get_user(user_id: str, current_user=Depends(get_current_user)):
     # Only allow the user themselves or an admin
     if current_user.get("role") != "admin" and current_user.get("user_id") != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    user = user_col.find_one({"user_id": user_id})
+    user = await user_col.find_one({"user_id": user_id})
     user = _sanitize_user(user)
 
     if not user:
@@ -52,7 +62,7 @@ def get_user(user_id: str, current_user=Depends(get_current_user)):
 
 
 @router.put("/{user_id}")
-def update_user(user_id: str, payload: UpdateUserReq, current_user=Depends(get_current_user)):
+async def update_user(user_id: str, payload: UpdateUserReq, current_user=Depends(get_current_user)):
     if current_user.get("role") != "admin" and current_user.get("user_id") != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
@@ -62,14 +72,15 @@ def update_user(user_id: str, payload: UpdateUserReq, current_user=Depends(get_c
 
     # Prevent email collision
     if "email" in update:
-        existing = user_col.find_one({"email": update["email"], "user_id": {"$ne": user_id}})
+        existing = await user_col.find_one({"email": update["email"], "user_id": {"$ne": user_id}})
         if existing:
             raise HTTPException(status_code=400, detail="Email already registered")
 
-    result = user_col.update_one({"user_id": user_id}, {"$set": update})
+    result = await user_col.update_one({"user_id": user_id}, {"$set": update})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_cache(user_id)
 
-    user = user_col.find_one({"user_id": user_id})
+    user = await user_col.find_one({"user_id": user_id})
     user = _sanitize_user(user)
     return {"success": True, "data": user}
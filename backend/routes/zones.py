@@ -1,11 +1,13 @@
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 
 from app.models.device_model import Device
-from app.models.zone_model import ZoneDetail, ZoneSummary
+from app.models.zone_model import ZoneBaseline, ZoneDetail, ZoneSummary
+from app.services import baseline_service, sync_service
 from database import analytics_col, devices_col, energy_col
 from utils.jwt_handler import get_current_user
+from utils.negotiation import negotiated_response
 import os
 
 router = APIRouter(
@@ -24,7 +26,7 @@ def _get_energy_timestamp(doc: Dict[str, Any]):
     return doc.get("received_at") or doc.get("receivedAt") or doc.get("timestamp") or doc.get("created_at")
 
 
-def _to_energy_map(match: Dict[str, Any]):
+async def _to_energy_map(match: Dict[str, Any]):
     """Return a map of location -> latest energy row."""
     pipeline = []
     if match:
@@ -38,7 +40,7 @@ def _to_energy_map(match: Dict[str, Any]):
     )
 
     energy_map: Dict[str, Dict[str, Any]] = {}
-    for row in energy_col.aggregate(pipeline):
+    async for row in await energy_col.aggregate(pipeline):
         loc = row.get("_id")
         doc = row.get("doc")
         if loc and doc:
@@ -90,12 +92,12 @@ def _to_summary(doc: Dict[str, Any], energy: Optional[Dict[str, Any]] = None) ->
 
 
 @router.post("/{location}/devices")
-def add_device_to_zone(location: str, device: Device):
+async def add_device_to_zone(location: str, device: Device):
     """Attach a device to a zone (location), ensuring device_id uniqueness."""
     if device.location and device.location != location:
         raise HTTPException(status_code=400, detail="Device location mismatch with path")
 
-    if devices_col.find_one({"device_id": device.device_id}):
+    if await devices_col.find_one({"device_id": device.device_id}):
         raise HTTPException(status_code=409, detail="Device with this id already exists")
 
     if device.rated_power_watts is None:
@@ -103,18 +105,14 @@ def add_device_to_zone(location: str, device: Device):
 
     doc = device.dict(exclude_unset=True)
     doc["location"] = location
-    devices_col.insert_one(doc)
+    doc.update(await sync_service.version_fields())
+    await devices_col.insert_one(doc)
     return {"message": "Device added to zone", "device_id": device.device_id, "location": location}
 
 
-@router.get("/", response_model=List[ZoneSummary])
-def list_zones(module: Optional[str] = None):
-    """Return one consolidated row per location from occupancy_telemetry."""
-    match: Dict[str, Any] = {}
-    if module:
-        match["module"] = module
-
-    energy_map = _to_energy_map(match if module else {})
+async def zone_summaries(match: Dict[str, Any]) -> List[ZoneSummary]:
+    """One summary per location among the occupancy rows matching ``match``."""
+    energy_map = await _to_energy_map(match)
 
     pipeline = []
     if match:
@@ -127,9 +125,9 @@ def list_zones(module: Optional[str] = None):
         ]
     )
 
-    results = analytics_col.aggregate(pipeline)
+    results = await analytics_col.aggregate(pipeline)
     summaries: List[ZoneSummary] = []
-    for row in results:
+    async for row in results:
         doc = row.get("doc") or {}
         loc = doc.get("location")
         energy = energy_map.get(loc)
@@ -138,8 +136,32 @@ def list_zones(module: Optional[str] = None):
     return summaries
 
 
+@router.get("/", response_model=List[ZoneSummary])
+async def list_zones(module: Optional[str] = None):
+    """Return one consolidated row per location from occupancy_telemetry."""
+    return await zone_summaries({"module": module} if module else {})
+
+
+@router.get("/{location}/baseline", response_model=ZoneBaseline)
+async def get_zone_baseline(location: str, module: Optional[str] = None):
+    """Hour-of-week profile of a location (or one of its modules) and how the latest hour compares."""
+    doc = await baseline_service.get_profile(location, module)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="No baseline for this location yet")
+    return ZoneBaseline(
+        location=location,
+        module=module,
+        weeks=doc.get("weeks", baseline_service.BASELINE_WEEKS),
+        through=doc.get("through"),
+        profile=doc.get("profile") or {},
+        now=doc.get("now"),
+        deviation=baseline_service.deviation(doc),
+    )
+
+
 @router.get("/{location}", response_model=ZoneDetail)
-def get_zone_detail(
+async def get_zone_detail(
+    request: Request,
     location: str,
     module: Optional[str] = None,
     limit: int = Query(50, ge=1, le=500, description="Number of history rows to return"),
@@ -149,13 +171,10 @@ def get_zone_detail(
     if module:
         query["module"] = module
 
-    latest_cursor = (
-        analytics_col
-        .find(query)
-        .sort([("received_at", -1), ("receivedAt", -1), ("timestamp", -1), ("_id", -1)])
-        .limit(1)
+    latest = await analytics_col.find_one(
+        query,
+        sort=[("received_at", -1), ("receivedAt", -1), ("timestamp", -1), ("_id", -1)],
     )
-    latest = next(latest_cursor, None)
 
     if latest is None:
         raise HTTPException(status_code=404, detail="Location not found")
@@ -167,19 +186,17 @@ def get_zone_detail(
         .limit(limit)
     )
 
-    history = list(history_cursor)
+    history = await history_cursor.to_list()
 
     energy_query: Dict[str, Any] = {"location": location}
     if module:
         energy_query["module"] = module
 
-    energy_latest_cursor = (
-        energy_col
-        .find(energy_query)
-        .sort([("received_at", -1), ("receivedAt", -1), ("timestamp", -1), ("created_at", -1), ("_id", -1)])
-        .limit(1)
+    latest_energy = await energy_col.find_one(
+        energy_query,
+        {"_id": 0},
+        sort=[("received_at", -1), ("receivedAt", -1), ("timestamp", -1), ("created_at", -1), ("_id", -1)],
     )
-    latest_energy = next(energy_latest_cursor, None)
 
     energy_history_cursor = (
         energy_col
@@ -187,12 +204,13 @@ def get_zone_detail(
         .sort([("received_at", -1), ("receivedAt", -1), ("timestamp", -1), ("created_at", -1), ("_id", -1)])
         .limit(limit)
     )
-    energy_history = list(energy_history_cursor)
-
-    return ZoneDetail(
-        latest=_to_summary(latest, latest_energy),
-        history=history,
-        latest_energy=latest_energy,
-        energy_history=energy_history,
-    )
+    energy_history = await energy_history_cursor.to_list()
+
+    # History rows are forwarded as stored; only the summary goes through the model
+    return negotiated_response(request, {
+        "latest": _to_summary(latest, latest_energy).dict(),
+        "history": history,
+        "latest_energy": latest_energy,
+        "energy_history": energy_history,
+    })
 
@@ -0,0 +1,98 @@
+"""
+Database round-trip budgets for route tests.
+
+``CommandRecorder`` is a pymongo command listener that keeps every command
+the app sends, with its collection and the number of documents it returned.
+``query_budget`` wraps a block and fails with the offending command list when
+the block issues more commands (or reads more documents) than declared:
+
+    with query_budget(recorder, max_commands=3):
+        client.get("/faults/analytics/patterns", headers=auth)
+"""
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+from pymongo import monitoring
+
+# Connection handshakes, auth and session cleanup are the driver's, not the route's
+DRIVER_COMMANDS = {"hello", "isMaster", "ismaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo"}
+
+
+class RecordedCommand:
+    __slots__ = ("name", "collection", "documents", "summary")
+
+    def __init__(self, name: str, collection: str, summary: str):
+        self.name = name
+        self.collection = collection
+        self.documents = 0
+        self.summary = summary
+
+    def __repr__(self):
+        return f"{self.name} {self.collection} -> {self.documents} docs  {self.summary}"
+
+
+def _summary(command: dict) -> str:
+    for key in ("filter", "pipeline", "query", "q", "updates", "deletes", "documents"):
+        if key in command:
+            return f"{key}={str(command[key])[:200]}"
+    return ""
+
+
+def _returned(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    return 0
+
+
+class CommandRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.commands: List[RecordedCommand] = []
+
+    def started(self, event):
+        if event.command_name in DRIVER_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        recorded = RecordedCommand(
+            event.command_name, target if isinstance(target, str) else "", _summary(event.command)
+        )
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = recorded
+            self.commands.append(recorded)
+
+    def succeeded(self, event):
+        with self._lock:
+            recorded = self._pending.pop((event.connection_id, event.request_id), None)
+        if recorded is not None:
+            recorded.documents = _returned(event.reply)
+
+    def failed(self, event):
+        with self._lock:
+            self._pending.pop((event.connection_id, event.request_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self.commands = []
+
+
+@contextmanager
+def query_budget(recorder: CommandRecorder, max_commands: int, max_documents: Optional[int] = None):
+    """Fail if the block sends more than ``max_commands`` commands or reads more than ``max_documents``."""
+    recorder.clear()
+    yield recorder
+    commands = list(recorder.commands)
+    documents = sum(c.documents for c in commands)
+    over_commands = len(commands) > max_commands
+    over_documents = max_documents is not None and documents > max_documents
+    if over_commands or over_documents:
+        listing = "\n".join(f"  {i + 1}. {c!r}" for i, c in enumerate(commands))
+        raise AssertionError(
+            f"Query budget exceeded: {len(commands)} commands (budget {max_commands}), "
+            f"{documents} documents (budget {max_documents})\n{listing}"
+        )
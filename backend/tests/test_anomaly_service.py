@@ -0,0 +1,63 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from app.services import anomaly_service
+from app.services.anomaly_service import AnomalyDetector
+
+START = datetime(2026, 3, 2, 8, 0)
+
+
+def _readings(values, module="MOD-001", step_seconds=30):
+    return [
+        {"module": module, "location": "Lab", "current_a": v, "received_at": START + timedelta(seconds=i * step_seconds)}
+        for i, v in enumerate(values)
+    ]
+
+
+def test_steady_noise_raises_nothing_and_a_spike_is_reported_once_per_window():
+    """A lone spike is flagged; repeats inside the dedup window are suppressed"""
+    rng = random.Random(1)
+    values = [2.0 + rng.gauss(0, 0.05) for _ in range(200)]
+    values[120] = 9.0
+    values[125] = 9.5
+    detector = AnomalyDetector(dedup_seconds=900)
+
+    anomalies = detector.detect("energy", _readings(values))
+
+    assert [(a["anomaly_type"], a["value"]) for a in anomalies] == [("spike", 9.0)]
+    assert anomalies[0]["severity"] == "High"
+    assert anomalies[0]["dedupe_key"].startswith("MOD-001:current_a:spike:")
+    assert detector.suppressed == 1
+
+
+def test_sustained_shift_below_spike_threshold_is_a_level_shift():
+    """A step of a few standard deviations is caught by the CUSUM, not the spike rule"""
+    rng = random.Random(2)
+    values = [1.0 + rng.gauss(0, 0.1) for _ in range(100)] + [1.3 + rng.gauss(0, 0.1) for _ in range(100)]
+    detector = AnomalyDetector()
+
+    anomalies = detector.detect("energy", _readings(values))
+
+    assert [a["anomaly_type"] for a in anomalies] == ["level_shift"]
+    assert anomalies[0]["detected_at"] >= START + timedelta(seconds=100 * 30)
+    assert "above" in anomalies[0]["description"]
+
+
+def test_replayed_findings_insert_only(monkeypatch):
+    """Replay writes never bump occurrences of windows that already exist"""
+    writes = []
+
+    class _Collection:
+        async def bulk_write(self, ops, ordered=True):
+            writes.extend(ops)
+
+    monkeypatch.setattr(anomaly_service, "anomalies_col", _Collection())
+    detector = AnomalyDetector()
+    finding = {"dedupe_key": "MOD-001:current_a:spike:1", "detected_at": START}
+    asyncio.run(detector.store([finding], count=False))
+    asyncio.run(detector.store([finding]))
+
+    replayed, live = (op._doc for op in writes)
+    assert list(replayed) == ["$setOnInsert"] and replayed["$setOnInsert"]["occurrences"] == 1
+    assert live["$inc"] == {"occurrences": 1}
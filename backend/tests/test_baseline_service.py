@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from app.services.baseline_service import BASELINE_WEEKS, Profile, by_profile, deviation, slot_of, summarize
+
+MONDAY = datetime(2026, 3, 2)
+
+
+def test_slots_start_on_monday_midnight():
+    """Slot numbering is weekday * 24 + hour"""
+    assert slot_of(MONDAY) == 0
+    assert slot_of(MONDAY + timedelta(days=6, hours=23)) == 167
+
+
+def test_each_slot_keeps_only_the_latest_weeks():
+    """Adding more weeks than BASELINE_WEEKS drops the oldest values"""
+    profile = Profile("location:Lab")
+    for week in range(BASELINE_WEEKS + 2):
+        profile.add("current", MONDAY + timedelta(weeks=week, hours=9), float(week))
+
+    values = profile.samples["current"][9]
+    assert values == [float(w) for w in range(2, BASELINE_WEEKS + 2)]
+    stats = profile.to_update(MONDAY)["profile.current"]
+    assert stats["n"][9] == BASELINE_WEEKS and stats["n"][10] == 0
+    assert stats["mean"][9] == summarize(values)["mean"]
+
+
+def test_locations_sum_current_and_average_the_rest():
+    """Two 2 A modules make a 4 A zone; temperatures are averaged"""
+    hour = MONDAY + timedelta(hours=9)
+    grouped = by_profile({
+        ("Lab", "MOD-1"): {hour: {"current": 2.0, "temperature": 20.0}},
+        ("Lab", "MOD-2"): {hour: {"current": 2.0, "temperature": 24.0}},
+    })
+
+    assert grouped["location:Lab"][hour] == {"current": 4.0, "temperature": 22.0}
+    assert grouped["module:MOD-1"][hour]["current"] == 2.0
+
+
+def test_deviation_compares_now_with_its_slot():
+    """A reading above the slot's p90 is flagged, with its z-score"""
+    profile = Profile("location:Lab")
+    for week, amps in enumerate([1.0, 1.2, 0.8, 1.1]):
+        profile.add("current", MONDAY + timedelta(weeks=week, hours=9), amps)
+    update = profile.to_update(MONDAY)
+    doc = {
+        "profile": {"current": update["profile.current"]},
+        "now": {"hour": MONDAY + timedelta(weeks=5, hours=9), "current": 3.0},
+    }
+
+    result = deviation(doc)["current"]
+
+    assert result["band"] == "above"
+    assert result["expected"] == 1.025
+    assert result["z"] > 10
+
+
+def test_profile_skips_hours_it_has_already_folded():
+    """Hours before the profile's own watermark are already in its samples"""
+    through = MONDAY + timedelta(hours=10)
+    profile = Profile("module:MOD-1", {"through": through})
+
+    assert profile.folded(through - timedelta(hours=1))
+    assert not profile.folded(through)
+    assert not Profile("module:MOD-2").folded(MONDAY)
+    assert profile.to_update(through + timedelta(hours=1))["through"] == through + timedelta(hours=1)
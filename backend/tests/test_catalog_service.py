@@ -0,0 +1,40 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.services import catalog_service
+from app.services.catalog_service import _entry_updates
+
+
+def test_entry_updates_fold_batch_into_one_upsert_per_name():
+    """A batch of readings yields a single upsert per module and per location"""
+    t0 = datetime(2026, 1, 1)
+    docs = [
+        {"module": "M1", "location": "Lab", "sensor": "ACS712", "wifi_rssi": -60, "received_at": t0},
+        {"module": "M1", "location": "Lab-2", "received_at": t0 + timedelta(minutes=5)},
+    ]
+    ops = {(op._filter["kind"], op._filter["name"]): op._doc for op in _entry_updates("energy", docs)}
+
+    assert set(ops) == {("module", "M1"), ("location", "Lab"), ("location", "Lab-2")}
+    module = ops[("module", "M1")]
+    assert module["$inc"] == {"reading_counts.energy": 2}
+    assert module["$min"]["first_seen"] == t0
+    assert module["$max"]["last_seen"] == t0 + timedelta(minutes=5)
+    assert module["$set"] == {"sensor": "ACS712", "last_rssi": -60}
+    assert module["$addToSet"] == {"locations": {"$each": ["Lab", "Lab-2"]}}
+
+
+def test_module_missing_from_the_catalog_falls_back_to_the_raw_readings(monkeypatch):
+    """Readings written by the Flask ingest never reach the catalog but still count"""
+    class _Collection:
+        def __init__(self, doc):
+            self.doc = doc
+
+        async def find_one(self, query, projection=None):
+            return self.doc
+
+    monkeypatch.setattr(catalog_service, "catalog_col", _Collection(None))
+    monkeypatch.setitem(catalog_service.SOURCES, "energy", _Collection({"_id": 1}))
+    assert asyncio.run(catalog_service.module_exists("M1")) is True
+
+    monkeypatch.setitem(catalog_service.SOURCES, "energy", _Collection(None))
+    assert asyncio.run(catalog_service.module_exists("M1")) is False
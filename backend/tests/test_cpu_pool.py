@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from app.services.energy_kernels import integrate_kwh
+from utils.cpu_pool import CpuPool
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_integrate_kwh_matches_trapezoid_per_location():
+    """Steps are capped at 15 min, use the later voltage, and zero-second steps are skipped"""
+    hour = 3_600_000_000
+    result = integrate_kwh(
+        location_codes=np.array([1, 0, 0, 0, 1], dtype=np.int32),
+        timestamps_us=np.array([0, 2 * hour, 0, 0, 1_000_000], dtype=np.int64),
+        current_a=np.array([1.0, 2.0, 2.0, 9.0, 3.0]),
+        voltage=np.array([230.0, 200.0, 230.0, 230.0, 230.0]),
+        n_locations=2,
+    )
+
+    assert result["codes"] == [0, 1]
+    assert result["samples"] == [3, 2]
+    # Location 0: 9 A -> 2 A over 900 s (capped) at 200 V
+    assert result["kwh"][0] == pytest.approx(5.5 * 200 * 0.25 / 1000)
+    assert result["kwh"][1] == pytest.approx(2.0 * 230 / 3600 / 1000)
+    assert result["end_us"][0] == 2 * hour
+
+
+def test_pool_runs_arrays_through_shared_memory_in_a_worker_process():
+    """Large inputs go through shared memory and give the same result as running inline"""
+    rng = np.random.default_rng(0)
+    arrays = {
+        "location_codes": rng.integers(0, 4, 5000).astype(np.int32),
+        "timestamps_us": rng.integers(0, 10**11, 5000),
+        "current_a": rng.random(5000),
+        "voltage": np.full(5000, 230.0),
+    }
+    pool = CpuPool(workers=1, max_pending=2, timeout_seconds=60, shm_min_bytes=0)
+    try:
+        result = asyncio.run(pool.run(integrate_kwh, arrays=arrays, n_locations=4))
+    finally:
+        pool.shutdown()
+
+    assert result == integrate_kwh(**arrays, n_locations=4)
+    assert pool.stats()["shared_bytes"] > 0 and pool.stats()["completed"] == 1
+
+
+def test_pool_rejects_past_its_queue_limit_and_times_out():
+    """Excess work is refused with 503 instead of queueing; a slow task ends in 504"""
+    pool = CpuPool(workers=0, max_pending=1, timeout_seconds=0.05)
+
+    async def scenario():
+        return await asyncio.gather(
+            pool.run(_sleep, seconds=0.2), pool.run(_sleep, seconds=0.01), return_exceptions=True
+        )
+
+    slow, rejected = asyncio.run(scenario())
+
+    assert isinstance(slow, HTTPException) and slow.status_code == 504
+    assert isinstance(rejected, HTTPException) and rejected.status_code == 503
+    assert rejected.headers["Retry-After"]
+    assert (pool.stats()["timeouts"], pool.stats()["rejected"]) == (1, 1)
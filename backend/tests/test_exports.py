@@ -0,0 +1,73 @@
+import asyncio
+import gzip
+from datetime import datetime, timedelta, timezone
+
+from routes import exports
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+def test_csv_export_streams_one_chunk_per_batch(monkeypatch):
+    """Rows are flushed every batch instead of being accumulated"""
+    monkeypatch.setattr(exports, "EXPORT_BATCH_SIZE", 2)
+    docs = [{"received_at": datetime(2026, 1, 1, 0, i), "current_ma": i, "tags": ["a"]} for i in range(5)]
+    chunks = asyncio.run(_collect(exports._encode_rows(_Cursor(docs), "csv", ["received_at", "current_ma", "tags"])))
+
+    assert len(chunks) == 3
+    lines = b"".join(chunks).decode().splitlines()
+    assert lines[0] == "received_at,current_ma,tags"
+    assert lines[1] == '2026-01-01T00:00:00,0,"[""a""]"'
+
+
+def test_gzip_stream_is_a_valid_gzip_file():
+    """Compressed exports decompress to the same bytes"""
+    async def chunks():
+        yield b'{"a":1}\n'
+        yield b'{"a":2}\n'
+
+    body = b"".join(asyncio.run(_collect(exports._gzip(chunks()))))
+    assert gzip.decompress(body) == b'{"a":1}\n{"a":2}\n'
+
+
+def test_timezone_aware_start_without_end_is_accepted(monkeypatch):
+    """Bounds are normalised to naive UTC before they are compared or queried"""
+    queries = []
+
+    class _Collection:
+        def find(self, query, projection):
+            queries.append(query)
+            return self
+
+        def sort(self, *args):
+            return self
+
+        def batch_size(self, *args):
+            return _Cursor([])
+
+    monkeypatch.setitem(exports.DATASETS, "energy_readings", (_Collection(), "received_at", ["received_at"]))
+    start = datetime.now(timezone(timedelta(hours=5, minutes=30))) - timedelta(hours=1)
+
+    response = asyncio.run(exports.export_dataset(
+        "energy_readings", start=start, end=None, format="ndjson", fields=None, gzip=False, module=None, location=None,
+    ))
+
+    assert response.status_code == 200
+    bounds = queries[0]["received_at"]
+    assert bounds["$gte"].tzinfo is None and bounds["$lt"].tzinfo is None
+    assert bounds["$lt"] - bounds["$gte"] < timedelta(hours=1, minutes=1)
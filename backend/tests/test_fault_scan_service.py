@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.services import fault_scan_service
+from app.services.fault_scan_service import (
+    FAULT_DROPOUT_SECONDS,
+    FAULT_STUCK_READINGS,
+    ModuleState,
+    check_energy,
+    check_gaps,
+    check_occupancy,
+)
+
+START = datetime(2026, 3, 2, 8, 0)
+
+
+def _readings(field, values, step_seconds=30):
+    return [
+        {"module": "MOD-001", "location": "Lab", field: v, "received_at": START + timedelta(seconds=i * step_seconds)}
+        for i, v in enumerate(values)
+    ]
+
+
+def test_overcurrent_is_judged_against_the_rated_power():
+    """A 1000 W device at 230 V may draw ~4.3 A; sustained 10 A is critical, 4 A is fine"""
+    device = {"device_id": "DEV-1", "rated_power_watts": 1000}
+    normal = check_energy(ModuleState("energy", "MOD-001"), _readings("current_a", [4.0, 4.1, 3.9] * 5), device)
+    over = check_energy(ModuleState("energy", "MOD-001"), _readings("current_a", [4.0, 10.0, 10.5, 9.8, 4.0]), device)
+
+    assert normal == []
+    assert [(f.check, f.severity) for f in over] == [("overcurrent", "Critical")]
+    assert over[0].signals[0]["value"] == 10.5
+
+
+def test_stuck_run_is_carried_across_scans_and_reported_once():
+    """Run lengths live in the module state, so a run split over two scans is still caught"""
+    state = ModuleState("occupancy", "MOD-001")
+    half = FAULT_STUCK_READINGS // 2 + 1
+    docs = [{"temperature": 22.5, "humidity": 40.0, "received_at": START + timedelta(minutes=i)} for i in range(2 * half)]
+
+    assert check_occupancy(state, docs[:half]) == []
+    findings = check_occupancy(state, docs[half:])
+
+    assert [f.check for f in findings] == ["stuck_sensor"]
+
+
+def test_temperature_excursion_against_the_learned_baseline():
+    """A jump to 31 C is inside the hard limits but far outside this room's baseline"""
+    state = ModuleState("occupancy", "MOD-001")
+    steady = [21.0 + 0.2 * ((i % 5) - 2) for i in range(150)]
+    assert check_occupancy(state, _readings("temperature", steady)) == []
+
+    findings = check_occupancy(state, _readings("temperature", [31.0]))
+
+    assert [(f.check, f.severity) for f in findings] == [("temperature_excursion", "Medium")]
+
+
+def test_silence_is_a_dropout_reported_once():
+    """A module silent past the threshold is reported once, not again when it comes back"""
+    state = ModuleState("energy", "MOD-001")
+    state.last_reading_at = START
+    later = START + timedelta(seconds=FAULT_DROPOUT_SECONDS * 2)
+
+    assert [f.check for f in check_gaps(state, [], later)] == ["dropout"]
+    assert check_gaps(state, [], later + timedelta(minutes=1)) == []
+    assert check_gaps(state, [{"received_at": later}], later) == []
+
+
+def test_upserts_that_lose_an_insert_race_are_retried(monkeypatch):
+    """A duplicate-key rejection from the open-fault index is retried once as an update"""
+    calls = []
+
+    class _Collection:
+        async def bulk_write(self, ops, ordered=True):
+            calls.append(list(ops))
+            if len(calls) == 1:
+                raise BulkWriteError({"writeErrors": [{"index": 1, "code": 11000}]})
+
+    monkeypatch.setattr(fault_scan_service, "faults_col", _Collection())
+    asyncio.run(fault_scan_service.upsert_open_faults(["a", "b", "c"]))
+
+    assert calls == [["a", "b", "c"], ["b"]]
+
+
+def test_reads_stop_short_of_the_settle_window(monkeypatch):
+    """Rows with a recent _id are left for the next scan, so one committed late is not skipped"""
+    queries = []
+
+    class _Cursor:
+        def sort(self, *args):
+            return self
+
+        def limit(self, n):
+            return self
+
+        async def to_list(self):
+            return []
+
+    class _Collection:
+        async def find_one(self, query):
+            return {"last_id": ObjectId.from_datetime(START)}
+
+        def find(self, query, projection=None):
+            queries.append(query)
+            return _Cursor()
+
+    monkeypatch.setattr(fault_scan_service, "scan_state_col", _Collection())
+    monkeypatch.setitem(fault_scan_service.SOURCES, "energy", _Collection())
+    settled = START + timedelta(minutes=5)
+    asyncio.run(fault_scan_service.FaultScanner()._read_new("energy", START - timedelta(hours=1), settled))
+
+    assert queries == [{"_id": {"$gt": ObjectId.from_datetime(START), "$lt": ObjectId.from_datetime(settled)}}]
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from benchmarks.fleet import Fleet, FleetSpec
+
+
+def test_fleet_is_deterministic_and_matches_expected_counts():
+    """The same spec yields the same readings, at the configured per-module rates"""
+    spec = FleetSpec(locations=2, modules=4, days=0.25, faults=10, anomalies=5, end=datetime(2026, 3, 2, 12, 0))
+    first, second = Fleet(spec), Fleet(spec)
+
+    occupancy = list(first.occupancy_readings())
+    current = list(first.current_readings())
+    expected = spec.expected_counts()
+
+    assert len(occupancy) == expected["occupancy_telemetry"]
+    assert len(current) == expected["energy_readings"]
+    assert len(first.devices) == expected["devices"]
+    assert current == list(second.current_readings())
+    assert {r["location"] for r in occupancy} == set(first.location_names)
+    assert all(spec.start <= r["received_at"] < spec.end for r in current)
+    assert {f["device_id"] for f in first.faults()} <= {d["device_id"] for d in first.devices}
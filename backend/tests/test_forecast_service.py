@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("sklearn")
+
+from app.services.forecast_service import Grid, ModelCache, allocate, forecast
+
+START = datetime(2026, 3, 2)
+DAYS = 10
+
+
+def _grid(young_location_days=3):
+    """Office load triples during working hours; "Annex" only has a few days of history."""
+    rows = {"energy": [], "occupancy": []}
+    for location, base, days in (("Office", 1.0, DAYS), ("Annex", 0.5, young_location_days)):
+        for h in range((DAYS - days) * 24, DAYS * 24):
+            at = START + timedelta(hours=h)
+            occupied = at.weekday() < 5 and 8 <= at.hour < 18
+            rows["energy"].append({"_id": {"location": location, "hour": at}, "kwh": base * (3 if occupied else 1)})
+            rows["occupancy"].append({"_id": {"location": location, "hour": at}, "occupancy": 0.9 if occupied else 0.0})
+    return Grid.from_aggregates(rows, START, (DAYS + 1) * 24)
+
+
+def test_forecast_per_location_with_pooled_fallback_and_cached_models(tmp_path):
+    """A location with a week of history gets its own model, a young one the pooled model; refits are cached"""
+    grid = _grid()
+    cache = ModelCache(tmp_path)
+
+    result = forecast(grid, train_hours=DAYS * 24, horizon=24, cache=cache)
+
+    assert {name: f["scope"] for name, f in result.items()} == {"Office": "location", "Annex": "pooled"}
+    office = result["Office"]["hourly_kwh"]  # Friday 2026-03-13
+    assert office[10] == pytest.approx(3.0, abs=0.3)
+    assert office[2] == pytest.approx(1.0, abs=0.3)
+    assert cache.fits == 2 and len(list(tmp_path.glob("*.joblib"))) == 2
+
+    reloaded = ModelCache(tmp_path)
+    assert forecast(grid, train_hours=DAYS * 24, horizon=24, cache=reloaded) == result
+    assert (reloaded.fits, reloaded.disk_hits) == (0, 2)
+
+
+def test_allocate_splits_a_location_by_rated_power():
+    """Devices share their location's forecast in proportion to rated power; unknown locations are skipped"""
+    forecasts = {"Lab": {"total_kwh": 10.0}}
+    devices = [
+        {"device_id": "A", "location": "Lab", "rated_power_watts": 250},
+        {"device_id": "B", "location": "Lab", "rated_power_watts": 750},
+        {"device_id": "C", "location": "Attic", "rated_power_watts": 100},
+    ]
+
+    assert [(d["device_id"], kwh) for d, kwh, _ in allocate(devices, forecasts)] == [("A", 2.5), ("B", 7.5)]
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from app.services.heartbeat_service import (
+    HEARTBEAT_MIN_SILENCE_SECONDS,
+    heartbeat_updates,
+    liveness,
+    silence_limit,
+    sweep_module,
+)
+
+NOW = datetime(2026, 3, 2, 9, 0)
+
+
+def test_a_batch_is_one_upsert_per_module_with_the_latest_vitals():
+    """Vitals come from the newest reading, whatever the batch order"""
+    docs = [
+        {"module": "MOD-1", "location": "Lab", "uptime": 900, "rssi": -70, "received_at": NOW},
+        {"module": "MOD-1", "location": "Lab", "uptime": 840, "rssi": -65, "received_at": NOW - timedelta(minutes=1)},
+        {"module": "MOD-2", "location": "Hall", "wifi_rssi": -80, "received_at": NOW},
+    ]
+
+    ops = {op._filter["_id"]: op._doc for op in heartbeat_updates("occupancy", docs)}
+
+    assert set(ops) == {"MOD-1", "MOD-2"}
+    assert ops["MOD-1"]["$inc"] == {"readings": 2, "counts.occupancy": 2}
+    assert ops["MOD-1"]["$set"]["vitals.uptime"] == 900
+    assert ops["MOD-1"]["$min"] == {"first_seen": NOW - timedelta(minutes=1)}
+    assert ops["MOD-2"]["$set"]["vitals.rssi"] == -80
+
+
+def test_silence_past_the_limit_goes_offline_once():
+    """The first sweep after the limit reports the transition; later ones do not"""
+    doc = {"_id": "MOD-1", "status": "online", "readings": 10, "last_seen": NOW,
+           "sweep": {"readings": 10, "last_seen": NOW, "uptime": None, "sources": {}}}
+    later = NOW + timedelta(seconds=silence_limit(doc) + 1)
+
+    assert sweep_module(doc, NOW + timedelta(seconds=30)) is None
+    result = sweep_module(doc, later)
+    assert result["transition"] == "offline"
+    assert result["set"]["offline_since"] == NOW
+    assert sweep_module({**doc, **result["set"]}, later + timedelta(minutes=5)) is None
+
+
+def test_interval_is_learned_and_restarts_are_counted():
+    """Six readings in 60 s is a 10 s interval; uptime going backwards is a restart"""
+    doc = {"_id": "MOD-1", "status": "online", "readings": 16, "last_seen": NOW, "vitals": {"uptime": 5},
+           "counts": {"energy": 16}, "sources": {"energy": NOW},
+           "sweep": {"readings": 10, "last_seen": NOW - timedelta(seconds=60), "uptime": 3600,
+                     "sources": {"energy": {"readings": 10, "last_seen": NOW - timedelta(seconds=60)}}}}
+
+    result = sweep_module(doc, NOW)
+
+    assert result["set"]["interval_seconds"] == 10.0
+    assert result["restarted"] is True
+    assert liveness({**doc, **result["set"]}, NOW)["offline_after_seconds"] == HEARTBEAT_MIN_SILENCE_SECONDS
+
+
+def test_interval_is_learned_per_source():
+    """Energy every 30 s and occupancy every 60 s interleave at 20 s, but the module is expected every 60 s"""
+    before = NOW - timedelta(minutes=5)
+    doc = {"_id": "MOD-1", "status": "online", "readings": 25, "last_seen": NOW,
+           "counts": {"energy": 15, "occupancy": 10}, "sources": {"energy": NOW, "occupancy": NOW},
+           "sweep": {"readings": 10, "last_seen": before, "uptime": None, "sources": {
+               "energy": {"readings": 5, "last_seen": before},
+               "occupancy": {"readings": 5, "last_seen": before},
+           }}}
+
+    result = sweep_module(doc, NOW)
+
+    assert result["set"]["intervals"] == {"energy": 30.0, "occupancy": 60.0}
+    assert result["set"]["interval_seconds"] == 60.0
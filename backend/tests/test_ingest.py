@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from pymongo.errors import PyMongoError
+
+from app.main import app
+from app.services import anomaly_service, catalog_service, heartbeat_service, ingest_service, sketch_service
+from routes import ingest
+
+client = TestClient(app)
+
+
+def _capture(monkeypatch, name):
+    stored = []
+
+    async def fake(docs):
+        stored.extend(docs)
+        return len(docs)
+
+    monkeypatch.setenv("API_KEY", "test-key")
+    monkeypatch.setattr(ingest, name, fake)
+    return stored
+
+
+def test_telemetry_accepts_the_legacy_payload_and_stamps_the_server_time(monkeypatch):
+    """Only module, location, rcwl and pir are required, as in voltguard-api; the device clock is kept aside"""
+    stored = _capture(monkeypatch, "ingest_occupancy")
+    before = datetime.utcnow()
+
+    response = client.post(
+        "/api/v1/telemetry",
+        json={"module": "MOD-1", "location": "Lab", "rcwl": 1, "pir": 0, "received_at": "2001-01-01T00:00:00Z"},
+        headers={"X-API-Key": "test-key"},
+    )
+
+    assert response.status_code == 201
+    doc = stored[0]
+    assert "temperature" not in doc
+    assert doc["received_at"] >= before
+    assert doc["device_time"].year == 2001
+    assert doc["source"] == "esp8266"
+
+
+def test_current_readings_are_stamped_too(monkeypatch):
+    """Energy batches get the same server-side received_at"""
+    stored = _capture(monkeypatch, "ingest_energy")
+
+    response = client.post(
+        "/api/v1/current",
+        json=[{"module": "MOD-2", "location": "Lab", "current_ma": 1200}, {"module": "MOD-2", "location": "Lab", "current_ma": 900}],
+        headers={"X-API-Key": "test-key"},
+    )
+
+    assert response.status_code == 201
+    assert len({doc["received_at"] for doc in stored}) == 1
+    assert all(doc["source"] == "esp32" for doc in stored)
+
+
+def test_a_failed_derived_update_does_not_fail_a_stored_batch(monkeypatch):
+    """The readings are stored, so a catalog error is counted rather than raised to the device"""
+    updated = []
+
+    class _Collection:
+        async def insert_many(self, docs):
+            pass
+
+    async def failing(source, docs):
+        raise PyMongoError("catalog unavailable")
+
+    async def recording(source, docs):
+        updated.append(source)
+
+    monkeypatch.setattr(ingest_service, "energy_col", _Collection())
+    monkeypatch.setattr(catalog_service, "record_readings", failing)
+    monkeypatch.setattr(heartbeat_service, "record_readings", recording)
+    monkeypatch.setattr(sketch_service, "record_readings", recording)
+    monkeypatch.setattr(anomaly_service.detector, "observe", recording)
+
+    stored = asyncio.run(ingest_service.ingest_energy([{"module": "MOD-1", "location": "Lab", "current_a": 1.0}]))
+
+    assert stored == 1
+    assert updated == ["energy"] * 3
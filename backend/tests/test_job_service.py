@@ -0,0 +1,82 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import job_service, report_service
+from app.services.job_service import JobWorker, cache_key
+from app.services.report_service import REPORTS
+
+
+def test_equivalent_requests_share_a_cache_key():
+    """Defaults resolve to concrete values and key order does not matter"""
+    report = REPORTS["fault_correlation"]
+    today = date.today().isoformat()
+    implicit = report.normalize({})
+    explicit = report.normalize({"window_minutes": 120, "end": today, "days": 7})
+
+    assert implicit == explicit == {"days": 7, "end": today, "window_minutes": 120}
+    assert cache_key(report.name, implicit, "closed") == cache_key(report.name, dict(reversed(list(explicit.items()))), "closed")
+    assert cache_key(report.name, implicit, "closed") != cache_key(report.name, implicit, "42/-")
+
+
+def test_invalid_parameters_are_rejected():
+    """Out-of-range values and reversed windows fail before anything is queued"""
+    with pytest.raises(ValueError):
+        REPORTS["zone_monthly_kwh"].normalize({"month": "2026-13"})
+    with pytest.raises(ValueError):
+        REPORTS["vacant_energy_waste"].normalize({"start": "2026-03-10", "end": "2026-03-01"})
+
+
+def test_vacant_energy_waste_splits_kwh_by_occupancy(monkeypatch):
+    """Hours with no motion count as vacant, hours without occupancy data as unknown"""
+    day = datetime(2026, 3, 2)
+    hours = [day + timedelta(hours=h) for h in range(3)]
+
+    async def fake_aggregates(start, end):
+        if start != day:
+            return {"energy": [], "occupancy": []}
+        return {
+            "energy": [{"_id": {"location": "Lab", "hour": h}, "kwh": 2.0} for h in hours],
+            "occupancy": [
+                {"_id": {"location": "Lab", "hour": hours[0]}, "occupancy": 0.0},
+                {"_id": {"location": "Lab", "hour": hours[1]}, "occupancy": 0.5},
+            ],
+        }
+
+    progress = []
+
+    async def record(fraction, message):
+        progress.append(fraction)
+
+    monkeypatch.setattr(report_service, "hourly_aggregates", fake_aggregates)
+    params = REPORTS["vacant_energy_waste"].normalize({"start": "2026-03-01", "end": "2026-03-03"})
+    result = asyncio.run(report_service.vacant_energy_waste(params, record))
+
+    assert result["rows"] == [{
+        "location": "Lab", "total_kwh": 6.0, "vacant_kwh": 2.0, "unknown_kwh": 2.0,
+        "vacant_hours": 1, "occupied_hours": 1, "vacant_share": 0.3333,
+    }]
+    assert progress[-1] == 1.0
+
+
+def test_a_running_job_sends_heartbeats_without_progress_calls(monkeypatch):
+    """A report that is silent between progress calls is not mistaken for a dead worker"""
+    writes = []
+
+    class _Collection:
+        async def update_one(self, query, update):
+            writes.append(update["$set"])
+
+    async def silent(params, progress):
+        await asyncio.sleep(0.05)
+        return {"rows": []}
+
+    monkeypatch.setattr(job_service, "jobs_col", _Collection())
+    monkeypatch.setattr(job_service, "JOB_HEARTBEAT_SECONDS", 0.01)
+    monkeypatch.setitem(REPORTS, "silent", SimpleNamespace(run=silent))
+    asyncio.run(JobWorker().run_job({"_id": "job-1", "report": "silent", "params": {}}))
+
+    assert len([w for w in writes if set(w) == {"heartbeat_at"}]) >= 2
+    assert writes[-1]["status"] == "done"
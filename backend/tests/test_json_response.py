@@ -0,0 +1,20 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+
+from utils.json_response import FastJSONResponse
+
+
+def test_fast_json_response_encodes_stored_document_types():
+    """Raw Mongo documents render without a jsonable_encoder pass"""
+    oid = ObjectId()
+    doc = {
+        "_id": oid,
+        "received_at": datetime(2026, 3, 1, 12, 0, 0),
+        "energy_kwh": Decimal128("1.25"),
+        "price": Decimal("0.5"),
+    }
+    body = json.loads(FastJSONResponse([doc]).body)
+    assert body == [{"_id": str(oid), "received_at": "2026-03-01T12:00:00", "energy_kwh": 1.25, "price": 0.5}]
@@ -0,0 +1,27 @@
+import time
+
+from utils.jwt_handler import _AuthCache
+
+
+def test_auth_cache_entry_never_outlives_token_exp():
+    """Cached identities expire with the token even when the TTL is longer"""
+    cache = _AuthCache(max_entries=4, ttl_seconds=3600)
+    cache.put("expired", {"exp": time.time() - 1}, {"user_id": "u1"})
+    cache.put("valid", {"exp": time.time() + 60}, {"user_id": "u1"})
+
+    assert cache.get("expired") is None
+    assert cache.get("valid")[1] == {"user_id": "u1"}
+
+
+def test_auth_cache_evicts_lru_and_invalidates_by_user():
+    """The cache stays bounded and drops every token of an updated user"""
+    cache = _AuthCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", {}, {"user_id": "u1"})
+    cache.put("b", {}, {"user_id": "u2"})
+    cache.get("a")
+    cache.put("c", {}, {"user_id": "u1"})
+
+    assert cache.get("b") is None
+    cache.invalidate_user("u1")
+    assert cache.get("a") is None and cache.get("c") is None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from utils.command_metrics import CommandMetricsListener
+from utils.metrics import Histogram, mongo_command_duration
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Bucket counts are cumulative and end with +Inf, as Prometheus expects"""
+    histogram = Histogram("test_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "/zones/")
+
+    lines = histogram.render()
+    assert 'test_seconds_bucket{route="/zones/",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/zones/",le="1"} 2' in lines
+    assert 'test_seconds_bucket{route="/zones/",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="/zones/"} 3' in lines
+
+
+def test_command_listener_labels_by_collection_and_command():
+    """The collection comes from the started event, getMore included"""
+    listener = CommandMetricsListener()
+    mongo_command_duration.clear()
+    for request_id, name, command in (
+        (1, "find", {"find": "energy_readings"}),
+        (2, "getMore", {"getMore": 123, "collection": "energy_readings"}),
+    ):
+        event = SimpleNamespace(
+            connection_id=("localhost", 27017), request_id=request_id,
+            command_name=name, command=command, duration_micros=1500,
+        )
+        listener.started(event)
+        listener.succeeded(event)
+
+    rendered = "\n".join(mongo_command_duration.render())
+    assert 'collection="energy_readings",command="find"' in rendered
+    assert 'collection="energy_readings",command="getMore"' in rendered
+    assert not listener._pending
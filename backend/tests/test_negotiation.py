@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+import msgpack
+
+from utils.negotiation import (
+    COLUMNAR_MSGPACK,
+    JSON,
+    MSGPACK,
+    choose_encoding,
+    choose_media_type,
+    columnarize,
+    encode,
+)
+
+
+def test_accept_header_picks_highest_quality_supported_type():
+    """Unknown types are skipped and q-values decide between known ones"""
+    assert choose_media_type(None) == (JSON, False)
+    assert choose_media_type("text/html, application/msgpack;q=0.9, application/json;q=0.5") == (MSGPACK, False)
+    assert choose_media_type("application/vnd.voltguard.columnar+msgpack") == (COLUMNAR_MSGPACK, True)
+    assert choose_encoding("gzip, br;q=0") == "gzip"
+    assert choose_encoding("identity") is None
+
+
+def test_columnar_layout_keeps_missing_fields_aligned():
+    """Each field becomes one array with a null wherever a row lacks it"""
+    rows = [{"module": "m1", "current_a": 1.5}, {"module": "m2", "sensor": "ACS712"}]
+    payload = columnarize({"device_id": "d1", "readings": rows})
+    assert payload == {
+        "device_id": "d1",
+        "readings": {
+            "count": 2,
+            "fields": {"module": ["m1", "m2"], "current_a": [1.5, None], "sensor": [None, "ACS712"]},
+        },
+    }
+
+
+def test_empty_row_lists_keep_the_columnar_shape():
+    """An empty page is still a page"""
+    assert columnarize([]) == {"count": 0, "fields": {}}
+    assert columnarize({"modules": []}) == {"modules": {"count": 0, "fields": {}}}
+
+
+def test_msgpack_encodes_naive_datetimes_as_utc_timestamps():
+    body = encode([{"received_at": datetime(2026, 3, 1, 12, 0)}], MSGPACK)
+    decoded = msgpack.unpackb(body, timestamp=3)
+    assert decoded == [{"received_at": datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)}]
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from utils.pagination import DESCENDING, _after, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips_timestamp_and_object_id():
+    """Cursors are opaque but decode back to the exact page key"""
+    ts = datetime(2026, 3, 1, 12, 30, 15, 250000)
+    oid = ObjectId()
+    assert decode_cursor(encode_cursor(ts, oid)) == (ts, oid)
+    assert decode_cursor(encode_cursor(None, oid)) == (None, oid)
+
+
+def test_invalid_cursor_is_rejected():
+    """A tampered cursor is a client error, not a server crash"""
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_descending_page_keeps_rows_without_timestamp_for_the_end():
+    """Rows missing the timestamp field are still reachable after the dated ones"""
+    ts, oid = datetime(2026, 1, 1), ObjectId()
+    query = _after("received_at", ts, oid, DESCENDING)
+    assert {"received_at": None} in query["$or"]
+    assert _after("received_at", None, oid, DESCENDING) == {
+        "$or": [{"received_at": None, "_id": {"$lt": oid}}]
+    }
@@ -0,0 +1,120 @@
+import os
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+import database
+from app.main import app
+from app.services import baseline_service, fault_scan_service, heartbeat_service, job_service
+from benchmarks.bench_api import BACKGROUND_WORKER_FLAGS
+from benchmarks.fleet import Fleet, FleetSpec
+from tests.query_budget import CommandRecorder, query_budget
+from utils.jwt_handler import create_access_token
+from utils.slow_queries import slow_query_recorder
+
+BUDGET_DB_NAME = "volt_guard_query_budget"
+# Hot routes and the most commands each may send, whatever the data size
+ROUTE_BUDGETS = {
+    "/faults/analytics/patterns": 2,
+    "/faults/analytics/predictive-warnings": 4,
+    "/faults/device-health": 3,
+}
+
+
+def _mongo_client():
+    client = MongoClient(os.getenv("MONGO_URI"), serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        return None
+    return client
+
+
+def _seed(db, faults: int):
+    fleet = Fleet(FleetSpec(locations=2, modules=4, days=0.1, faults=faults, anomalies=0))
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+    db.devices.insert_many([dict(d) for d in fleet.devices])
+    db.faults.insert_many(fleet.faults())
+    db.predictions.insert_many(fleet.predictions())
+    db.occupancy_telemetry.insert_many(list(fleet.occupancy_readings()))
+    # Device-keyed readings, as read by the predictive warnings and device health checks
+    db.energy_readings.insert_many([
+        {"device_id": d["device_id"], "timestamp": fleet.spec.end - timedelta(minutes=i),
+         "power_kwh": 0.4, "temperature": 31.0, "voltage": 225.0 + i * 3}
+        for d in fleet.devices for i in range(12)
+    ])
+    db.users.insert_one({"user_id": "budget-admin", "name": "Budget", "email": "budget@example.com", "role": "admin"})
+
+
+@pytest.fixture(scope="module", params=[20, 400], ids=lambda n: f"{n}-faults")
+def budget_app(request):
+    """The app on a seeded database, with a CommandRecorder on its Mongo client"""
+    mongo = _mongo_client()
+    if mongo is None:
+        pytest.skip("MongoDB is not reachable at MONGO_URI")
+    _seed(mongo[BUDGET_DB_NAME], request.param)
+    recorder = CommandRecorder()
+    client_options = database._client_options
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("MONGODB_DB_NAME", BUDGET_DB_NAME)
+        mp.setattr(database, "_client", None)
+        mp.setattr(database, "_db", None)
+        mp.setattr(database, "_client_options", lambda: {
+            **client_options(), "event_listeners": [*client_options()["event_listeners"], recorder],
+        })
+        # Background explains would be counted against whichever route is running
+        mp.setattr(slow_query_recorder, "threshold_ms", float("inf"))
+        # So would the background workers' commands. The flags are read when each
+        # worker starts, and the app may already be imported by another test module
+        for service in (fault_scan_service, job_service, baseline_service, heartbeat_service):
+            for flag in BACKGROUND_WORKER_FLAGS:
+                if hasattr(service, flag):
+                    mp.setattr(service, flag, False)
+        with TestClient(app) as client:
+            headers = {"Authorization": f"Bearer {create_access_token({'user_id': 'budget-admin', 'role': 'admin'})}"}
+            # Verifies the token once so the auth lookup is cached before measuring
+            client.get("/faults/model-stats", headers=headers)
+            yield client, recorder, headers
+
+    mongo.drop_database(BUDGET_DB_NAME)
+    mongo.close()
+
+
+@pytest.mark.parametrize("path", list(ROUTE_BUDGETS))
+def test_hot_routes_stay_within_round_trip_budget(budget_app, path):
+    """The command count of each hot route does not grow with the number of faults or devices"""
+    client, recorder, headers = budget_app
+    with query_budget(recorder, max_commands=ROUTE_BUDGETS[path]):
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+
+
+def _event(request_id, name, command=None, reply=None):
+    return SimpleNamespace(
+        connection_id=("localhost", 27017), request_id=request_id, command_name=name,
+        command=command or {}, reply=reply or {},
+    )
+
+
+def test_query_budget_lists_the_offending_commands():
+    """A block over budget fails with every command it sent, in order"""
+    recorder = CommandRecorder()
+
+    with pytest.raises(AssertionError) as exc:
+        with query_budget(recorder, max_commands=1):
+            recorder.started(_event(1, "hello"))
+            recorder.succeeded(_event(1, "hello"))
+            for request_id in (2, 3):
+                recorder.started(_event(request_id, "find", {"find": "devices", "filter": {"device_id": "d1"}}))
+                recorder.succeeded(_event(request_id, "find", reply={"cursor": {"firstBatch": [{}], "id": 0}}))
+
+    message = str(exc.value)
+    assert "2 commands (budget 1)" in message
+    assert "2. find devices -> 1 docs  filter={'device_id': 'd1'}" in message
@@ -0,0 +1,66 @@
+import asyncio
+
+from app.services import realtime_service
+from app.services.realtime_service import Subscription, ZoneEventHub
+
+
+def test_zone_events_only_carry_changed_fields():
+    """Repeated identical readings produce no event; a flip sends just the delta"""
+    hub = ZoneEventHub()
+    reading = {"location": "Lab", "module": "m1", "rcwl": 1, "pir": 0, "temperature": 22.0, "humidity": 40.0}
+    assert hub.to_event("occupancy_telemetry", reading)["changes"]["occupancy"] is True
+    assert hub.to_event("occupancy_telemetry", dict(reading)) is None
+
+    event = hub.to_event("occupancy_telemetry", {**reading, "rcwl": 0})
+    assert event["changes"] == {"occupancy": False, "rcwl": 0}
+
+
+def test_slow_subscriber_is_told_to_resync_instead_of_blocking():
+    """A full queue is discarded and replaced by a resync marker"""
+
+    async def scenario():
+        subscription = Subscription(locations=["Lab"], maxsize=2)
+        subscription.offer({"type": "energy", "location": "Office"})
+        for i in range(3):
+            subscription.offer({"type": "energy", "location": "Lab", "current_a": i})
+
+        assert await subscription.next() == {"type": "resync", "dropped": 2}
+        assert (await subscription.next())["current_a"] == 2
+        assert await subscription.next(timeout=0.01) is None
+
+    asyncio.run(scenario())
+
+
+def test_malformed_readings_are_coerced_instead_of_raising():
+    """Null or non-numeric flags and currents read as missing"""
+    hub = ZoneEventHub()
+    zone = hub.to_event("occupancy_telemetry", {"location": "Lab", "rcwl": None, "pir": "yes"})
+    assert zone["changes"]["occupancy"] is False and zone["changes"]["pir"] == 0
+
+    energy = hub.to_event("energy_readings", {"location": "Lab", "current_a": "n/a", "current_ma": "1500"})
+    assert energy["current_a"] == 1.5
+
+
+def test_reader_survives_unexpected_errors(monkeypatch):
+    """A crash in the shared reader is logged and retried, not fatal"""
+    monkeypatch.setattr(realtime_service, "REALTIME_RETRY_SECONDS", 0)
+    monkeypatch.setattr(realtime_service.database, "supports_change_streams", False)
+    hub = ZoneEventHub()
+    calls = []
+
+    async def poll():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError("bad document")
+        raise asyncio.CancelledError
+
+    hub._poll = poll
+
+    async def scenario():
+        try:
+            await hub._run()
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
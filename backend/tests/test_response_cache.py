@@ -0,0 +1,44 @@
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from utils import response_cache as rc
+
+
+def _app(calls):
+    async def zones(request):
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return JSONResponse([{"location": "Lab"}])
+
+    return rc.ResponseCacheMiddleware(Starlette(routes=[Route("/zones/", zones)]))
+
+
+async def _role(self, scope):
+    return "user"
+
+
+def test_concurrent_misses_are_coalesced_and_etag_revalidates(monkeypatch):
+    """Ten identical polls run the route once; a matching If-None-Match gets 304"""
+    monkeypatch.setattr(rc.ResponseCacheMiddleware, "_caller_role", _role)
+    monkeypatch.setattr(rc, "response_cache", rc.ResponseCache(max_entries=8))
+    calls = []
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=_app(calls))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*[client.get("/zones/") for _ in range(10)])
+            etag = responses[0].headers["etag"]
+            revalidated = await client.get("/zones/", headers={"If-None-Match": etag})
+            return responses, revalidated
+
+    responses, revalidated = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert all(r.json() == [{"location": "Lab"}] for r in responses)
+    assert revalidated.status_code == 304
+    stats = rc.response_cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == 9 and stats["not_modified"] == 1
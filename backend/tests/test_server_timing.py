@@ -0,0 +1,30 @@
+import asyncio
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+from utils.json_response import FastJSONResponse
+from utils.server_timing import ServerTimingMiddleware, add_db_time
+
+
+def test_server_timing_header_splits_db_serialization_and_app_time():
+    """DB time reported by the command listener and render time show up separately"""
+
+    async def energy(request):
+        add_db_time(12.5)
+        add_db_time(2.5)
+        return FastJSONResponse([{"current_a": 1.0}] * 1000)
+
+    app = ServerTimingMiddleware(Starlette(routes=[Route("/energy/latest", energy)]))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/energy/latest")
+
+    header = asyncio.run(scenario()).headers["server-timing"]
+    parts = dict(part.split(";", 1) for part in header.split(", "))
+    assert parts["db"] == 'dur=15.0;desc="2 commands"'
+    assert float(parts["ser"].split("=")[1]) > 0
+    assert set(parts) == {"db", "ser", "app", "total"}
@@ -0,0 +1,119 @@
+import asyncio
+import random
+from datetime import datetime
+
+from app.services import sketch_service
+from app.services.sketch_service import SKETCH_RELATIVE_ACCURACY, QuantileSketch, sketch_updates
+
+
+def _exact(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_quantiles_stay_within_the_relative_accuracy():
+    """Every percentile of a skewed sample is within the configured relative error"""
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 1.5) for _ in range(5000)]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.01, 0.5, 0.9, 0.95, 0.99, 1.0):
+        exact = _exact(values, q)
+        assert abs(sketch.quantile(q) - exact) <= SKETCH_RELATIVE_ACCURACY * exact + 1e-12
+
+
+def test_merged_sketches_equal_one_sketch_of_all_values():
+    """Merging per-hour sketches gives the same answer as sketching everything at once"""
+    rng = random.Random(3)
+    hours = [[rng.uniform(-5, 40) for _ in range(300)] for _ in range(4)]
+    whole, merged = QuantileSketch(), QuantileSketch()
+    for values in hours:
+        part = QuantileSketch()
+        for value in values:
+            part.add(value)
+            whole.add(value)
+        merged.merge(part)
+
+    assert (merged.positive, merged.negative, merged.zero, merged.count) == (whole.positive, whole.negative, whole.zero, whole.count)
+    assert merged.quantile(0.05) < 0 < merged.quantile(0.95)
+
+
+def test_a_batch_becomes_one_increment_per_location_module_and_hour():
+    """Readings of the same hour are folded into a single $inc upsert"""
+    docs = [
+        {"module": "MOD-1", "location": "Lab", "current_a": 2.0, "received_at": datetime(2026, 3, 2, 9, 5)},
+        {"module": "MOD-1", "location": "Lab", "current_ma": 0, "received_at": datetime(2026, 3, 2, 9, 50)},
+        {"module": "MOD-1", "location": "Lab", "current_a": 2.0, "received_at": datetime(2026, 3, 2, 10, 1)},
+    ]
+
+    ops = sketch_updates("energy", docs)
+
+    assert len(ops) == 2
+    first = ops[0]._doc
+    assert first["$inc"]["current.count"] == 2
+    assert first["$inc"]["current.zero"] == 1
+    assert first["$min"] == {"current.min": 0.0} and first["$max"] == {"current.max": 2.0}
+
+
+def test_rebuild_skips_batches_without_usable_values(monkeypatch):
+    """A full batch of readings with no metrics writes nothing instead of an empty bulk write"""
+    writes = []
+
+    class _Readings:
+        def __init__(self, docs):
+            self.docs = docs
+
+        def find(self, query, projection):
+            async def rows():
+                for doc in self.docs:
+                    yield doc
+            return rows()
+
+    class _Sketches:
+        async def delete_many(self, query):
+            pass
+
+        async def bulk_write(self, ops, ordered=True):
+            assert ops
+            writes.append(len(ops))
+
+    hour = datetime(2026, 3, 2, 8)
+    energy = [{"location": "Lab", "module": "m1", "received_at": hour}] * 3 + [{"location": "Lab", "module": "m1", "received_at": hour, "current_a": 1.0}]
+    monkeypatch.setattr(sketch_service, "REBUILD_BATCH", 3)
+    monkeypatch.setattr(sketch_service, "sketches_col", _Sketches())
+    monkeypatch.setitem(sketch_service.SOURCES, "energy", (_Readings(energy), ("current",)))
+    monkeypatch.setitem(sketch_service.SOURCES, "occupancy", (_Readings([]), ("temperature", "humidity")))
+
+    counts = asyncio.run(sketch_service.rebuild(hour, datetime(2026, 3, 2, 9)))
+
+    assert counts == {"energy": 4, "occupancy": 0}
+    assert writes == [1]
+
+
+def test_rebuild_widens_a_mid_hour_end_to_the_whole_hour(monkeypatch):
+    """The hour that contains ``end`` is deleted whole, so all of its readings are read back"""
+    queries = []
+
+    class _Readings:
+        def find(self, query, projection):
+            queries.append(query)
+
+            async def rows():
+                return
+                yield
+            return rows()
+
+    class _Sketches:
+        async def delete_many(self, query):
+            queries.append(query)
+
+    monkeypatch.setattr(sketch_service, "sketches_col", _Sketches())
+    monkeypatch.setitem(sketch_service.SOURCES, "energy", (_Readings(), ("current",)))
+    monkeypatch.setitem(sketch_service.SOURCES, "occupancy", (_Readings(), ("temperature", "humidity")))
+
+    asyncio.run(sketch_service.rebuild(datetime(2026, 3, 2, 8, 20), datetime(2026, 3, 2, 9, 30)))
+
+    bounds = {"$gte": datetime(2026, 3, 2, 8), "$lt": datetime(2026, 3, 2, 10)}
+    assert queries == [{"hour": bounds}, {"received_at": bounds}, {"received_at": bounds}]
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from utils.slow_queries import SlowQueryRecorder, command_shape
+
+EXPLAIN = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "location_1_received_at_-1__id_-1"},
+        }
+    },
+    "executionStats": {"nReturned": 50, "executionTimeMillis": 120, "totalKeysExamined": 50, "totalDocsExamined": 50},
+}
+
+
+class _FakeCollection:
+    def __init__(self, stored):
+        self.stored = stored
+
+    async def insert_one(self, doc):
+        self.stored.append(doc)
+
+
+class _FakeDatabase:
+    def __init__(self):
+        self.stored = []
+        self.explains = []
+
+    async def create_collection(self, name, **options):
+        pass
+
+    async def command(self, command):
+        self.explains.append(command)
+        return EXPLAIN
+
+    def __getitem__(self, name):
+        return _FakeCollection(self.stored)
+
+
+def test_shape_redacts_values_but_keeps_operators_and_sort():
+    """Literal values never reach the log; structure and sort order do"""
+    shape = command_shape("aggregate", {
+        "aggregate": "energy_readings",
+        "pipeline": [
+            {"$match": {"location": "Lab", "received_at": {"$gte": datetime(2026, 1, 1)}, "module": {"$in": ["a", "b"]}}},
+            {"$sort": {"received_at": -1}},
+            {"$group": {"_id": "$location", "doc": {"$first": "$$ROOT"}}},
+        ],
+    })
+    assert shape == {"pipeline": [
+        {"$match": {"location": "?", "received_at": {"$gte": "?"}, "module": {"$in": ["?"]}}},
+        {"$sort": {"received_at": -1}},
+        {"$group": {"_id": "$location", "doc": {"$first": "$$ROOT"}}},
+    ]}
+
+
+def test_slow_commands_are_explained_once_per_shape():
+    """Repeated slow queries of one shape are all logged but only explained once"""
+
+    async def scenario():
+        db = _FakeDatabase()
+        recorder = SlowQueryRecorder(threshold_ms=100)
+        await recorder.start(db)
+        for request_id, duration in ((1, 250_000), (2, 300_000), (3, 5_000)):
+            command = {"find": "energy_readings", "filter": {"location": f"Lab-{request_id}"}, "lsid": {}, "$db": "vg"}
+            event = SimpleNamespace(
+                connection_id=("db", 27017), request_id=request_id, command_name="find",
+                command=command, duration_micros=duration, reply={"cursor": {"firstBatch": [{}] * 50}},
+            )
+            recorder.started(event)
+            recorder.succeeded(event)
+        await asyncio.sleep(0.01)
+        await recorder.stop()
+        return db
+
+    db = asyncio.run(scenario())
+    assert len(db.stored) == 2
+    assert db.stored[0]["shape"] == {"filter": {"location": "?"}}
+    assert db.stored[0]["explain"]["plan"] == "FETCH > IXSCAN(location_1_received_at_-1__id_-1)"
+    assert db.stored[1]["explain"] == {"skipped": "recently_explained"}
+    assert db.explains == [{"explain": {"find": "energy_readings", "filter": {"location": "Lab-1"}}, "verbosity": "executionStats"}]
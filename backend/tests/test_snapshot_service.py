@@ -0,0 +1,74 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("pandas")
+
+from app.services import snapshot_service
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = list(docs)
+
+    def sort(self, *args):
+        return self
+
+    def batch_size(self, *args):
+        return self
+
+    async def to_list(self, length):
+        batch, self._docs = self._docs[:length], self._docs[length:]
+        return batch
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return _Cursor(self.docs)
+
+
+def _write(monkeypatch, docs, day):
+    monkeypatch.setitem(snapshot_service.DATASETS["occupancy_telemetry"], "collection", _Collection(docs))
+    return asyncio.run(snapshot_service.write_day("occupancy_telemetry", day))
+
+
+def test_day_round_trips_and_a_rewrite_replaces_the_partition(monkeypatch, tmp_path):
+    """A rewritten day holds only the new rows"""
+    monkeypatch.setattr(snapshot_service, "SNAPSHOT_DIR", tmp_path)
+    day = date(2026, 3, 1)
+    first = [{"received_at": datetime(2026, 3, 1, h), "module": "M1", "location": "Lab", "rcwl": 1, "pir": 0, "temperature": 24.5} for h in range(3)]
+    assert _write(monkeypatch, first, day) == 3
+
+    frame = snapshot_service.load_range("occupancy_telemetry", day, day)
+    assert len(frame) == 3
+    assert list(frame["location"].astype(str).unique()) == ["Lab"]
+    assert frame["temperature"].tolist() == [24.5] * 3
+
+    second = [{"received_at": datetime(2026, 3, 1, 5), "module": "M2", "location": "Hall", "rcwl": 0, "pir": 1}]
+    assert _write(monkeypatch, second, day) == 1
+
+    frame = snapshot_service.load_range("occupancy_telemetry", day, day)
+    assert frame["module"].astype(str).tolist() == ["M2"]
+    assert snapshot_service.list_snapshots("occupancy_telemetry") == ["2026-03-01"]
+
+
+def test_values_outside_the_column_type_are_stored_as_null(monkeypatch, tmp_path):
+    """Out-of-range or fractional integers become nulls instead of failing the day"""
+    monkeypatch.setattr(snapshot_service, "SNAPSHOT_DIR", tmp_path)
+    day = date(2026, 3, 2)
+    docs = [
+        {"received_at": datetime(2026, 3, 2, 1), "rcwl": 300, "pir": 1.5, "uptime": 2 ** 70, "heap": 4096.0},
+        {"received_at": datetime(2026, 3, 2, 2), "rcwl": True, "pir": "1", "uptime": 12},
+    ]
+    assert _write(monkeypatch, docs, day) == 2
+
+    frame = snapshot_service.load_range("occupancy_telemetry", day, day)
+    assert frame["rcwl"].isna().tolist() == [True, False]
+    assert frame["pir"].isna().all()
+    assert frame["uptime"].iloc[1] == 12 and frame["uptime"].isna().iloc[0]
+    assert frame["heap"].iloc[0] == 4096
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.services import sync_service
+
+OPS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if value is None or not all(OPS[op](value, bound) for op, bound in condition.items()):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return _Cursor([d for d in self.docs if _matches(d, query)])
+
+
+def _setup(monkeypatch, devices, tombstones):
+    monkeypatch.setitem(sync_service.SYNCED, "devices", (devices, "device_id", {}))
+    monkeypatch.setattr(sync_service, "tombstones_col", tombstones)
+
+    async def floor():
+        return 0
+
+    monkeypatch.setattr(sync_service, "_tombstone_floor", floor)
+
+
+def test_changes_pages_by_sequence_and_reports_deletions(monkeypatch):
+    """Only rows above the client's version come back, and has_more caps the version"""
+    devices = _Collection([{"device_id": f"d{i}", "_seq": i} for i in range(1, 6)])
+    tombstones = _Collection([{"collection": "devices", "key": "gone", "_seq": 3}, {"collection": "devices", "key": "d5", "_seq": 4}])
+    _setup(monkeypatch, devices, tombstones)
+
+    first = asyncio.run(sync_service.changes("devices", since=1, limit=2))
+    assert [d["device_id"] for d in first["upserted"]] == ["d2", "d3"]
+    assert first == {**first, "version": 3, "has_more": True, "deleted": ["gone"]}
+
+    rest = asyncio.run(sync_service.changes("devices", since=first["version"], limit=10))
+    # d5 was deleted and re-created, so it is an upsert rather than a deletion
+    assert [d["device_id"] for d in rest["upserted"]] == ["d4", "d5"]
+    assert rest["deleted"] == [] and rest["version"] == 5 and not rest["has_more"]
+
+
+def test_writes_committed_out_of_order_are_not_skipped(monkeypatch):
+    """Seq 3 commits before seq 2; the client is not moved past 2 until both have settled"""
+    old = datetime.utcnow() - timedelta(minutes=5)
+    devices = _Collection([{"device_id": "d1", "_seq": 1, "updated_at": old}])
+    _setup(monkeypatch, devices, _Collection([]))
+
+    # Seq 2 is still in flight when seq 3 becomes visible
+    devices.docs.append({"device_id": "d3", "_seq": 3, "updated_at": datetime.utcnow()})
+    early = asyncio.run(sync_service.changes("devices", since=1))
+    assert early["upserted"] == [] and early["version"] == 1
+
+    snapshot = asyncio.run(sync_service.changes("devices", since=0))
+    assert snapshot["reset"] and snapshot["version"] == 1
+
+    # Seq 2 commits, and both are past the settle window by the next poll
+    devices.docs.append({"device_id": "d2", "_seq": 2, "updated_at": datetime.utcnow()})
+    for doc in devices.docs:
+        doc["updated_at"] = old
+    late = asyncio.run(sync_service.changes("devices", since=early["version"]))
+    assert [d["device_id"] for d in late["upserted"]] == ["d2", "d3"]
+    assert late["version"] == 3
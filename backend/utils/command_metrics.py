@@ -0,0 +1,52 @@
+import threading
+
+from pymongo import monitoring
+
+from utils.metrics import mongo_command_duration, mongo_command_failures
+from utils.server_timing import add_db_time
+
+# Commands whose first value is not a collection name
+_DATABASE_COMMANDS = {"ping", "hello", "isMaster", "ismaster", "buildInfo", "endSessions", "saslStart", "saslContinue"}
+
+
+def _collection(event) -> str:
+    command = event.command
+    if event.command_name == "getMore":
+        return str(command.get("collection", ""))
+    if event.command_name in _DATABASE_COMMANDS:
+        return ""
+    target = command.get(event.command_name)
+    return target if isinstance(target, str) else ""
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Command monitor feeding the Mongo latency histogram. The collection is
+    only known from the started event, so it is parked by request id until
+    the command succeeds or fails.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def started(self, event):
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = _collection(event)
+
+    def _finish(self, event) -> str:
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event):
+        mongo_command_duration.observe(event.duration_micros / 1e6, self._finish(event), event.command_name)
+        add_db_time(event.duration_micros / 1000)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        add_db_time(event.duration_micros / 1000)
+        mongo_command_failures.inc(collection, event.command_name)
+
+
+command_metrics = CommandMetricsListener()
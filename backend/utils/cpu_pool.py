@@ -0,0 +1,219 @@
+"""
+Process pool for CPU-bound analytics.
+
+Handlers ``await cpu_pool.run(fn, arrays={...}, **kwargs)`` instead of calling
+heavy Python inline, so a large report runs in a worker process and the event
+loop keeps serving other requests. ``fn`` must be a module-level function
+(workers import it by name) that takes the arrays and kwargs as keyword
+arguments.
+
+- Inputs travel as NumPy arrays. Above CPU_POOL_SHM_MIN_BYTES they are copied
+  once into a shared memory block that the worker maps, rather than pickled
+  through the pool's pipe. Smaller inputs are pickled, which is cheaper.
+- At most CPU_POOL_MAX_PENDING tasks are queued or running. Past that a
+  request gets 503 with Retry-After, rather than waiting behind a backlog it
+  would time out in anyway.
+- A task that exceeds its timeout gets 504. If it is still queued, it is
+  cancelled. If it is already running, the workers are terminated and the
+  pool restarts on the next call, because a worker cannot be interrupted
+  mid-task.
+- A request that is cancelled (client gone) cancels its task if it has not
+  started yet.
+
+CPU_POOL_WORKERS=0 runs tasks in the thread pool instead, for single-core
+hosts and tests. Workers are started with forkserver, or spawn where that is
+unavailable, so they do not inherit the event loop or open sockets.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+CPU_POOL_MAX_PENDING = int(os.getenv("CPU_POOL_MAX_PENDING", str(max(CPU_POOL_WORKERS, 1) * 4)))
+CPU_POOL_TIMEOUT_SECONDS = float(os.getenv("CPU_POOL_TIMEOUT_SECONDS", "30"))
+CPU_POOL_SHM_MIN_BYTES = int(os.getenv("CPU_POOL_SHM_MIN_BYTES", str(1 << 20)))
+CPU_POOL_START_METHOD = os.getenv(
+    "CPU_POOL_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+
+def _call_shared(fn: Callable, name: str, layout: Dict[str, tuple], kwargs: dict):
+    """Worker side: map the arrays out of shared memory and call ``fn``."""
+    import numpy as np
+
+    from multiprocessing import shared_memory
+
+    # Workers share the parent's resource tracker, so attaching does not make them owners
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        arrays = {
+            key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for key, (offset, shape, dtype) in layout.items()
+        }
+        return fn(**arrays, **kwargs)
+    finally:
+        # Views must be gone before the mapping is closed
+        arrays = None
+        shm.close()
+
+
+def _pack(arrays: dict):
+    """Copy arrays into one shared memory block; returns (block, layout)."""
+    from multiprocessing import shared_memory
+
+    import numpy as np
+
+    layout, offset = {}, 0
+    for key, array in arrays.items():
+        offset = (offset + 63) // 64 * 64
+        layout[key] = (offset, array.shape, array.dtype.str)
+        offset += array.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for key, array in arrays.items():
+        start, shape, dtype = layout[key]
+        np.ndarray(shape, dtype=array.dtype, buffer=shm.buf, offset=start)[...] = array
+    return shm, layout
+
+
+class CpuPool:
+    def __init__(
+        self,
+        workers: int = CPU_POOL_WORKERS,
+        max_pending: int = CPU_POOL_MAX_PENDING,
+        timeout_seconds: float = CPU_POOL_TIMEOUT_SECONDS,
+        shm_min_bytes: int = CPU_POOL_SHM_MIN_BYTES,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout_seconds = timeout_seconds
+        self.shm_min_bytes = shm_min_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.restarts = 0
+        self.shared_bytes = 0
+        self.busy_seconds = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(CPU_POOL_START_METHOD)
+                )
+            return self._executor
+
+    def _restart(self):
+        """Terminate the workers (a running task cannot be cancelled otherwise); the next call starts new ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        self.restarts += 1
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    async def run(self, fn: Callable, arrays: Optional[dict] = None, timeout: Optional[float] = None, **kwargs):
+        """Run ``fn(**arrays, **kwargs)`` off the event loop and return its result."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503, detail="Analytics workers are busy, retry shortly", headers={"Retry-After": "5"}
+            )
+        self.pending += 1
+        self.submitted += 1
+        started = time.perf_counter()
+        try:
+            result = await self._execute(fn, arrays or {}, timeout or self.timeout_seconds, kwargs)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(status_code=504, detail="Analytics computation timed out")
+        except BrokenProcessPool:
+            self.failed += 1
+            self._restart()
+            raise HTTPException(
+                status_code=503, detail="Analytics worker crashed, retry shortly", headers={"Retry-After": "1"}
+            )
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+            self.busy_seconds += time.perf_counter() - started
+        self.completed += 1
+        return result
+
+    async def _execute(self, fn: Callable, arrays: dict, timeout: float, kwargs: dict):
+        if self.workers <= 0:
+            return await asyncio.wait_for(run_in_threadpool(fn, **arrays, **kwargs), timeout)
+        if arrays and sum(a.nbytes for a in arrays.values()) >= self.shm_min_bytes:
+            shm, layout = _pack(arrays)
+            self.shared_bytes += shm.size
+            future = self._pool().submit(_call_shared, fn, shm.name, layout, kwargs)
+            # Released once the worker is done with it, whatever happens to the request meanwhile
+            future.add_done_callback(lambda _: _release(shm))
+        else:
+            future = self._pool().submit(fn, **arrays, **kwargs)
+        try:
+            # Cancelling the wrapper cancels the task too, which only succeeds while it is queued
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            if not future.cancelled():
+                logger.warning("%s exceeded %gs; restarting analytics workers", fn.__name__, timeout)
+                self._restart()
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "restarts": self.restarts,
+            "shared_bytes": self.shared_bytes,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+def _release(shm):
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+cpu_pool = CpuPool()
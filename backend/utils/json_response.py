@@ -0,0 +1,39 @@
+from decimal import Decimal
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+
+from utils.server_timing import serialization_timer
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """orjson encoding with native datetime/UUID/enum support plus Mongo types."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    App-wide JSON response class backed by orjson.
+
+    Read endpoints that forward stored documents return it directly, which
+    also skips FastAPI's jsonable_encoder walk and response_model re-validation.
+    """
+
+    def render(self, content) -> bytes:
+        with serialization_timer():
+            return dumps(content)
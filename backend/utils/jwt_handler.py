@@ -1,4 +1,9 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
+import hashlib
+import os
+import threading
+import time
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
@@ -8,8 +13,96 @@ from database import user_col
 SECRET_KEY = "SMART_ENERGY_SECRET"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024"))
 _bearer_scheme = HTTPBearer(auto_error=False)
 
+
+class _AuthCache:
+    """
+    Bounded LRU of verified tokens -> (payload, user document).
+
+    Entries expire after AUTH_CACHE_TTL_SECONDS and never outlive the token's
+    own ``exp`` claim, so an expired token is always re-verified (and rejected).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: str, payload: dict, user: dict):
+        expires_at = time.time() + self.ttl_seconds
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, float(exp))
+        with self._lock:
+            self._entries[key] = (expires_at, payload, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            stale = [k for k, (_, _, user) in self._entries.items() if user.get("user_id") == user_id]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+_auth_cache = _AuthCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+
+
+def invalidate_user_cache(user_id: str):
+    """Drop cached identities for a user after their record changes."""
+    _auth_cache.invalidate_user(user_id)
+
+
+def auth_cache_stats() -> dict:
+    return _auth_cache.stats()
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -30,16 +123,14 @@ def decode_access_token(token: str) -> dict:
             detail="Invalid token",
         ) from exc
 
-async def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer_scheme),
-):
-    if not credentials:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authorization header missing",
-        )
+async def authenticate_token(token: str) -> dict:
+    """Verify a bearer token and return the user it belongs to, using the auth cache."""
+    cache_key = _auth_cache.key(token)
+    cached = _auth_cache.get(cache_key)
+    if cached is not None:
+        return cached[1]
 
-    payload = decode_access_token(credentials.credentials)
+    payload = decode_access_token(token)
     user_id = payload.get("user_id")
 
     if not user_id:
@@ -48,7 +139,7 @@ async def get_current_user(
             detail="Invalid token payload",
         )
 
-    user = user_col.find_one({"user_id": user_id}, {"_id": 0, "password": 0})
+    user = await user_col.find_one({"user_id": user_id}, {"_id": 0, "password": 0})
 
     if not user:
         raise HTTPException(
@@ -56,4 +147,26 @@ async def get_current_user(
             detail="User not found",
         )
 
+    _auth_cache.put(cache_key, payload, user)
     return user
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer_scheme),
+):
+    if not credentials:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authorization header missing",
+        )
+
+    # Hand out a copy so handlers can't mutate the cached document
+    return dict(await authenticate_token(credentials.credentials))
+
+
+async def require_admin(current_user: dict = Depends(get_current_user)):
+    if current_user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return current_user
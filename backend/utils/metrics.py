@@ -0,0 +1,267 @@
+"""
+Prometheus text-format metrics without a client library.
+
+Counters, gauges and histograms are plain dicts keyed by label values behind
+one lock each, so recording on the request path costs a lookup and a few
+additions. Snapshot-style stats (pool, caches, realtime feed) are pulled in
+by collector callbacks only when ``/metrics`` is scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers fast cache hits up to slow exports
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{%s}" % ",".join(parts) if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _number(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+# A collector returns (name, type, help, [(labels dict, value), ...]) tuples at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[dict, float]]]]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_in_flight = registry.gauge(
+    "voltguard_http_requests_in_flight", "HTTP requests currently being served"
+)
+http_request_duration = registry.histogram(
+    "voltguard_http_request_duration_seconds",
+    "HTTP request latency by route template, method and status",
+    ("method", "route", "status"),
+)
+mongo_command_duration = registry.histogram(
+    "voltguard_mongo_command_duration_seconds",
+    "MongoDB command round-trip time by collection and command",
+    ("collection", "command"),
+)
+mongo_command_failures = registry.counter(
+    "voltguard_mongo_command_failures_total",
+    "Failed MongoDB commands by collection and command",
+    ("collection", "command"),
+)
+ingested_readings = registry.counter(
+    "voltguard_ingested_readings_total",
+    "Telemetry readings stored through /api/v1 by source and module",
+    ("source", "module"),
+)
+ingest_derived_failures = registry.counter(
+    "voltguard_ingest_derived_failures_total",
+    "Derived-state updates that failed after their batch was stored, by source and target",
+    ("source", "target"),
+)
+
+
+# ASGI scope of the request being served, for code that runs below the route
+# handler (e.g. Mongo command listeners attributing queries to a route)
+current_scope: ContextVar[Optional[dict]] = ContextVar("current_scope", default=None)
+
+
+def current_route() -> Optional[str]:
+    scope = current_scope.get()
+    if scope is None:
+        return None
+    return getattr(scope.get("route"), "path", None) or scope.get("path")
+
+
+# Concrete path -> route template, for requests answered before routing
+# (response-cache hits always follow a routed miss for the same path)
+_ROUTE_MEMO: Dict[Tuple[str, str], str] = {}
+_ROUTE_MEMO_MAX = 2048
+
+
+def _route_label(scope) -> str:
+    key = (scope["method"], scope["path"])
+    route = getattr(scope.get("route"), "path", None)
+    if route is None:
+        return _ROUTE_MEMO.get(key, "unmatched")
+    if key not in _ROUTE_MEMO and len(_ROUTE_MEMO) < _ROUTE_MEMO_MAX:
+        _ROUTE_MEMO[key] = route
+    return route
+
+
+class MetricsMiddleware:
+    """Outermost ASGI middleware: in-flight gauge and per-route latency histogram."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def tracking_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        scope_token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, tracking_send)
+        finally:
+            current_scope.reset(scope_token)
+            http_requests_in_flight.dec()
+            http_request_duration.observe(
+                time.perf_counter() - started, scope["method"], _route_label(scope), str(status)
+            )
+
+
+def snapshot_collector(prefix: str, help: str, snapshot: Callable[[], dict]) -> Collector:
+    """
+    Expose the numeric fields of a stats dict (as returned by the /health/*
+    endpoints) as ``<prefix>_<field>`` gauges; nested dicts become a ``key`` label.
+    """
+
+    def collect():
+        for field, value in snapshot().items():
+            name = f"{prefix}_{field}"
+            if isinstance(value, dict):
+                samples = [({"key": k}, float(v)) for k, v in value.items() if isinstance(v, (int, float))]
+                if samples:
+                    yield name, "gauge", f"{help}: {field}", samples
+            elif isinstance(value, (int, float)):
+                yield name, "gauge", f"{help}: {field}", [({}, float(value))]
+
+    return collect
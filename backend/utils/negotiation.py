@@ -0,0 +1,163 @@
+"""
+Accept / Accept-Encoding negotiation for the history endpoints.
+
+Clients pick the body layout with ``Accept``:
+
+- ``application/json`` (default): the usual row-per-object JSON
+- ``application/msgpack``: the same rows as MessagePack (datetimes use the
+  standard timestamp extension)
+- ``application/vnd.voltguard.columnar+json`` / ``+msgpack``: every list of
+  rows becomes ``{"count": n, "fields": {field: [values...]}}`` so repeated
+  keys are sent once
+
+Bodies above ``COMPRESSION_MIN_BYTES`` are compressed with brotli when the
+client accepts ``br`` (and the brotli package is installed), otherwise gzip.
+"""
+import gzip
+import os
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import msgpack
+from bson import Decimal128, ObjectId
+from fastapi import Request
+from fastapi.responses import Response
+
+from utils.json_response import dumps
+from utils.server_timing import serialization_timer
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNAR_JSON = "application/vnd.voltguard.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.voltguard.columnar+msgpack"
+
+# Accepted media type -> (response media type, columnar)
+MEDIA_TYPES: Dict[str, Tuple[str, bool]] = {
+    JSON: (JSON, False),
+    MSGPACK: (MSGPACK, False),
+    "application/x-msgpack": (MSGPACK, False),
+    COLUMNAR_JSON: (COLUMNAR_JSON, True),
+    COLUMNAR_MSGPACK: (COLUMNAR_MSGPACK, True),
+}
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _parse_header(value: Optional[str]) -> List[Tuple[str, float]]:
+    """Split an Accept-style header into (token, q) pairs, highest q first."""
+    items = []
+    for position, part in enumerate((value or "").split(",")):
+        token, *params = [p.strip() for p in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, raw = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(raw)
+                except ValueError:
+                    q = 0.0
+        items.append((token.lower(), q, position))
+    items.sort(key=lambda item: (-item[1], item[2]))
+    return [(token, q) for token, q, _ in items if q > 0]
+
+
+def choose_media_type(accept: Optional[str]) -> Tuple[str, bool]:
+    for token, _ in _parse_header(accept):
+        if token in MEDIA_TYPES:
+            return MEDIA_TYPES[token]
+    return MEDIA_TYPES[JSON]
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    accepted = {token for token, _ in _parse_header(accept_encoding)}
+    if "br" in accepted and brotli is not None:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def _is_rows(value) -> bool:
+    # An empty list is an empty page of rows, so clients always get the columnar shape
+    return isinstance(value, list) and all(isinstance(row, dict) for row in value)
+
+
+def to_columnar(rows: List[dict]) -> dict:
+    """Rows -> one array per field (fields in first-seen order, missing values as null)."""
+    fields: Dict[str, list] = {}
+    for index, row in enumerate(rows):
+        for key in row:
+            if key not in fields:
+                fields[key] = [None] * index
+        for key, column in fields.items():
+            column.append(row.get(key))
+    return {"count": len(rows), "fields": fields}
+
+
+def columnarize(content):
+    """Apply ``to_columnar`` to a top-level row list or to the row lists inside a dict payload."""
+    if _is_rows(content):
+        return to_columnar(content)
+    if isinstance(content, dict):
+        return {key: to_columnar(value) if _is_rows(value) else value for key, value in content.items()}
+    return content
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            # Stored timestamps are naive UTC
+            value = value.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+
+def encode(content, media_type: str) -> bytes:
+    if media_type in (MSGPACK, COLUMNAR_MSGPACK):
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+    return dumps(content)
+
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    if encoding is None or len(body) < COMPRESSION_MIN_BYTES:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+
+
+def negotiated_response(request: Request, content, status_code: int = 200) -> Response:
+    """Render ``content`` in the representation and encoding the client asked for."""
+    media_type, columnar = choose_media_type(request.headers.get("accept"))
+    with serialization_timer():
+        if columnar:
+            content = columnarize(content)
+        body, content_encoding = compress(
+            encode(content, media_type),
+            choose_encoding(request.headers.get("accept-encoding")),
+        )
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
@@ -0,0 +1,120 @@
+"""
+Keyset (cursor) pagination shared by the list endpoints.
+
+Pages are ordered by a timestamp field plus ``_id`` as a tie-breaker and the
+next page starts strictly after the last row returned, so page N costs the
+same index seek as page 1. The cursor handed to clients is an opaque
+base64url token; the next one is returned in the ``X-Next-Cursor`` header
+(absent on the last page) so existing list-shaped response bodies are kept.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+ASCENDING = 1
+DESCENDING = -1
+
+
+def _encode_value(value: Any):
+    if isinstance(value, datetime):
+        return {"d": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"o": str(value)}
+    return {"v": value}
+
+
+def _decode_value(raw: dict):
+    if "d" in raw:
+        return datetime.fromisoformat(raw["d"])
+    if "o" in raw:
+        return ObjectId(raw["o"])
+    return raw["v"]
+
+
+def encode_cursor(ts: Any, oid: Any) -> str:
+    payload = json.dumps([_encode_value(ts), _encode_value(oid)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, oid = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return _decode_value(ts), _decode_value(oid)
+    except (ValueError, TypeError, KeyError, InvalidId, binascii.Error) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+
+def page_sort(field: Optional[str], direction: int = DESCENDING) -> List[tuple]:
+    if field is None:
+        return [("_id", direction)]
+    return [(field, direction), ("_id", direction)]
+
+
+def _after(field: Optional[str], ts: Any, oid: Any, direction: int) -> dict:
+    """Filter selecting rows that sort strictly after (ts, oid)."""
+    past = "$lt" if direction == DESCENDING else "$gt"
+    if field is None:
+        return {"_id": {past: oid}}
+    if ts is None:
+        # Rows without the field sort last when descending and first when ascending
+        branches = [{field: None, "_id": {past: oid}}]
+        if direction == ASCENDING:
+            branches.append({field: {"$ne": None}})
+        return {"$or": branches}
+    branches = [{field: {past: ts}}, {field: ts, "_id": {past: oid}}]
+    if direction == DESCENDING:
+        branches.append({field: None})
+    return {"$or": branches}
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    field: Optional[str],
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None,
+    direction: int = DESCENDING,
+) -> Tuple[List[dict], Optional[str]]:
+    """Return one page of documents and the cursor for the next page (or None)."""
+    if cursor:
+        ts, oid = decode_cursor(cursor)
+        query = {"$and": [query, _after(field, ts, oid, direction)]} if query else _after(field, ts, oid, direction)
+
+    # _id is always fetched because it is half of the page key
+    hide_id = projection is not None and projection.get("_id") == 0
+    if projection is not None:
+        projection = {k: v for k, v in projection.items() if k != "_id"} or None
+
+    docs = await (
+        collection
+        .find(query, projection)
+        .sort(page_sort(field, direction))
+        .limit(limit + 1)
+        .to_list()
+    )
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(last.get(field) if field else None, last["_id"])
+
+    if hide_id:
+        for doc in docs:
+            doc.pop("_id", None)
+    return docs, next_cursor
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,97 @@
+import threading
+from bisect import bisect_left
+
+from pymongo import monitoring
+
+# Upper bounds (ms) of the checkout wait-time histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Connection pool monitor: how often requests check out a connection,
+    how long they waited for one, and how many are in use right now.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_failures = {}
+            self.checked_out = 0
+            self.connections_open = 0
+            self.pools_cleared = 0
+            self.wait_ms_total = 0.0
+            self.wait_ms_max = 0.0
+            self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def _record_wait(self, duration):
+        wait_ms = (duration or 0.0) * 1000.0
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+        self.wait_buckets[bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self._record_wait(getattr(event, "duration", None))
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            reason = str(event.reason)
+            self.checkout_failures[reason] = self.checkout_failures.get(reason, 0) + 1
+            self._record_wait(getattr(event, "duration", None))
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_open = max(self.connections_open - 1, 0)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = self.checkouts + sum(self.checkout_failures.values())
+            buckets = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)}
+            buckets["gt_%dms" % WAIT_BUCKETS_MS[-1]] = self.wait_buckets[-1]
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "checked_out": self.checked_out,
+                "connections_open": self.connections_open,
+                "pools_cleared": self.pools_cleared,
+                "wait_ms_avg": round(self.wait_ms_total / waits, 3) if waits else 0.0,
+                "wait_ms_max": round(self.wait_ms_max, 3),
+                "wait_ms_buckets": buckets,
+            }
+
+
+pool_metrics = PoolMetricsListener()
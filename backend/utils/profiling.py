@@ -0,0 +1,153 @@
+"""
+On-demand request profiling for admins.
+
+A request carrying ``X-Profile: 1`` and an admin bearer token runs under
+cProfile. The response gets an ``X-Profile-Id`` header and the report can be
+fetched from ``GET /admin/profiles/{id}``. Only one request is profiled at a
+time per process (others carry ``X-Profile-Status: busy``). cProfile follows
+the event loop thread, so coroutines of concurrent requests may show up in the
+report. Work pushed to the threadpool is not included.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from utils.jwt_handler import authenticate_token
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_STORE_SIZE = int(os.getenv("PROFILE_STORE_SIZE", "20"))
+SORT_KEYS = ("cumulative", "tottime", "calls")
+
+
+class _StoredProfile:
+    __slots__ = ("id", "method", "path", "status", "duration_ms", "created_at", "profile")
+
+    def __init__(self, profile_id: str, method: str, path: str, status: int, duration_ms: float, profile: cProfile.Profile):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.status = status
+        self.duration_ms = round(duration_ms, 2)
+        self.created_at = datetime.utcnow()
+        self.profile = profile
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "created_at": self.created_at,
+        }
+
+    def report(self, sort: str = "cumulative", limit: int = 60) -> str:
+        out = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=out)
+        out.write(f"{self.method} {self.path} -> {self.status} in {self.duration_ms} ms\n\n")
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class ProfileStore:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _StoredProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, entry: _StoredProfile):
+        with self._lock:
+            self._entries[entry.id] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[_StoredProfile]:
+        with self._lock:
+            return self._entries.get(profile_id)
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [e.summary() for e in reversed(self._entries.values())]
+
+
+profile_store = ProfileStore(PROFILE_STORE_SIZE)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _header(scope, PROFILE_HEADER) not in ("1", "true"):
+            await self.app(scope, receive, send)
+            return
+        if not await self._is_admin(scope):
+            await self.app(scope, receive, send)
+            return
+        if self._busy:
+            await self.app(scope, receive, self._with_headers(send, [(b"x-profile-status", b"busy")]))
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) already owns the thread
+            await self.app(scope, receive, self._with_headers(send, [(b"x-profile-status", b"unavailable")]))
+            return
+        self._busy = True
+        status = 500
+        profile_id = uuid.uuid4().hex[:12]
+
+        async def profiled_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            profile.disable()
+            self._busy = False
+            duration_ms = (time.perf_counter() - started) * 1000
+            profile_store.add(_StoredProfile(profile_id, scope["method"], scope["path"], status, duration_ms, profile))
+
+    @staticmethod
+    def _with_headers(send, extra):
+        async def wrapped(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *extra]}
+            await send(message)
+
+        return wrapped
+
+    @staticmethod
+    async def _is_admin(scope) -> bool:
+        scheme, _, token = (_header(scope, b"authorization") or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return False
+        try:
+            user = await authenticate_token(token)
+        except HTTPException:
+            return False
+        return user.get("role") == "admin"
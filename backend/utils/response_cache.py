@@ -0,0 +1,235 @@
+"""
+Response cache for the GET routes the mobile app polls.
+
+Responses are keyed by path + query string + the caller's role, kept for a
+per-route TTL in a bounded LRU, and served with a strong ETag so a client
+that already has the body gets ``304 Not Modified``. Concurrent identical
+misses are coalesced: one request computes the response and the others
+wait for it. Writes under the same router prefix drop its cached entries.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from utils.jwt_handler import authenticate_token
+
+# Path -> seconds a cached response stays fresh
+CACHE_ROUTE_TTLS: Dict[str, float] = {
+    "/zones/": float(os.getenv("CACHE_TTL_ZONES", "5")),
+    "/analytics/recommendations": float(os.getenv("CACHE_TTL_RECOMMENDATIONS", "15")),
+    "/analytics/occupancy-stats": float(os.getenv("CACHE_TTL_OCCUPANCY_STATS", "10")),
+    "/faults/active": float(os.getenv("CACHE_TTL_ACTIVE_FAULTS", "10")),
+}
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+
+
+class _CachedResponse:
+    __slots__ = ("status", "headers", "body", "etag", "expires_at")
+
+    def __init__(self, status: int, headers: list, body: bytes, ttl: float):
+        self.status = status
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        self.headers = [(k, v) for k, v in headers if k.lower() not in (b"etag", b"cache-control")]
+        if status == 200:
+            self.headers.append((b"etag", self.etag.encode("latin-1")))
+            self.headers.append((b"cache-control", b"private, max-age=%d" % int(ttl)))
+        self.expires_at = time.monotonic() + ttl
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, _CachedResponse]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple) -> Optional[_CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: _CachedResponse):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_prefix(self, prefix: str):
+        with self._lock:
+            stale = [k for k in self._entries if k[0].startswith(prefix)]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": RESPONSE_CACHE_ENABLED,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "not_modified": self.not_modified,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "inflight": len(self._inflight),
+            "route_ttls": CACHE_ROUTE_TTLS,
+        }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES)
+
+
+def response_cache_stats() -> dict:
+    return response_cache.stats()
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _router_prefix(path: str) -> str:
+    segment = path.strip("/").split("/", 1)[0]
+    return f"/{segment}/" if segment else "/"
+
+
+class ResponseCacheMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RESPONSE_CACHE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+        if method != "GET":
+            await self._call_write(scope, receive, send, path)
+            return
+
+        ttl = CACHE_ROUTE_TTLS.get(path)
+        role = await self._caller_role(scope) if ttl else None
+        if role is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Accept / Accept-Encoding select the representation, so they are part of the key
+        key = (
+            path,
+            scope.get("query_string", b"").decode("latin-1"),
+            role,
+            _header(scope, b"accept") or "",
+            _header(scope, b"accept-encoding") or "",
+        )
+        entry = response_cache.get(key)
+        if entry is not None:
+            response_cache.hits += 1
+            await self._replay(scope, send, entry)
+            return
+
+        waiting = response_cache._inflight.get(key)
+        if waiting is not None:
+            response_cache.coalesced += 1
+            entry = await asyncio.shield(waiting)
+            if entry is not None:
+                await self._replay(scope, send, entry)
+                return
+            await self.app(scope, receive, send)
+            return
+
+        response_cache.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        response_cache._inflight[key] = future
+        entry = None
+        try:
+            status, headers, body = await self._capture(scope, receive)
+            entry = _CachedResponse(status, headers, body, ttl)
+            if status == 200:
+                response_cache.put(key, entry)
+        finally:
+            response_cache._inflight.pop(key, None)
+            future.set_result(entry)
+        await self._replay(scope, send, entry)
+
+    async def _caller_role(self, scope) -> Optional[str]:
+        authorization = _header(scope, b"authorization") or ""
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            user = await authenticate_token(token)
+        except HTTPException:
+            # Let the route produce the proper 401/404
+            return None
+        return user.get("role") or "user"
+
+    async def _capture(self, scope, receive) -> Tuple[int, list, bytes]:
+        status = 500
+        headers: list = []
+        chunks = []
+
+        async def capture_send(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture_send)
+        return status, headers, b"".join(chunks)
+
+    async def _replay(self, scope, send, entry: _CachedResponse):
+        if entry.status == 200 and _header(scope, b"if-none-match") == entry.etag:
+            response_cache.not_modified += 1
+            headers = [(k, v) for k, v in entry.headers if k.lower() in (b"etag", b"cache-control")]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers})
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def _call_write(self, scope, receive, send, path):
+        status = None
+
+        async def tracking_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        await self.app(scope, receive, tracking_send)
+        if scope["method"] in ("POST", "PUT", "PATCH", "DELETE") and status is not None and status < 400:
+            response_cache.invalidate_prefix(_router_prefix(path))
@@ -0,0 +1,82 @@
+"""
+Per-request ``Server-Timing`` breakdown.
+
+The middleware puts a RequestTiming in a context variable; the Mongo command
+listener adds each command's round trip to it and the JSON/MessagePack
+renderers add their encoding time. What is left of the time to first byte is
+reported as ``app`` (route logic, validation, waiting on the event loop):
+
+    Server-Timing: db;dur=12.4;desc="3 commands", ser;dur=1.8, app;dur=4.1, total;dur=18.3
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+
+class RequestTiming:
+    __slots__ = ("db_ms", "db_commands", "serialization_ms")
+
+    def __init__(self):
+        self.db_ms = 0.0
+        self.db_commands = 0
+        self.serialization_ms = 0.0
+
+    def header(self, total_ms: float) -> str:
+        app_ms = max(total_ms - self.db_ms - self.serialization_ms, 0.0)
+        return (
+            f'db;dur={self.db_ms:.1f};desc="{self.db_commands} commands", '
+            f"ser;dur={self.serialization_ms:.1f}, "
+            f"app;dur={app_ms:.1f}, "
+            f"total;dur={total_ms:.1f}"
+        )
+
+
+current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("current_timing", default=None)
+
+
+def add_db_time(duration_ms: float):
+    timing = current_timing.get()
+    if timing is not None:
+        timing.db_ms += duration_ms
+        timing.db_commands += 1
+
+
+class serialization_timer:
+    """``with serialization_timer(): body = encode(...)``"""
+
+    __slots__ = ("_started",)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        timing = current_timing.get()
+        if timing is not None:
+            timing.serialization_ms += (time.perf_counter() - self._started) * 1000
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        started = time.perf_counter()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - started) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.header(total_ms).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            current_timing.reset(token)
@@ -0,0 +1,289 @@
+"""
+Slow query recorder.
+
+A command listener notes every MongoDB command slower than SLOW_QUERY_MS with
+the route that issued it and the shape of its filter or pipeline (literal
+values replaced by ``"?"``). A background task then re-runs read commands as
+``explain("executionStats")`` to capture keys/documents examined and the
+winning plan, and stores the record in the capped ``slow_queries`` collection.
+
+Explains are rate-limited (SLOW_QUERY_EXPLAINS_PER_MINUTE overall, and at most
+one per query shape per SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS), and the hand-off
+queue is bounded, so a burst of slow queries cannot overload the database.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from utils.metrics import current_route, current_scope
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_ENABLED = os.getenv("SLOW_QUERY_ENABLED", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_EXPLAINS_PER_MINUTE = int(os.getenv("SLOW_QUERY_EXPLAINS_PER_MINUTE", "6"))
+SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS = float(os.getenv("SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS", "300"))
+SLOW_QUERY_LOG_BYTES = int(os.getenv("SLOW_QUERY_LOG_BYTES", str(16 * 1024 * 1024)))
+SLOW_QUERY_COLLECTION = "slow_queries"
+SLOW_QUERY_QUEUE_SIZE = 1000
+
+EXPLAINABLE = {"find", "aggregate", "count", "distinct"}
+# Commands that are slow by nature or would recurse into the recorder
+IGNORED = {"explain", "getMore", "hello", "isMaster", "ismaster", "ping", "saslStart", "saslContinue", "endSessions", "killCursors"}
+# Values under these keys describe the query rather than the data and are kept
+KEEP_LITERALS = {"sort", "$sort", "projection", "$project", "limit", "$limit", "skip", "$skip", "hint", "batchSize"}
+
+
+def redact(value, keep: bool = False):
+    """Query shape: keys, operators and field references kept, literal values replaced by "?"."""
+    if isinstance(value, dict):
+        return {k: redact(v, keep or k in KEEP_LITERALS) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return []
+        if all(not isinstance(v, (dict, list, tuple)) for v in value) and not keep:
+            # $in / $nin lists collapse to one placeholder whatever their length
+            return ["?"]
+        return [redact(v, keep) for v in value]
+    if keep or (isinstance(value, str) and value.startswith("$")):
+        return value if isinstance(value, (str, int, float, bool)) or value is None else "?"
+    return "?"
+
+
+def command_shape(command_name: str, command: dict) -> dict:
+    if command_name == "aggregate":
+        return {"pipeline": redact(command.get("pipeline", []))}
+    if command_name in ("update", "delete"):
+        key = "updates" if command_name == "update" else "deletes"
+        return {key: [redact({"q": op.get("q")}) for op in command.get(key, [])[:1]]}
+    shape = {}
+    for key in ("filter", "query", "sort", "projection", "key", "limit"):
+        if key in command:
+            shape[key] = redact(command[key], key in KEEP_LITERALS)
+    return shape
+
+
+def _explainable_command(command_name: str, command: dict) -> Optional[dict]:
+    if command_name not in EXPLAINABLE:
+        return None
+    # Session, cluster time, read preference, ... are the driver's, not the query's
+    return {k: v for k, v in command.items() if not k.startswith("$") and k not in ("lsid", "txnNumber", "readConcern")}
+
+
+def _find_key(value, key):
+    if isinstance(value, dict):
+        if key in value:
+            return value[key]
+        children = value.values()
+    elif isinstance(value, list):
+        children = value
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _plan_summary(plan) -> str:
+    stages = []
+    if isinstance(plan, dict) and "queryPlan" in plan:
+        # Slot-based engine plans wrap the classic tree
+        plan = plan["queryPlan"]
+    while isinstance(plan, dict):
+        stage = plan.get("stage")
+        if stage:
+            stages.append(f"{stage}({plan['indexName']})" if plan.get("indexName") else stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " > ".join(stages)
+
+
+def summarize_explain(explain: dict) -> dict:
+    stats = _find_key(explain, "executionStats") or {}
+    return {
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "n_returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+        "plan": _plan_summary(_find_key(explain, "winningPlan")),
+    }
+
+
+def _reply_count(reply: dict) -> Optional[int]:
+    cursor = reply.get("cursor") if isinstance(reply, dict) else None
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if isinstance(reply, dict) and "n" in reply:
+        return reply["n"]
+    return None
+
+
+class SlowQueryRecorder(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS):
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+        self._explain_times = deque()
+        self._explained_shapes = {}
+        self.recorded = 0
+        self.explained = 0
+        self.explains_skipped = 0
+        self.dropped = 0
+
+    # -- listener (runs on the driver's thread / event loop) -------------------
+
+    def started(self, event):
+        if self._queue is None or event.command_name in IGNORED:
+            return
+        collection = event.command.get(event.command_name)
+        if collection == SLOW_QUERY_COLLECTION:
+            return
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.command, collection, current_route(), (current_scope.get() or {}).get("method")
+            )
+
+    def _take(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        pending = self._take(event)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+        command, collection, route, method = pending
+        record = {
+            "at": datetime.utcnow(),
+            "duration_ms": round(duration_ms, 2),
+            "command": event.command_name,
+            "collection": collection if isinstance(collection, str) else None,
+            "route": route,
+            "method": method,
+            "shape": command_shape(event.command_name, command),
+            "reply_count": _reply_count(event.reply),
+        }
+        self._enqueue(record, _explainable_command(event.command_name, command))
+
+    def failed(self, event):
+        self._take(event)
+
+    def _enqueue(self, record: dict, explain_command: Optional[dict]):
+        loop, queue = self._loop, self._queue
+        if loop is None or queue is None:
+            return
+
+        def put():
+            try:
+                queue.put_nowait((record, explain_command))
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            put()
+        else:
+            loop.call_soon_threadsafe(put)
+
+    # -- background writer --------------------------------------------------
+
+    async def start(self, db):
+        """Create the capped collection and start the writer (called from the app lifespan)."""
+        if not SLOW_QUERY_ENABLED or self._task is not None:
+            return
+        self._db = db
+        try:
+            await db.create_collection(SLOW_QUERY_COLLECTION, capped=True, size=SLOW_QUERY_LOG_BYTES)
+        except CollectionInvalid:
+            pass
+        except PyMongoError as exc:
+            logger.warning("Could not create %s: %s", SLOW_QUERY_COLLECTION, exc)
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(SLOW_QUERY_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._drain())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        self._queue = None
+        self._loop = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _explain_skip_reason(self, record: dict) -> Optional[str]:
+        now = time.monotonic()
+        while self._explain_times and now - self._explain_times[0] > 60:
+            self._explain_times.popleft()
+        shape_key = hashlib.sha1(
+            json.dumps([record["collection"], record["command"], record["shape"]], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        last = self._explained_shapes.get(shape_key)
+        if last is not None and now - last < SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS:
+            return "recently_explained"
+        if len(self._explain_times) >= SLOW_QUERY_EXPLAINS_PER_MINUTE:
+            return "rate_limited"
+        self._explain_times.append(now)
+        if len(self._explained_shapes) > 1000:
+            self._explained_shapes.clear()
+        self._explained_shapes[shape_key] = now
+        return None
+
+    async def _drain(self):
+        while True:
+            record, explain_command = await self._queue.get()
+            skip_reason = self._explain_skip_reason(record) if explain_command is not None else None
+            if explain_command is None:
+                record["explain"] = None
+            elif skip_reason is None:
+                try:
+                    explain = await self._db.command({"explain": explain_command, "verbosity": "executionStats"})
+                    record["explain"] = summarize_explain(explain)
+                    self.explained += 1
+                except PyMongoError as exc:
+                    record["explain"] = {"error": str(exc)}
+            else:
+                record["explain"] = {"skipped": skip_reason}
+                self.explains_skipped += 1
+            try:
+                await self._db[SLOW_QUERY_COLLECTION].insert_one(record)
+                self.recorded += 1
+            except PyMongoError as exc:
+                logger.warning("Could not store slow query: %s", exc)
+            logger.info(
+                "Slow %s on %s (%.0f ms) from %s", record["command"], record["collection"], record["duration_ms"], record["route"]
+            )
+
+    def stats(self) -> dict:
+        return {
+            "enabled": SLOW_QUERY_ENABLED and self._task is not None,
+            "threshold_ms": self.threshold_ms,
+            "recorded": self.recorded,
+            "explained": self.explained,
+            "explains_skipped": self.explains_skipped,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+slow_query_recorder = SlowQueryRecorder()
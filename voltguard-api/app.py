@@ -1,3 +1,10 @@
+# Legacy ingest API, still the one render.yaml deploys. The FastAPI backend
+# serves the same /api/v1/telemetry and /api/v1/current payloads and also
+# updates the catalog, sketches, heartbeats and anomaly detector. Readings
+# stored here skip those, although the backend's module validation falls back
+# to the raw collections. Both writers stamp received_at the same way (server
+# time, UTC) and keep a device-sent value as device_time.
+# See "Telemetry Ingest" in backend/README.md.
 import os
 from datetime import datetime, timezone
 from pathlib import Path
@@ -55,15 +62,17 @@ def telemetry():
     if missing:
         return jsonify({"ok": False, "error": f"missing fields: {missing}"}), 400
 
-    # Get current time in Sri Lankan timezone
-    now_sl = datetime.now(SL_TZ)
+    # Server time in UTC, as the backend stores it; the device's own clock is kept aside
+    now = datetime.now(timezone.utc)
 
-    doc = {
-        **data,
-        "received_at":  now_sl,  # datetime object with timezone
-        "received_at_formatted": now_sl.strftime("%Y-%m-%d %H:%M:%S"),  # readable string
+    doc = {**data}
+    if "received_at" in doc:
+        doc["device_time"] = doc.pop("received_at")
+    doc.update({
+        "received_at": now,
+        "received_at_formatted": now.astimezone(SL_TZ).strftime("%Y-%m-%d %H:%M:%S"),  # readable Sri Lankan time
         "source": "esp8266",
-    }
+    })
 
     result = collection.insert_one(doc)
     return jsonify({"ok": True, "id": str(result.inserted_id)}), 201